@@ -0,0 +1,142 @@
+import math
+import threading
+from bisect import bisect_left
+
+# In-process request and data-load metrics for the API, rendered in the Prometheus text format by /metrics.
+# Recording a request is a dict lookup, two bisects and a few additions under one lock.
+# Counters live in each process: under gunicorn every worker keeps its own and a scrape of /metrics
+# reports the worker that answered it.
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS_SECONDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RESPONSE_SIZE_BUCKETS_BYTES = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+LOAD_BUCKETS_SECONDS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Route label of requests that matched no route, so unknown URLs don't create new series
+UNMATCHED_ROUTE = 'unmatched'
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # Last one is +Inf
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            cumulative += count
+            yield format_sample(f"{name}_bucket", dict(labels, le=_format_value(bound)), cumulative)
+        yield format_sample(f"{name}_sum", labels, self.total)
+        yield format_sample(f"{name}_count", labels, cumulative)
+
+
+def _format_value(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        if value.is_integer():
+            return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_sample(name, labels, value):
+    if labels:
+        label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+        return f"{name}{{{label_text}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+
+def format_metric(name, metric_type, help_text, samples):
+    # One metric family: its HELP and TYPE lines followed by its samples
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"] + list(samples)
+
+
+def format_value_metric(name, metric_type, help_text, value, labels=None):
+    # A metric family with a single sample
+    return format_metric(name, metric_type, help_text, [format_sample(name, labels, value)])
+
+
+class ApiMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (method, route) -> [latency histogram, size histogram, {status: count}]
+        self._routes = {}
+        # (trigger, result) -> count, and load duration per trigger
+        self._loads = {}
+        self._load_durations = {}
+
+    def observe_request(self, method, route, status, seconds, response_bytes):
+        with self._lock:
+            entry = self._routes.get((method, route))
+            if entry is None:
+                entry = self._routes[(method, route)] = [
+                    Histogram(LATENCY_BUCKETS_SECONDS), Histogram(RESPONSE_SIZE_BUCKETS_BYTES), {}]
+            entry[0].observe(seconds)
+            entry[1].observe(response_bytes)
+            entry[2][status] = entry[2].get(status, 0) + 1
+
+    def observe_load(self, trigger, result, seconds):
+        # trigger: what asked for the load ('startup', 'watcher' or 'request');
+        # result: 'loaded', 'unchanged' or 'rejected' (new data had no items and the old data was kept)
+        with self._lock:
+            self._loads[(trigger, result)] = self._loads.get((trigger, result), 0) + 1
+            histogram = self._load_durations.get(trigger)
+            if histogram is None:
+                histogram = self._load_durations[trigger] = Histogram(LOAD_BUCKETS_SECONDS)
+            histogram.observe(seconds)
+
+    def render(self):
+        # Request and load metrics as lines of the Prometheus text format
+        with self._lock:
+            routes = sorted(self._routes.items())
+            requests, latency, sizes = [], [], []
+            for (method, route), (latency_histogram, size_histogram, statuses) in routes:
+                labels = {'method': method, 'route': route}
+                requests.extend(format_sample('api_requests_total', dict(labels, status=str(status)), count)
+                                for status, count in sorted(statuses.items()))
+                latency.extend(latency_histogram.samples('api_request_duration_seconds', labels))
+                sizes.extend(size_histogram.samples('api_response_size_bytes', labels))
+            loads = [format_sample('api_data_loads_total', {'trigger': trigger, 'result': result}, count)
+                     for (trigger, result), count in sorted(self._loads.items())]
+            load_durations = []
+            for trigger, histogram in sorted(self._load_durations.items()):
+                load_durations.extend(histogram.samples('api_data_load_duration_seconds', {'trigger': trigger}))
+
+        return (
+            format_metric('api_requests_total', 'counter', 'Requests handled, by route and status.', requests)
+            + format_metric('api_request_duration_seconds', 'histogram', 'Time spent handling a request, serialization included.', latency)
+            + format_metric('api_response_size_bytes', 'histogram', 'Response body size.', sizes)
+            + format_metric('api_data_loads_total', 'counter', 'Data loads, by what triggered them and their outcome.', loads)
+            + format_metric('api_data_load_duration_seconds', 'histogram', 'Time to read, index and publish the data.', load_durations)
+        )
+
+
+def cache_metric_lines(caches):
+    # Counters and size of ResponseCache instances
+    stats = [cache.stats() for cache in caches]
+    families = [
+        ('api_cache_hits_total', 'counter', 'Response cache hits.', 'hits'),
+        ('api_cache_misses_total', 'counter', 'Response cache misses.', 'misses'),
+        ('api_cache_evictions_total', 'counter', 'Responses evicted from a full cache.', 'evictions'),
+        ('api_cache_entries', 'gauge', 'Responses held in the cache.', 'entries'),
+    ]
+    lines = []
+    for name, metric_type, help_text, key in families:
+        lines.extend(format_metric(name, metric_type, help_text,
+                                   (format_sample(name, {'cache': entry['name']}, entry[key]) for entry in stats)))
+    return lines
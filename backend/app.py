@@ -1,145 +1,530 @@
-from flask import Flask, jsonify
+from flask import Flask, g, jsonify, request
 import pandas as pd
 from flask_cors import CORS
+from collections import namedtuple
+from datetime import date, datetime, timezone
 import os
+import threading
+import time
+
+from item_index import LISTING_SORTS, MIN_STORES_FOR_LISTING, build_item_index, cart_store_totals, empty_index, item_to_dict, list_items
+from normalize_data import UNIT_PRICE_UNITS
+from search_index import build_search_index, empty_search_index, search
+from cart_optimizer import MAX_PLAN_STORES, build_price_matrix, empty_price_matrix, optimize_cart, plan_to_dict
+from matched_data import EXPECTED_COLUMNS, COLUMNAR_META_FILENAME, columnar_path_for, data_version, read_matched_csv, read_columnar_data
+from response_cache import ResponseCache
+from json_provider import FastJSONProvider
+from price_stats import build_price_stats, category_stats, empty_price_stats
+from price_history import CHANGE_KINDS, HISTORY_FOLDER, change_to_dict, history_to_dict, item_history, read_changes
+from api_metrics import PROMETHEUS_CONTENT_TYPE, UNMATCHED_ROUTE, ApiMetrics, cache_metric_lines, format_metric, format_sample, format_value_metric
 
 app = Flask(__name__)
-CORS(app)
+app.json = FastJSONProvider(app)
+CORS(app, expose_headers=['X-Next-Cursor', 'X-Total-Count'])
 
 DATA_FILE = os.path.join('data', 'matched_items_v1.csv')
-df_items = None
+COLUMNAR_DATA_DIR = columnar_path_for(DATA_FILE)
+
+# Everything requests read, built completely before it is published. A new load replaces
+# current_data with a single assignment, so a request sees either the old data or the new data.
+# 'version' is the hash of the loaded artifact, 'source_stamp' the (path, mtime, size) of the
+# files the watcher compares against, 'load_seconds' how long reading and indexing took.
+# 'price_matrix' is the item x store price matrix behind /cart/optimize, 'price_stats' the store and
+# category price indexes behind /stats.
+DataSnapshot = namedtuple('DataSnapshot', [
+    'df', 'index', 'search_index', 'price_matrix', 'price_stats', 'version', 'source', 'source_stamp', 'load_seconds', 'loaded_at'
+])
+current_data = None
+reload_count = 0
+_load_lock = threading.Lock()
+
+# How often the background watcher checks the data files for changes (0 turns it off)
+DATA_RELOAD_INTERVAL_SECONDS = float(os.environ.get('DATA_RELOAD_INTERVAL_SECONDS', '10'))
+
+# Number of items returned by /items when no limit is given, and the largest limit allowed
+ITEMS_PAGE_SIZE = 100
+ITEMS_MAX_PAGE_SIZE = 1000
+# Most distinct item IDs accepted by /prices/batch
+MAX_BATCH_ITEMS = 500
+# Stores a /cart/optimize split plan may use when no 'max_stores' is given
+CART_DEFAULT_MAX_STORES = 2
+# Results returned by /search when no limit is given, and the largest limit allowed
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 100
+# Days of price history returned when no 'days' is given, and the most allowed
+HISTORY_DEFAULT_DAYS = 30
+HISTORY_MAX_DAYS = 365
+# Price changes returned by /changes when no limit is given, and the largest limit allowed
+CHANGES_DEFAULT_LIMIT = 100
+CHANGES_MAX_LIMIT = 1000
+
+# Serialized responses are kept until the data version changes. Clients and the CDN may reuse
+# a response for CACHE_MAX_AGE_SECONDS and revalidate it with its ETag afterwards.
+CACHE_MAX_AGE_SECONDS = 300
+item_response_cache = ResponseCache('prices', max_entries=4096)
+list_response_cache = ResponseCache('items', max_entries=256)
+
+# Request counts, latencies and response sizes per route, and data loads, served by /metrics
+api_metrics = ApiMetrics()
+
+def load_data(trigger='startup'):
+    # Reads the data files and publishes a new snapshot. Returns the snapshot in use afterwards.
+    # 'trigger' says what asked for the load ('startup', 'watcher' or 'request'), for /metrics.
+    global current_data, reload_count
+    start_time = time.perf_counter()
+    with _load_lock:
+        previous = current_data
+        snapshot = _build_snapshot(previous)
+        if previous is not None and snapshot.index is previous.index: # Same data version
+            current_data = snapshot
+            api_metrics.observe_load(trigger, 'unchanged', time.perf_counter() - start_time)
+            return snapshot
+
+        if previous is not None and previous.index.items and not snapshot.index.items:
+            print(f"New data from {snapshot.source} has no items. Keeping data version {previous.version}.")
+            current_data = previous._replace(source_stamp=snapshot.source_stamp)
+            api_metrics.observe_load(trigger, 'rejected', time.perf_counter() - start_time)
+            return current_data
+
+        # Cached responses of the old data are dropped, and the default /items page is serialized
+        # ahead of the first request
+        item_response_cache.advance(snapshot.version)
+        list_response_cache.advance(snapshot.version)
+        if snapshot.index.items:
+            _cached_items_page(snapshot, 'id', MIN_STORES_FOR_LISTING, None, None, None, ITEMS_PAGE_SIZE, None)
+        current_data = snapshot
+        if previous is not None:
+            reload_count += 1
+    api_metrics.observe_load(trigger, 'loaded', time.perf_counter() - start_time)
+
+    index, search_index = snapshot.index, snapshot.search_index
+    print(f"Data load finished in {snapshot.load_seconds:.3f}s "
+          f"(index build {index.build_seconds:.3f}s, {len(index.items)} items, {len(index.listed_ids)} listed; "
+          f"search index build {search_index.build_seconds:.3f}s, price matrix build {snapshot.price_matrix.build_seconds:.3f}s, "
+          f"price stats build {snapshot.price_stats.build_seconds:.3f}s, "
+          f"data version {snapshot.version})")
+    return snapshot
+
+def _get_data():
+    # The current snapshot, loading one first if nothing usable is loaded yet
+    data = current_data
+    if data is None or not data.index.items:
+        data = load_data('request')
+    return data
 
-EXPECTED_COLUMNS = [
-    'id', 'name', 'price', 'store', 'brand', 
-    'net_quantity', 'unit_of_measure', 'category',
-    'standardized_quantity', 'standardized_unit'
-]
+def _build_snapshot(previous):
+    start_time = time.perf_counter()
+    source_stamp = _artifact_stamp()
+    df, version, source = _read_frame()
+    # Touched but unchanged files don't need new indexes
+    if previous is not None and version is not None and version == previous.version:
+        return previous._replace(source_stamp=source_stamp)
 
-def load_data():
-    global df_items
+    index, search_index, price_matrix, price_stats = _build_indexes(df)
+    return DataSnapshot(df, index, search_index, price_matrix, price_stats, version, source, source_stamp,
+                        time.perf_counter() - start_time, time.time())
+
+def _build_indexes(df):
     try:
-        if os.path.exists(DATA_FILE):
-            df_items = pd.read_csv(DATA_FILE)
-            if df_items.empty and os.path.getsize(DATA_FILE) > 0:
-                print(f"Warning: {DATA_FILE} was read as an empty DataFrame despite having content. Check formatting/headers.")
-                df_items = pd.DataFrame(columns=EXPECTED_COLUMNS)
-                return
-            elif df_items.empty:
-                print(f"Warning: {DATA_FILE} is empty.")
-                df_items = pd.DataFrame(columns=EXPECTED_COLUMNS)
-                return
-
-            # Verify and type columns
-            for col in EXPECTED_COLUMNS:
-                if col not in df_items.columns:
-                    print(f"Warning: Column '{col}' missing in {DATA_FILE}. Adding it as empty.")
-                    # Default types for potentially missing columns
-                    if col == 'id' or col == 'standardized_quantity': # id is primary, std_qty is numeric
-                        df_items[col] = pd.Series(dtype='Int64' if col == 'id' else float)
-                    elif col == 'price':
-                         df_items[col] = pd.Series(dtype=float)
-                    else: # name, store, brand, units, category
-                        df_items[col] = pd.Series(dtype=str)
-            
-            # Specific type conversions for existing columns
-            if 'id' in df_items.columns:
-                df_items['id'] = pd.to_numeric(df_items['id'], errors='coerce').astype('Int64')
-                df_items.dropna(subset=['id'], inplace=True) # Critical: items must have a shared ID
-            
-            if 'price' in df_items.columns:
-                df_items['price'] = pd.to_numeric(df_items['price'], errors='coerce')
-            
-            if 'standardized_quantity' in df_items.columns:
-                df_items['standardized_quantity'] = pd.to_numeric(df_items['standardized_quantity'], errors='coerce')
-
-            for col in ['name', 'store', 'brand', 'unit_of_measure', 'category', 'standardized_unit', 'net_quantity']:
-                if col in df_items.columns:
-                    df_items[col] = df_items[col].astype(str).fillna('') # Ensure string types and handle NaNs
-
-            # Drop rows where critical info for grouping/display might be missing
-            # Name and Store are essential for individual price entries.
-            # ID is essential for grouping.
-            df_items.dropna(subset=['id', 'name', 'store'], inplace=True) 
-            
-            print(f"Successfully loaded and processed {DATA_FILE}. Shape: {df_items.shape}")
-            if df_items.empty and os.path.exists(DATA_FILE) and os.path.getsize(DATA_FILE) > 0:
-                print("Warning: Data file resulted in an empty DataFrame after processing.")
-        else:
-            print(f"Error: Data file {DATA_FILE} not found.")
-            df_items = pd.DataFrame(columns=EXPECTED_COLUMNS)
+        index = build_item_index(df)
+    except Exception as e:
+        print(f"Error building item index: {e}")
+        index = empty_index()
+    try:
+        search_index = build_search_index(df, index)
+    except Exception as e:
+        print(f"Error building search index: {e}")
+        search_index = empty_search_index()
+    try:
+        price_matrix = build_price_matrix(df, index.listing.ids, index.store_names)
+    except Exception as e:
+        print(f"Error building price matrix: {e}")
+        price_matrix = empty_price_matrix()
+    try:
+        price_stats = build_price_stats(price_matrix, index.listing.category_positions)
+    except Exception as e:
+        print(f"Error building price stats: {e}")
+        price_stats = empty_price_stats()
+    return index, search_index, price_matrix, price_stats
+
+def _columnar_is_current():
+    # The columnar copy is used unless it is missing or older than the CSV
+    meta_path = os.path.join(COLUMNAR_DATA_DIR, COLUMNAR_META_FILENAME)
+    if not os.path.exists(meta_path):
+        return False
+    return not os.path.exists(DATA_FILE) or os.path.getmtime(meta_path) >= os.path.getmtime(DATA_FILE)
+
+def _read_frame():
+    # Returns (frame, data version, path it was read from)
+    try:
+        if _columnar_is_current():
+            try:
+                df = read_columnar_data(COLUMNAR_DATA_DIR)
+                version = data_version(COLUMNAR_DATA_DIR)
+                print(f"Successfully memory-mapped {COLUMNAR_DATA_DIR}. Shape: {df.shape}")
+                return df, version, COLUMNAR_DATA_DIR
+            except Exception as e:
+                print(f"Error reading {COLUMNAR_DATA_DIR}: {e}. Falling back to {DATA_FILE}.")
+        df = read_matched_csv(DATA_FILE)
+        return df, data_version(DATA_FILE) if os.path.exists(DATA_FILE) else None, DATA_FILE
     except Exception as e:
         print(f"Error loading data: {e}")
-        df_items = pd.DataFrame(columns=EXPECTED_COLUMNS)
+        return pd.DataFrame(columns=EXPECTED_COLUMNS), None, DATA_FILE
+
+def _artifact_stamp():
+    stamp = []
+    for path in [os.path.join(COLUMNAR_DATA_DIR, COLUMNAR_META_FILENAME), DATA_FILE]:
+        try:
+            stat = os.stat(path)
+            stamp.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamp.append((path, None, None))
+    return tuple(stamp)
+
+def _watch_data(interval_seconds):
+    # Reloads once the data files changed and then stayed the same for a whole interval,
+    # so a pipeline run that is still writing them isn't picked up halfway
+    pending_stamp = None
+    while True:
+        time.sleep(interval_seconds)
+        data = current_data
+        stamp = _artifact_stamp()
+        if data is not None and stamp == data.source_stamp:
+            pending_stamp = None
+            continue
+        if stamp != pending_stamp:
+            pending_stamp = stamp
+            continue
+        pending_stamp = None
+        try:
+            load_data('watcher')
+        except Exception as e:
+            print(f"Error reloading data: {e}")
+
+def start_data_watcher(interval_seconds=DATA_RELOAD_INTERVAL_SECONDS):
+    if interval_seconds <= 0:
+        return None
+    watcher = threading.Thread(target=_watch_data, args=(interval_seconds,), name='data-watcher', daemon=True)
+    watcher.start()
+    print(f"Watching {DATA_FILE} and {COLUMNAR_DATA_DIR} for new data every {interval_seconds:g}s.")
+    return watcher
+
+@app.before_request
+def _start_request_timer():
+    g.request_start_time = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    start_time = g.get('request_start_time')
+    if start_time is not None:
+        # Labelled with the route pattern, not the URL, so item IDs don't each make a new series
+        rule = request.url_rule
+        api_metrics.observe_request(request.method, rule.rule if rule is not None else UNMATCHED_ROUTE,
+                                    response.status_code, time.perf_counter() - start_time, response.content_length or 0)
+    return response
+
+def _cached_response(entry, hit):
+    # 200 with the cached body, or 304 when the client's If-None-Match has its ETag
+    response = app.response_class(entry.body, mimetype='application/json')
+    response.headers.update(entry.headers)
+    response.set_etag(entry.etag)
+    response.headers['Cache-Control'] = f"public, max-age={CACHE_MAX_AGE_SECONDS}"
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response.make_conditional(request)
+
+def _cached_items_page(data, sort, min_stores, store, category, cursor, limit, unit):
+    # Returns (entry, hit) for one /items page
+    key = (sort, min_stores, store and store.strip().lower(), category and category.strip().lower(), cursor, limit, unit)
+    entry = list_response_cache.get(data.version, key)
+    if entry is not None:
+        return entry, True
+
+    index = data.index
+    item_ids, next_cursor, total = list_items(index, sort, min_stores, store, category, cursor, limit, unit)
+    body = app.json.response([item_to_dict(index, index.items[item_id]) for item_id in item_ids]).get_data()
+    headers = {'X-Total-Count': str(total)}
+    if next_cursor is not None:
+        headers['X-Next-Cursor'] = str(next_cursor)
+    return list_response_cache.put(data.version, key, body, headers), False
 
 @app.route('/items', methods=['GET'])
 def get_items():
-    if df_items is None or df_items.empty: # Check if empty even after load_data attempt
-        load_data() # Attempt to load if not already
-    
-    if df_items is None or df_items.empty: # Re-check after load attempt
+    data = _get_data() # Attempts to load if nothing is loaded yet
+
+    if not data.index.items: # Re-check after load attempt
         return jsonify({"error": "Item data is not available. Please ensure matching script has run and data file is correct."}), 500
 
-    items_list = []
-    # Group by the shared 'id'. Other attributes like name, brand should be consistent within this group.
-    for item_id, group in df_items.groupby('id', observed=True, sort=True):
-        price_entries = []
-        stores_for_item = set() # To track unique stores for the current item_id
-        for _, row in group.iterrows():
-            if pd.notna(row['price']):
-                price_entries.append({'price': row['price'], 'store': row['store']})
-                stores_for_item.add(row['store'])
-        
-        # Only add item if it has at least one valid price entry AND appears in at least 3 stores
-        if price_entries and len(stores_for_item) >= 3:
-            first_row = group.iloc[0]
-            items_list.append({
-                'id': int(item_id),
-                'name': first_row['name'],
-                # 'brand': first_row.get('brand', ''), # Use .get for new columns
-                # 'category': first_row.get('category', ''),
-                # 'net_quantity_original': first_row.get('net_quantity', ''),
-                # 'unit_of_measure_original': first_row.get('unit_of_measure', ''),
-                # 'standardized_quantity': first_row.get('standardized_quantity', None), # Can be NaN if conversion failed
-                # 'standardized_unit': first_row.get('standardized_unit', ''),
-                'prices': sorted(price_entries, key=lambda x: x['price']) # Sort prices
-            })
-    
-    return jsonify(items_list[:100])
+    # Query parameters: limit, cursor (from the X-Next-Cursor header of the previous page), store, category,
+    # min_stores (default 3) and sort ('id', 'cheapest', 'spread' or 'unit_price'). Without any, this is the first
+    # 100 items sold in at least 3 stores, in ID order. sort=unit_price also takes a unit ('kg', 'l' or 'kom')
+    # and lists only the items priced in it, lowest price per unit first; with a category only that category is read.
+    limit = request.args.get('limit', default=ITEMS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, ITEMS_MAX_PAGE_SIZE))
+    min_stores = request.args.get('min_stores', default=MIN_STORES_FOR_LISTING, type=int)
+    cursor = request.args.get('cursor')
+    try:
+        cursor = None if cursor is None else int(cursor)
+    except ValueError:
+        return jsonify({"error": f"Invalid cursor: {cursor!r}"}), 400
+
+    sort = request.args.get('sort', 'id')
+    if sort not in LISTING_SORTS:
+        return jsonify({"error": f"Unknown sort '{sort}'. Use one of: {', '.join(LISTING_SORTS)}."}), 400
+    unit = request.args.get('unit')
+    if sort == 'unit_price' and unit not in UNIT_PRICE_UNITS:
+        return jsonify({"error": f"sort=unit_price needs a unit: one of {', '.join(UNIT_PRICE_UNITS)}."}), 400
+    if sort != 'unit_price':
+        unit = None
+
+    # The body stays a plain list; paging information goes in the X-Next-Cursor and X-Total-Count headers
+    entry, hit = _cached_items_page(data, sort, min_stores, request.args.get('store'), request.args.get('category'),
+                                    cursor, limit, unit)
+    return _cached_response(entry, hit)
 
 @app.route('/prices/<int:item_id>', methods=['GET']) # Changed route from /prices to /items
 def get_item_by_id(item_id): # Renamed function
-    if df_items is None or df_items.empty:
-        load_data()
+    data = _get_data()
 
-    if df_items is None or df_items.empty:
+    if not data.index.items:
         return jsonify({"error": "Item data is not available."}), 500
 
-    item_data_group = df_items[df_items['id'] == item_id]
-    
-    if item_data_group.empty:
+    index = data.index
+    record = index.items.get(item_id)
+    if record is None:
         return jsonify({"message": "Item not found"}), 404
-        
-    first_row = item_data_group.iloc[0]
-    price_entries = []
-    for _, row in item_data_group.iterrows():
-        if pd.notna(row['price']):
-            price_entries.append({'price': row['price'], 'store': row['store']})
-            
-    if not price_entries:
+
+    if len(record.prices) == 0:
          return jsonify({"message": "Item found but has no valid price entries"}), 404 # Should be rare if item exists
 
+    entry = item_response_cache.get(data.version, item_id)
+    if entry is not None:
+        return _cached_response(entry, True)
+    entry = item_response_cache.put(data.version, item_id, app.json.response(item_to_dict(index, record)).get_data())
+    return _cached_response(entry, False)
+
+@app.route('/prices/<int:item_id>/history', methods=['GET'])
+def get_item_history(item_id):
+    days = request.args.get('days', default=HISTORY_DEFAULT_DAYS, type=int)
+    days = max(1, min(days, HISTORY_MAX_DAYS))
+
+    data = _get_data()
+    try:
+        first_day, last_day, histories = item_history(item_id, days, HISTORY_FOLDER)
+    except Exception as e:
+        print(f"Error reading price history for item {item_id}: {e}")
+        return jsonify({"error": "Price history is not available."}), 500
+
+    if not histories and item_id not in data.index.items:
+        return jsonify({"message": "Item not found"}), 404
+    return jsonify(history_to_dict(item_id, first_day, last_day, histories))
+
+@app.route('/changes', methods=['GET'])
+def get_changes():
+    # Query parameters: since (YYYY-MM-DD, default the last recorded day), store, min_pct (only price
+    # increases and drops of at least that many percent), kind ('increase', 'drop', 'new' or 'delisted')
+    # and limit. Read from the change sets written with each snapshot, largest change first; the total
+    # before the limit goes in X-Total-Count.
+    since = request.args.get('since')
+    try:
+        since = None if since is None else date.fromisoformat(since)
+    except ValueError:
+        return jsonify({"error": f"Invalid date: {since!r}. Use YYYY-MM-DD."}), 400
+    kind = request.args.get('kind')
+    if kind is not None and kind not in CHANGE_KINDS:
+        return jsonify({"error": f"Unknown kind '{kind}'. Use one of: {', '.join(CHANGE_KINDS)}."}), 400
+    min_pct = request.args.get('min_pct', default=0, type=float)
+    limit = request.args.get('limit', default=CHANGES_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, CHANGES_MAX_LIMIT))
+
+    data = _get_data()
+    try:
+        rows, stores = read_changes(since, HISTORY_FOLDER, request.args.get('store'), min_pct, kind)
+    except Exception as e:
+        print(f"Error reading price changes: {e}")
+        return jsonify({"error": "Price changes are not available."}), 500
+
+    # Names are looked up for the returned rows only
+    items = data.index.items
+    changes = []
+    for row in rows[:limit]:
+        record = items.get(int(row['item_id']))
+        changes.append(change_to_dict(row, stores, record.name if record is not None else None))
+    response = jsonify(changes)
+    response.headers['X-Total-Count'] = str(len(rows))
+    return response
+
+@app.route('/stats/stores', methods=['GET'])
+def get_store_stats():
+    # Price index of every store over the items sold in more than one store (see price_stats.py)
+    data = _get_data()
+    if not data.index.items:
+        return jsonify({"error": "Item data is not available."}), 500
+    return jsonify(data.price_stats.stores)
+
+@app.route('/stats/categories', methods=['GET'])
+def get_category_list():
+    data = _get_data()
+    if not data.index.items:
+        return jsonify({"error": "Item data is not available."}), 500
+    return jsonify([{'category': name, 'shared_items': count} for name, count in data.price_stats.category_counts])
+
+@app.route('/stats/categories/<path:name>', methods=['GET'])
+def get_category_stats(name):
+    data = _get_data()
+    if not data.index.items:
+        return jsonify({"error": "Item data is not available."}), 500
+    stats = category_stats(data.price_stats, name)
+    if stats is None:
+        return jsonify({"message": "Category not found or has no items sold in more than one store"}), 404
+    return jsonify(dict(stats, category=name.strip().lower()))
+
+@app.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    data = current_data
+    return jsonify({
+        'data_version': data.version if data else None,
+        'caches': [item_response_cache.stats(), list_response_cache.stats()],
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Prometheus text format. Data gauges describe the snapshot this process is serving.
+    data = current_data
+    lines = api_metrics.render() + cache_metric_lines([item_response_cache, list_response_cache])
+    lines += format_value_metric('api_data_reloads_total', 'counter', 'Times new data replaced the loaded data.', reload_count)
+    if data is not None:
+        index = data.index
+        lines += format_value_metric('api_data_rows', 'gauge', 'Rows in the loaded data.', index.row_count)
+        lines += format_value_metric('api_data_items', 'gauge', 'Items in the loaded data.', len(index.items))
+        lines += format_value_metric('api_data_listed_items', 'gauge', 'Items listed by /items.', len(index.listed_ids))
+        lines += format_value_metric('api_data_last_load_seconds', 'gauge', 'Time the loaded data took to read and index.', data.load_seconds)
+        lines += format_metric('api_data_build_seconds', 'gauge', 'Time to build each index of the loaded data.', [
+            format_sample('api_data_build_seconds', {'index': 'items'}, index.build_seconds),
+            format_sample('api_data_build_seconds', {'index': 'search'}, data.search_index.build_seconds),
+            format_sample('api_data_build_seconds', {'index': 'price_matrix'}, data.price_matrix.build_seconds),
+            format_sample('api_data_build_seconds', {'index': 'price_stats'}, data.price_stats.build_seconds),
+        ])
+        lines += format_value_metric('api_data_loaded_timestamp_seconds', 'gauge', 'When the loaded data was published.', data.loaded_at)
+        lines += format_value_metric('api_data_info', 'gauge', 'Version and source of the loaded data.', 1,
+                                     {'version': data.version or '', 'source': data.source})
+    return app.response_class('\n'.join(lines) + '\n', content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/status', methods=['GET'])
+def get_status():
+    data = current_data
+    if data is None:
+        return jsonify({'data_version': None, 'reloads': reload_count})
+    return jsonify({
+        'data_version': data.version,
+        'source': data.source,
+        'rows': data.index.row_count,
+        'items': len(data.index.items),
+        'load_seconds': round(data.load_seconds, 3),
+        'loaded_at': datetime.fromtimestamp(data.loaded_at, timezone.utc).isoformat(),
+        'reloads': reload_count,
+    })
+
+@app.route('/search', methods=['GET'])
+def search_items():
+    query = request.args.get('q', '').strip()
+    limit = request.args.get('limit', default=SEARCH_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+
+    data = _get_data()
+
+    if not data.index.items:
+        return jsonify({"error": "Item data is not available."}), 500
+
+    if not query:
+        return jsonify([])
+
+    index = data.index
+    return jsonify([item_to_dict(index, index.items[item_id]) for item_id in search(data.search_index, query, limit)])
+
+def _parse_batch_items(payload):
+    # Accepts {"items": [{"id": 1, "quantity": 2}, ...]} and returns {item_id: quantity} in request order.
+    # Quantity defaults to 1; repeated IDs have their quantities added up.
+    entries = payload.get('items') if isinstance(payload, dict) else None
+    if not isinstance(entries, list):
+        raise ValueError("Request body must be a JSON object with an 'items' list.")
+
+    quantities = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError("Each entry in 'items' must be an object with an 'id'.")
+        item_id = entry.get('id')
+        quantity = entry.get('quantity', 1)
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid item id: {item_id!r}")
+        if isinstance(quantity, bool) or not isinstance(quantity, (int, float)) or quantity <= 0:
+            raise ValueError(f"Invalid quantity for item {item_id}: {quantity!r}")
+        quantities[item_id] = quantities.get(item_id, 0) + quantity
+
+    if len(quantities) > MAX_BATCH_ITEMS:
+        raise ValueError(f"At most {MAX_BATCH_ITEMS} different items can be requested at once.")
+    return quantities
+
+@app.route('/prices/batch', methods=['POST'])
+def get_items_batch():
+    try:
+        quantities = _parse_batch_items(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    data = _get_data()
+
+    if not data.index.items:
+        return jsonify({"error": "Item data is not available."}), 500
+
+    index = data.index
+    records = []
+    not_found = []
+    for item_id in quantities:
+        record = index.items.get(item_id)
+        if record is None or len(record.prices) == 0:
+            not_found.append(item_id)
+        else:
+            records.append(record)
+
+    return jsonify({
+        'items': [item_to_dict(index, record) for record in records],
+        'not_found': not_found,
+        'store_totals': cart_store_totals(index, records, [quantities[record.id] for record in records]),
+    })
+
+@app.route('/cart/optimize', methods=['POST'])
+def optimize_cart_plan():
+    # Body: {"items": [{"id": 1, "quantity": 2}, ...], "max_stores": 2}. Returns the cheapest way to buy
+    # the cart in one store and split across at most max_stores stores. Plans cover as many items
+    # as possible first; items no store in a plan sells are in its 'missing_ids', items without any
+    # price in 'not_found'.
+    payload = request.get_json(silent=True)
+    try:
+        quantities = _parse_batch_items(payload)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    max_stores = payload.get('max_stores', CART_DEFAULT_MAX_STORES)
+    if isinstance(max_stores, bool) or not isinstance(max_stores, int) or max_stores < 1:
+        return jsonify({"error": f"Invalid max_stores: {max_stores!r}"}), 400
+    max_stores = min(max_stores, MAX_PLAN_STORES)
+
+    data = _get_data()
+
+    if not data.index.items:
+        return jsonify({"error": "Item data is not available."}), 500
+
+    single_plan, split_plan, not_found = optimize_cart(data.price_matrix, quantities, max_stores)
     return jsonify({
-        'id': int(item_id),
-        'name': first_row['name'],
-        # 'brand': first_row.get('brand', ''),
-        # 'category': first_row.get('category', ''),
-        # 'net_quantity_original': first_row.get('net_quantity', ''),
-        # 'unit_of_measure_original': first_row.get('unit_of_measure', ''),
-        # 'standardized_quantity': first_row.get('standardized_quantity', None),
-        # 'standardized_unit': first_row.get('standardized_unit', ''),
-        'prices': sorted(price_entries, key=lambda x: x['price'])
+        'max_stores': max_stores,
+        'single_store': plan_to_dict(single_plan),
+        'split': plan_to_dict(split_plan),
+        'not_found': not_found,
     })
 
+# Development server. For production use wsgi.py with gunicorn (see gunicorn.conf.py).
 if __name__ == '__main__':
-    load_data() 
+    load_data()
+    start_data_watcher()
     app.run(debug=True) 
\ No newline at end of file
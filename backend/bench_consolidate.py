@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from consolidate_data import FILES_TO_PROCESS, clean_prices, get_cleaned_price, iter_store_rows, sniff_encoding
+from reference_consolidate import TRICKY_PRICES, reference_store_rows, same_price
+
+# Checks the columnar store-file reader in consolidate_data.py against the row-by-row one it replaced:
+# clean_prices against get_cleaned_price on hand-picked and random price fields, and the parsed rows of
+# every store file against the csv module reader in reference_consolidate.py. Prints the time each reader
+# takes per file; the columnar reader is not much faster, most of consolidation is ID assignment and dedup.
+# Exits with status 1 on any difference. The parity checks also run as tests in test_consolidate_data.py.
+# Usage: python bench_consolidate.py [data folder]
+
+RANDOM_PRICES = 20000
+RANDOM_PRICE_CHARACTERS = list('0123456789.,- "€e+') + ['\xa0', '٣']
+
+def check_prices():
+    # Returns the number of fields clean_prices gets differently from get_cleaned_price
+    rng = np.random.default_rng(0)
+    random_prices = [''.join(rng.choice(RANDOM_PRICE_CHARACTERS, rng.integers(0, 10))) for _ in range(RANDOM_PRICES)]
+    mismatches = 0
+    for decimal_separator in (',', '.'):
+        for label, fields in (('tricky', TRICKY_PRICES), ('random', random_prices)):
+            actual = clean_prices(pd.Series(fields, dtype=object), decimal_separator)
+            for field, price in zip(fields, actual.tolist()):
+                expected = get_cleaned_price(field, decimal_separator)
+                if not same_price(expected, price):
+                    mismatches += 1
+                    print(f"  MISMATCH {field!r} (decimal '{decimal_separator}'): get_cleaned_price {expected!r}, clean_prices {price!r}")
+            print(f"{len(fields)} {label} prices with decimal separator '{decimal_separator}' checked.")
+    return mismatches
+
+def timed_rows(function, *args):
+    start_time = time.perf_counter()
+    rows = list(function(*args))
+    return rows, time.perf_counter() - start_time
+
+def check_store_files(data_folder):
+    # Returns the number of store files whose rows differ
+    mismatches = 0
+    for config in FILES_TO_PROCESS:
+        filepath = os.path.join(data_folder, config.filename)
+        if not os.path.exists(filepath):
+            print(f"{config.filename}: not found, skipped.")
+            continue
+        encoding = sniff_encoding(filepath, config.encodings)
+        expected, reference_seconds = timed_rows(reference_store_rows, filepath, config, encoding)
+        actual, columnar_seconds = timed_rows(iter_store_rows, filepath, config, encoding)
+        print(f"{config.filename}: {len(actual)} rows, csv module {reference_seconds:.3f}s, "
+              f"columnar {columnar_seconds:.3f}s ({reference_seconds / columnar_seconds:.1f}x).")
+        if expected != actual:
+            mismatches += 1
+            differing = [(first, second) for first, second in zip(expected, actual) if first != second]
+            print(f"  MISMATCH {len(expected)} vs {len(actual)} rows, first difference: "
+                  f"{differing[0] if differing else 'row count'}")
+    return mismatches
+
+if __name__ == "__main__":
+    data_folder = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    mismatches = check_prices() + check_store_files(data_folder)
+    print("Outputs match." if not mismatches else f"{mismatches} difference(s).")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,75 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Compares cold start of the API data load from matched_items_v1.csv and from its memory-mapped
+# columnar copy. Every run happens in a fresh interpreter; the numbers are the time spent in
+# load_data() and the resident memory afterwards, split into private (anonymous) pages and
+# file-backed pages that worker processes share through the page cache (Linux only).
+# Usage: python bench_loaders.py [runs]
+
+def read_rss_kb():
+    rss = {}
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'RssAnon', 'RssFile'):
+                    rss[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return rss
+
+def run_child(loader):
+    import app
+    if loader == 'csv':
+        app.COLUMNAR_DATA_DIR = os.path.join('data', 'does-not-exist.columns')
+
+    rss_before = read_rss_kb()
+    start_time = time.perf_counter()
+    df, _, _ = app._read_frame()
+    frame_seconds = time.perf_counter() - start_time
+    rss_frame = read_rss_kb()
+    app._build_indexes(df)
+    total_seconds = time.perf_counter() - start_time
+    rss_after = read_rss_kb()
+
+    print(json.dumps({
+        'rows': len(df),
+        'frame_seconds': frame_seconds,
+        'total_seconds': total_seconds,
+        'frame_rss_delta_kb': {key: rss_frame[key] - rss_before.get(key, 0) for key in rss_frame},
+        'rss_delta_kb': {key: rss_after[key] - rss_before.get(key, 0) for key in rss_after},
+    }))
+
+def run_loader(loader, runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, __file__, '--child', loader], capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+def summarize(loader, results):
+    best = min(results, key=lambda r: r['total_seconds'])
+    print(f"{loader} ({best['rows']} rows)")
+    for label, seconds, rss in [('frame', best['frame_seconds'], best['frame_rss_delta_kb']),
+                                ('frame + index', best['total_seconds'], best['rss_delta_kb'])]:
+        print(f"  {label:<14} {seconds * 1000:8.1f}ms  RSS +{rss.get('VmRSS', 0) / 1024:6.1f}MB "
+              f"(private +{rss.get('RssAnon', 0) / 1024:6.1f}MB, file-backed +{rss.get('RssFile', 0) / 1024:6.1f}MB)")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        run_child(sys.argv[2])
+        sys.exit(0)
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    import app
+    if not os.path.exists(app.DATA_FILE) or not os.path.exists(app.COLUMNAR_DATA_DIR):
+        print(f"Need both {app.DATA_FILE} and {app.COLUMNAR_DATA_DIR}. Run match_high_confidence.py first.")
+        sys.exit(1)
+
+    print(f"Best of {runs} cold starts per loader")
+    summarize('csv', run_loader('csv', runs))
+    summarize('columnar', run_loader('columnar', runs))
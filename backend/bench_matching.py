@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from fuzzy_match import apply_fuzzy_ids
+from matched_data import read_matched_csv
+
+# Scaling of fuzzy matching on the bundled store data: random fractions of the matched items, then
+# the full data copied 2x and 4x as extra stores (with their own IDs) to go past what is bundled.
+# Time per node should stay roughly flat if the matcher scales near-linearly.
+# Usage: python bench_matching.py [matched csv]
+
+FRACTIONS = [0.125, 0.25, 0.5, 1.0]
+COPIES = [2, 4]
+
+def sample_items(df, fraction, seed=0):
+    ids = df['id'].unique()
+    keep = np.random.default_rng(seed).choice(ids, int(len(ids) * fraction), replace=False)
+    return df[df['id'].isin(keep)]
+
+def copy_stores(df, copies):
+    # Every copy gets its own store names and ID range, so it can only fuzzy-match other copies
+    id_offset = int(df['id'].max()) + 1
+    parts = []
+    for copy in range(copies):
+        part = df.copy()
+        part['id'] = part['id'] + copy * id_offset
+        part['store'] = part['store'].astype(str) + ('' if copy == 0 else f"-{copy}")
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+def run(label, df):
+    start_time = time.perf_counter()
+    _, stats = apply_fuzzy_ids(df)
+    seconds = time.perf_counter() - start_time
+    print(f"{label:<10} {len(df):>8} rows {stats.nodes:>8} nodes {stats.blocks:>5} blocks "
+          f"{stats.candidates:>8} candidates {stats.merged:>7} merged  {seconds:7.2f}s  "
+          f"{seconds / stats.nodes * 1e6:6.1f}us/node")
+
+if __name__ == "__main__":
+    data_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join('data', 'matched_items_v1.csv')
+    df_matched = read_matched_csv(data_file)
+    if df_matched.empty:
+        print(f"No data in {data_file}. Run match_high_confidence.py first.")
+        sys.exit(1)
+
+    for fraction in FRACTIONS:
+        run(f"{fraction:g}x", sample_items(df_matched, fraction))
+    for copies in COPIES:
+        run(f"{copies}x", copy_stores(df_matched, copies))
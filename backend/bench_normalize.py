@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+
+import pandas as pd
+
+from consolidate_data import process_csv_files
+from normalize_data import INPUT_CSV, normalize_data, clean_text_field, parse_quantity, standardize_unit, unit_price, TEXT_COLUMNS_TO_CLEAN
+
+# Compares the row-wise normalization (Series.apply / DataFrame.apply over the scalar helpers)
+# with the vectorized normalize_data() on the bundled store CSVs, and checks both give the same frame.
+# Usage: python bench_normalize.py [repeats]
+
+def normalize_data_rowwise(df):
+    raw_names = df['name'].copy()
+    for col in TEXT_COLUMNS_TO_CLEAN:
+        if col in df.columns:
+            df[col] = df[col].apply(clean_text_field)
+
+    parsed_quantities = df['net_quantity'].apply(parse_quantity)
+    standardized_q_u = df.apply(lambda row: standardize_unit(row['unit_of_measure'], parsed_quantities[row.name]), axis=1)
+    df['standardized_quantity'] = [item[0] for item in standardized_q_u]
+    df['standardized_unit'] = [item[1] for item in standardized_q_u]
+
+    prices = pd.to_numeric(df['price'], errors='coerce')
+    unit_prices = df.apply(lambda row: unit_price(prices[row.name], row['net_quantity'], row['unit_of_measure'], raw_names[row.name]), axis=1)
+    df['unit_price'] = [item[0] for item in unit_prices]
+    df['unit_price_unit'] = [item[1] for item in unit_prices]
+    return df
+
+def best_time(normalize, df_input, repeats):
+    best = None
+    result = None
+    for _ in range(repeats):
+        df = df_input.copy()
+        start_time = time.perf_counter()
+        result = normalize(df)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    if not os.path.exists(INPUT_CSV):
+        print(f"{INPUT_CSV} not found, consolidating the bundled store files first...")
+        process_csv_files("data", os.path.basename(INPUT_CSV))
+
+    df_input = pd.read_csv(INPUT_CSV, encoding='utf-8')
+    print(f"Benchmarking normalization on {len(df_input)} rows, best of {repeats} runs")
+
+    rowwise_seconds, df_rowwise = best_time(normalize_data_rowwise, df_input, repeats)
+    vectorized_seconds, df_vectorized = best_time(normalize_data, df_input, repeats)
+
+    pd.testing.assert_frame_equal(df_rowwise, df_vectorized)
+    print("\nOutputs match row for row.")
+    print(f"Row-wise:   {rowwise_seconds:.3f}s")
+    print(f"Vectorized: {vectorized_seconds:.3f}s")
+    print(f"Speedup:    {rowwise_seconds / vectorized_seconds:.1f}x")
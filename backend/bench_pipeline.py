@@ -0,0 +1,90 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from consolidate_data import FILES_TO_PROCESS, process_csv_files
+from match_high_confidence import apply_shared_ids, prepare_for_matching
+from normalize_data import normalize_data
+from pipeline_metrics import RunMetrics
+from run_pipeline import build_matched_frame
+
+# Compares the in-memory pipeline (run_pipeline.py) with the three scripts run one after the other
+# through consolidated_items.csv and normalized_items.csv, on the store files in data/. Both run on a
+# copy of the store files, so they share a fresh item ID map and nothing under data/ is written.
+# Text and ID columns must be identical, except for values such as the brand 'NAN' that pandas' CSV
+# reader turns into missing values, which only the CSV path loses. Float columns may differ in the last
+# bits, because the CSV path parses every float back from text between stages.
+# Exits with status 1 if any column differs by more than that.
+# Usage: python bench_pipeline.py [data folder]
+
+FLOAT_RELATIVE_TOLERANCE = 1e-12
+
+def csv_chain(data_folder, work_folder):
+    # consolidate_data.py -> normalize_data.py -> match_high_confidence.py, minus their logging extras
+    consolidated_path = os.path.join(work_folder, 'consolidated_items.csv')
+    normalized_path = os.path.join(work_folder, 'normalized_items.csv')
+    process_csv_files(data_folder, consolidated_path, metrics=RunMetrics('bench_csv_chain', argv=[]))
+    normalize_data(pd.read_csv(consolidated_path, encoding='utf-8')).to_csv(normalized_path, index=False, encoding='utf-8')
+    df = apply_shared_ids(prepare_for_matching(pd.read_csv(normalized_path)))
+    return df[['id'] + [c for c in df.columns if c != 'id']]
+
+def copy_store_files(data_folder, work_folder):
+    for config in FILES_TO_PROCESS:
+        filepath = os.path.join(data_folder, config.filename)
+        if os.path.exists(filepath):
+            shutil.copy(filepath, work_folder)
+
+def read_back_as_missing(value):
+    return bool(pd.read_csv(io.StringIO(f"value\n{value}\n"))['value'].isna().iloc[0])
+
+def timed(function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start_time
+
+def compare_frames(expected, actual):
+    # Returns a list of differences, empty when the frames match
+    if list(expected.columns) != list(actual.columns) or len(expected) != len(actual):
+        return [f"shape or columns differ: {list(expected.columns)} x {len(expected)} vs {list(actual.columns)} x {len(actual)}"]
+    differences = []
+    for col in expected.columns:
+        first, second = expected[col].reset_index(drop=True), actual[col].reset_index(drop=True)
+        if first.dtype.kind == 'f' or second.dtype.kind == 'f':
+            first, second = first.to_numpy(dtype=float), second.to_numpy(dtype=float)
+            if not np.allclose(first, second, rtol=FLOAT_RELATIVE_TOLERANCE, atol=0, equal_nan=True):
+                differences.append(f"{col}: values differ beyond rounding")
+            else:
+                bitwise = ~((first == second) | (np.isnan(first) & np.isnan(second)))
+                if bitwise.any():
+                    print(f"  {col}: {bitwise.sum()} values differ in the last bits")
+        else:
+            first, second = first.fillna('').astype(str), second.fillna('').astype(str)
+            differ = first != second
+            lost_in_csv = differ & (first == '')
+            lost_in_csv[lost_in_csv] = second[lost_in_csv].map(read_back_as_missing)
+            if lost_in_csv.any():
+                print(f"  {col}: {lost_in_csv.sum()} values the CSV reader turns into missing values, e.g. {second[lost_in_csv].iloc[0]!r}")
+            if (differ & ~lost_in_csv).any():
+                differences.append(f"{col}: {(differ & ~lost_in_csv).sum()} values differ")
+    return differences
+
+if __name__ == "__main__":
+    data_folder = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    with tempfile.TemporaryDirectory(prefix='bench_pipeline_') as work_folder:
+        copy_store_files(data_folder, work_folder)
+        expected, chain_seconds = timed(csv_chain, work_folder, work_folder)
+        actual, memory_seconds = timed(build_matched_frame, work_folder, RunMetrics('bench_in_memory', argv=[]))
+
+    print(f"\n{len(expected)} rows: CSV chain {chain_seconds:.2f}s, in memory {memory_seconds:.2f}s "
+          f"({chain_seconds / memory_seconds:.1f}x).")
+    differences = compare_frames(expected, actual)
+    for difference in differences:
+        print(f"  MISMATCH {difference}")
+    print("Outputs match." if not differences else f"{len(differences)} column(s) differ.")
+    sys.exit(1 if differences else 0)
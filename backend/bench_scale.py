@@ -0,0 +1,174 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+from pipeline_metrics import RunMetrics
+from synthetic_data import DEFAULT_OVERLAP, DEFAULT_SEED, generate_store_files
+
+# Scale benchmark: generates synthetic store files (synthetic_data.py) at several multiples of the
+# bundled data, runs every pipeline stage on them and then loads the result into the API and times
+# each endpoint. Each scale runs in its own process, so its peak memory is its own, and writes a
+# run report to data/reports (bench_scale_<N>x-<timestamp>.json); reports of the same scale from two
+# runs can be compared with pipeline_metrics.py. For the API stages 'rows' are requests.
+# Usage: python bench_scale.py [--scales 1,10,100] [--overlap 0.3] [--seed 0] [--trace-memory] [--profile]
+
+DEFAULT_SCALES = [1, 10, 100]
+# Requests per endpoint. IDs, pages and queries differ between requests, so responses are built, not cached.
+API_REQUESTS = 200
+CART_ITEMS = 20
+
+def _endpoint_requests(app_module, rng):
+    # (stage name, list of (method, path, JSON body)) per endpoint
+    data = app_module.current_data
+    item_ids = data.index.listing.ids
+    all_ids = np.fromiter(data.index.items.keys(), dtype=np.int64, count=len(data.index.items))
+    sampled = rng.choice(all_ids, API_REQUESTS, replace=len(all_ids) < API_REQUESTS).tolist()
+    names = [data.index.items[item_id].name for item_id in sampled]
+    queries = [name.split()[0][:4] + ' ' + name.split()[-1] if len(name.split()) > 1 else name for name in names]
+    carts = [{'items': [{'id': int(item_id), 'quantity': int(rng.integers(1, 4))}
+                        for item_id in rng.choice(item_ids if len(item_ids) >= CART_ITEMS else all_ids, CART_ITEMS)]}
+             for _ in range(API_REQUESTS)]
+    return [
+        ('api_prices', [('GET', f"/prices/{item_id}", None) for item_id in sampled]),
+        ('api_price_history', [('GET', f"/prices/{item_id}/history", None) for item_id in sampled]),
+        ('api_search', [('GET', f"/search?q={quote(query)}", None) for query in queries]),
+        ('api_prices_batch', [('POST', '/prices/batch', cart) for cart in carts]),
+        ('api_cart_optimize', [('POST', '/cart/optimize', cart) for cart in carts]),
+    ]
+
+def _page_through(client, path, pages):
+    # Follows X-Next-Cursor for up to 'pages' pages; every page is a different cache key
+    requests = 0
+    cursor = None
+    while requests < pages:
+        response = client.get(path + (f"&cursor={cursor}" if cursor is not None else ''))
+        requests += 1
+        cursor = response.headers.get('X-Next-Cursor')
+        if response.status_code != 200 or cursor is None:
+            break
+    return requests
+
+def run_api_benchmark(folder, metrics, seed):
+    import app as app_module # Imported here so the data paths can be pointed at folder first
+    app_module.DATA_FILE = os.path.join(folder, 'matched_items_v1.csv')
+    app_module.COLUMNAR_DATA_DIR = os.path.join(folder, 'matched_items_v1.columns')
+    app_module.HISTORY_FOLDER = os.path.join(folder, 'history')
+    with metrics.stage('api_load_data') as stage:
+        data = app_module.load_data()
+        stage['rows'] = data.index.row_count
+
+    client = app_module.app.test_client()
+    for sort in ['id', 'cheapest', 'spread']:
+        with metrics.stage(f"api_items_{sort}") as stage:
+            stage['rows'] = _page_through(client, f"/items?sort={sort}&min_stores=1&limit=100", API_REQUESTS)
+    with metrics.stage('api_items_unit_price') as stage:
+        stage['rows'] = _page_through(client, '/items?sort=unit_price&unit=kg&min_stores=1&limit=100', API_REQUESTS)
+
+    for name, requests in _endpoint_requests(app_module, np.random.default_rng(seed)):
+        with metrics.stage(name) as stage:
+            for method, path, body in requests:
+                response = client.open(path, method=method, json=body)
+                if response.status_code >= 500:
+                    print(f"{path}: status {response.status_code}")
+            stage['rows'] = len(requests)
+
+def run_scale(scale, overlap, seed):
+    # Runs in a child process; returns the report path
+    from matched_data import read_matched_csv, write_columnar_data
+    from price_history import record_snapshot
+    from run_pipeline import build_matched_frame
+
+    metrics = RunMetrics(f"bench_scale_{scale:g}x")
+    with tempfile.TemporaryDirectory(prefix=f"bench_scale_{scale:g}x_") as folder:
+        with metrics.stage('generate') as stage:
+            stage['rows'] = generate_store_files(folder, scale, overlap, seed)
+        input_rows = stage['rows']
+
+        df = build_matched_frame(folder, metrics)
+        matched_path = os.path.join(folder, 'matched_items_v1.csv')
+        with metrics.stage('write') as stage:
+            df.to_csv(matched_path, index=False, encoding='utf-8')
+            stage['rows'] = len(df)
+        unique_ids = int(df['id'].nunique())
+        del df
+        with metrics.stage('write_columnar') as stage:
+            df_saved = read_matched_csv(matched_path)
+            write_columnar_data(df_saved, os.path.join(folder, 'matched_items_v1.columns'))
+            stage['rows'] = len(df_saved)
+        with metrics.stage('record_history') as stage:
+            record_snapshot(df_saved, folder=os.path.join(folder, 'history'))
+            stage['rows'] = len(df_saved)
+        matched_rows = len(df_saved)
+        del df_saved
+
+        run_api_benchmark(folder, metrics, seed)
+        return metrics.finish(scale=scale, overlap=overlap, seed=seed, input_rows=input_rows,
+                              matched_rows=matched_rows, unique_ids=unique_ids)
+
+def _stage_table(reports):
+    # stage -> {scale: (seconds, rows, max RSS)}, per-store stages summed over stores
+    table = {}
+    for scale, report in reports:
+        for entry in report['stages']:
+            seconds, rows, rss = table.setdefault(entry['name'], {}).get(scale, (0.0, 0, 0.0))
+            table[entry['name']][scale] = (seconds + entry['seconds'], rows + (entry['rows'] or 0),
+                                           max(rss, entry['max_rss_mb'] or 0))
+    return table
+
+def print_summary(reports):
+    scales = [scale for scale, _ in reports]
+    base = scales[0]
+    print(f"\n{'stage':<24}" + ''.join(f"{f'{scale:g}x s':>10}" for scale in scales)
+          + ''.join(f"{f'{scale:g}x/{base:g}x':>10}" for scale in scales[1:])
+          + ''.join(f"{f'{scale:g}x MB':>10}" for scale in scales))
+    for stage, by_scale in _stage_table(reports).items():
+        line = f"{stage:<24}" + ''.join(f"{by_scale[scale][0]:10.3f}" if scale in by_scale else f"{'-':>10}" for scale in scales)
+        # Time per row (per request for the API stages) against the first scale: 1.00 is linear
+        # for the pipeline stages and flat latency for the API ones
+        for scale in scales[1:]:
+            if scale in by_scale and base in by_scale and by_scale[base][0] > 0 and by_scale[scale][1] and by_scale[base][1]:
+                ratio = (by_scale[scale][0] / by_scale[scale][1]) / (by_scale[base][0] / by_scale[base][1])
+                line += f"{ratio:10.2f}"
+            else:
+                line += f"{'-':>10}"
+        line += ''.join(f"{by_scale[scale][2]:10.0f}" if scale in by_scale else f"{'-':>10}" for scale in scales)
+        print(line)
+    print(f"{'total':<24}" + ''.join(f"{report['total_seconds']:10.3f}" for _, report in reports))
+    print(f"{'peak RSS MB':<24}" + ''.join(f"{report['max_rss_mb']:10.0f}" for _, report in reports))
+    print(f"{'input rows':<24}" + ''.join(f"{report['summary']['input_rows']:10d}" for _, report in reports))
+    print(f"Columns 'Nx/{base:g}x' are time per row, or per request for api_* stages, relative to {base:g}x (1.00 = linear).")
+
+def _option(name, default, convert):
+    return convert(sys.argv[sys.argv.index(name) + 1]) if name in sys.argv else default
+
+if __name__ == "__main__":
+    overlap = _option('--overlap', DEFAULT_OVERLAP, float)
+    seed = _option('--seed', DEFAULT_SEED, int)
+    if '--child-scale' in sys.argv:
+        print(f"REPORT {run_scale(_option('--child-scale', 1, float), overlap, seed)}")
+        sys.exit(0)
+
+    scales = _option('--scales', DEFAULT_SCALES, lambda text: [float(value) for value in text.split(',')])
+    passthrough = [flag for flag in ('--trace-memory', '--profile') if flag in sys.argv]
+    reports = []
+    for scale in scales:
+        print(f"Scale {scale:g}x...")
+        start_time = time.perf_counter()
+        result = subprocess.run([sys.executable, __file__, '--child-scale', str(scale), '--overlap', str(overlap),
+                                 '--seed', str(seed)] + passthrough, capture_output=True, text=True)
+        report_lines = [line for line in result.stdout.splitlines() if line.startswith('REPORT ')]
+        if result.returncode != 0 or not report_lines:
+            print(result.stdout[-2000:] + result.stderr[-2000:])
+            print(f"Scale {scale:g}x failed with status {result.returncode}.")
+            break
+        with open(report_lines[-1][len('REPORT '):], 'r', encoding='utf-8') as f:
+            reports.append((scale, json.load(f)))
+        print(f"  done in {time.perf_counter() - start_time:.1f}s, report {report_lines[-1][len('REPORT '):]}")
+    if reports:
+        print_summary(reports)
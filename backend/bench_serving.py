@@ -0,0 +1,141 @@
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+# Load test for the API on the bundled data. Keeps CONCURRENCY connections busy for DURATION_SECONDS
+# with a mix of lookups and reports requests per second and p50/p99 latency per endpoint.
+# Run against a server that is already up:
+#   python bench_serving.py http://127.0.0.1:8000
+# or let it start the development server (app.py, standard library JSON) and then gunicorn with
+# wsgi.py (preloaded data, orjson if installed) one after the other and compare them:
+#   python bench_serving.py --compare
+# The client runs on the same machine as the server, so both compete for the same CPUs.
+
+DURATION_SECONDS = 15
+CONCURRENCY = 8
+DEV_PORT = 5055
+GUNICORN_PORT = 8055
+SERVER_START_TIMEOUT_SECONDS = 120
+
+def _request_mix(item_ids, queries):
+    # (endpoint label, method, path, body) picked per request; weights roughly follow the frontend
+    rng = random.Random()
+    cart = lambda: {'items': [{'id': item_id, 'quantity': rng.randint(1, 3)} for item_id in rng.sample(item_ids, 20)]}
+    choices = [
+        (40, lambda: ('/prices/<id>', 'GET', f"/prices/{rng.choice(item_ids)}", None)),
+        (20, lambda: ('/items', 'GET', f"/items?sort={rng.choice(['id', 'cheapest', 'spread'])}&min_stores=1&limit=50", None)),
+        (20, lambda: ('/search', 'GET', f"/search?q={quote(rng.choice(queries))}", None)),
+        (10, lambda: ('/prices/batch', 'POST', '/prices/batch', cart())),
+        (10, lambda: ('/cart/optimize', 'POST', '/cart/optimize', cart())),
+    ]
+    weights = [weight for weight, _ in choices]
+    return lambda: rng.choices(choices, weights)[0][1]()
+
+def _worker(host, port, next_request, deadline, results, errors):
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    while time.perf_counter() < deadline:
+        label, method, path, body = next_request()
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload else {}
+        start_time = time.perf_counter()
+        try:
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append((label, response.status))
+        except (OSError, http.client.HTTPException) as e:
+            errors.append((label, str(e)))
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        results.append((label, time.perf_counter() - start_time))
+    connection.close()
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def run_load(base_url, duration=DURATION_SECONDS, concurrency=CONCURRENCY):
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+
+    # IDs and search terms come from the server itself, so any data set works
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    connection.request('GET', '/items?min_stores=1&limit=1000')
+    listed = json.loads(connection.getresponse().read())
+    connection.close()
+    item_ids = [item['id'] for item in listed]
+    queries = sorted({item['name'].split()[0][:4] for item in listed if item['name'].split()})
+
+    results, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=_worker, args=(host, port, _request_mix(item_ids, queries), deadline, results, errors))
+               for _ in range(concurrency)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+
+    summary = {}
+    for label in sorted({label for label, _ in results}) + ['all']:
+        latencies = sorted(seconds for entry_label, seconds in results if label in (entry_label, 'all'))
+        summary[label] = {
+            'requests': len(latencies),
+            'rps': len(latencies) / elapsed,
+            'p50_ms': _percentile(latencies, 0.50) * 1000,
+            'p99_ms': _percentile(latencies, 0.99) * 1000,
+        }
+    return summary, errors
+
+def print_summary(title, summary, errors):
+    print(title)
+    for label, stats in summary.items():
+        print(f"  {label:<16} {stats['requests']:>7} requests  {stats['rps']:8.1f} req/s  "
+              f"p50 {stats['p50_ms']:7.2f}ms  p99 {stats['p99_ms']:7.2f}ms")
+    if errors:
+        print(f"  {len(errors)} errors, first: {errors[0]}")
+
+def _wait_until_up(port, process):
+    deadline = time.perf_counter() + SERVER_START_TIMEOUT_SECONDS
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/status')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"server on port {port} did not come up")
+
+def run_server(label, command, port, env):
+    process = subprocess.Popen(command, env=dict(os.environ, DATA_RELOAD_INTERVAL_SECONDS='0', **env),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_until_up(port, process)
+        print_summary(label, *run_load(f"http://127.0.0.1:{port}"))
+    finally:
+        process.terminate()
+        process.wait()
+
+if __name__ == "__main__":
+    if '--compare' in sys.argv:
+        run_server(f"Development server (app.py, debug, standard library JSON), {CONCURRENCY} connections",
+                   [sys.executable, '-c', f"import app; app.load_data(); app.app.run(port={DEV_PORT}, debug=True, use_reloader=False)"],
+                   DEV_PORT, {'API_JSON_ENCODER': 'stdlib'})
+        run_server(f"gunicorn (wsgi.py, preloaded, gunicorn.conf.py), {CONCURRENCY} connections",
+                   [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f"127.0.0.1:{GUNICORN_PORT}", 'wsgi:app'],
+                   GUNICORN_PORT, {})
+    else:
+        base_url = sys.argv[1] if len(sys.argv) > 1 else 'http://127.0.0.1:8000'
+        print_summary(f"{base_url}, {CONCURRENCY} connections", *run_load(base_url))
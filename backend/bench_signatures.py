@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from match_high_confidence import add_match_signature, prepare_for_matching
+from reference_signatures import legacy_signatures, same_groups
+
+# Checks that the hashed match signatures group rows exactly like the old per-row string signatures
+# and times both. Quantities are rounded first so both see canonical values; on raw data the old
+# signature also split e.g. 148.8 and 148.79999999999998, which is reported separately.
+# Exits with status 1 if any grouping differs. The grouping checks also run as tests in test_match_signatures.py.
+# Usage: python bench_signatures.py [normalized csv]
+
+def timed(function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start_time
+
+if __name__ == "__main__":
+    data_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join('data', 'normalized_items.csv')
+    if not os.path.exists(data_file):
+        print(f"Error: {data_file} not found. Run normalize_data.py first.")
+        sys.exit(1)
+    df_raw = prepare_for_matching(pd.read_csv(data_file))
+    failures = 0
+
+    df_canonical = df_raw.copy()
+    df_canonical['standardized_quantity'] = df_canonical['standardized_quantity'].round(6)
+    legacy, legacy_seconds = timed(legacy_signatures, df_canonical)
+    hashed, hashed_seconds = timed(lambda frame: add_match_signature(frame.copy())['match_signature'], df_canonical)
+    identical = same_groups(legacy, hashed)
+    failures += not identical
+    print(f"{len(df_canonical)} rows, {legacy.nunique()} groups: string signatures {legacy_seconds:.3f}s, "
+          f"hashed {hashed_seconds:.3f}s ({legacy_seconds / hashed_seconds:.0f}x). "
+          f"Groupings {'identical' if identical else 'DIFFERENT'}.")
+    print(f"Signature memory: strings {legacy.memory_usage(deep=True) / 1e6:.1f} MB, "
+          f"hashed {hashed.memory_usage(deep=True) / 1e6:.1f} MB.")
+
+    raw_groups = legacy_signatures(df_raw).nunique()
+    hashed_groups = add_match_signature(df_raw.copy())['match_signature'].nunique()
+    print(f"Raw quantities: {raw_groups} string signature groups, {hashed_groups} hashed groups "
+          f"({raw_groups - hashed_groups} merged by canonical quantities).")
+
+    # Spellings of one quantity that the string signature kept apart
+    df_spellings = pd.DataFrame({
+        'id': [1, 2, 3, 4, 5],
+        'name': ['Mlijeko', 'mlijeko ', 'MLIJEKO', 'Mlijeko', 'Mlijeko'],
+        'brand': ['Dukat'] * 5,
+        'standardized_quantity': pd.Series([500, 500.0, '500', np.nan, None], dtype=object),
+        'standardized_unit': ['g'] * 5,
+    })
+    spelling_ids = add_match_signature(df_spellings)['match_signature'].tolist()
+    spellings_ok = len(set(spelling_ids[:3])) == 1 and spelling_ids[3] == spelling_ids[4] and spelling_ids[0] != spelling_ids[3]
+    failures += not spellings_ok
+    print(f"500 / 500.0 / '500' share a key and NaN / None share another: {'yes' if spellings_ok else 'NO'}.")
+
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,143 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Cheapest way to buy a cart: from one store, or split across at most K stores.
+# Runs on a dense item x store matrix of lowest prices (NaN where a store doesn't sell the item),
+# built once per data load. A cart is evaluated for every subset of the stores that sell any of
+# its items at once: the cost of a subset is the per-item minimum over its columns.
+
+# 'item_ids' are ascending and give the row of each item in 'prices'; columns follow 'store_names'
+PriceMatrix = namedtuple('PriceMatrix', ['item_ids', 'store_names', 'prices', 'build_seconds'])
+
+# One way to buy the cart. 'lines' are (item_id, store, unit price, quantity) per item bought and
+# 'missing_ids' the items none of the plan's stores sell.
+CartPlan = namedtuple('CartPlan', ['stores', 'total', 'lines', 'missing_ids'])
+
+# Largest number of stores a split plan may use. Bounds the subsets evaluated per cart when there are many stores.
+MAX_PLAN_STORES = 6
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+def empty_price_matrix():
+    return PriceMatrix(_read_only(np.empty(0, dtype=np.int64)), (), _read_only(np.empty((0, 0))), 0.0)
+
+
+def build_price_matrix(df, item_ids, store_names):
+    # item_ids and store_names as in the item index (ItemListing.ids and ItemIndex.store_names), so rows
+    # and columns line up with it. A store listing an item more than once counts with its lowest price.
+    start_time = time.perf_counter()
+    prices = np.full((len(item_ids), len(store_names)), np.nan)
+    if df is None or df.empty or len(item_ids) == 0:
+        return PriceMatrix(_read_only(np.asarray(item_ids, dtype=np.int64)), tuple(store_names), _read_only(prices), 0.0)
+
+    row_prices = df['price'].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(row_prices)
+    rows = np.searchsorted(item_ids, df['id'].to_numpy(dtype=np.int64)[valid])
+    columns = pd.Index(store_names).get_indexer(df['store'].astype(str)[valid])
+    np.fmin.at(prices, (rows, columns), row_prices[valid])
+    return PriceMatrix(_read_only(np.asarray(item_ids, dtype=np.int64)), tuple(store_names), _read_only(prices),
+                       time.perf_counter() - start_time)
+
+
+def _subset_costs(costs, max_stores):
+    # Cart cost per item for store subsets of up to max_stores columns of 'costs' (items x stores,
+    # inf where a store doesn't sell the item). Returns (subsets as tuples of columns, subset x item costs).
+    # Subsets grow one store at a time, and only with stores after the last one already in them.
+    # A store that isn't strictly cheaper than the subset for any item is not added: every bigger
+    # subset through it costs the same as one without it, which is also evaluated.
+    store_count = costs.shape[1]
+    level_subsets = [(store,) for store in range(store_count)]
+    level_costs = costs.T.copy()
+    all_subsets, all_costs = list(level_subsets), [level_costs]
+
+    for _ in range(1, max_stores):
+        parents, stores = [], []
+        for position, subset in enumerate(level_subsets):
+            for store in range(subset[-1] + 1, store_count):
+                parents.append(position)
+                stores.append(store)
+        if not parents:
+            break
+        parents = np.asarray(parents)
+        stores = np.asarray(stores)
+        store_costs = costs.T[stores]
+        improves = (store_costs < level_costs[parents]).any(axis=1)
+        parents, stores = parents[improves], stores[improves]
+        if len(parents) == 0:
+            break
+        level_costs = np.minimum(level_costs[parents], costs.T[stores])
+        level_subsets = [level_subsets[parent] + (store,) for parent, store in zip(parents.tolist(), stores.tolist())]
+        all_subsets.extend(level_subsets)
+        all_costs.append(level_costs)
+    return all_subsets, np.concatenate(all_costs)
+
+
+def _best_plan(store_names, item_ids, quantities, unit_prices, costs, store_columns, subsets, subset_costs):
+    # Most items covered first, then the lowest total, then the fewest stores. Every store in the
+    # winning subset is the cheapest one for at least one item, or a smaller subset would tie with it.
+    covered = np.isfinite(subset_costs)
+    missing_counts = (~covered).sum(axis=1)
+    totals = np.where(covered, subset_costs, 0.0).sum(axis=1)
+    sizes = np.array([len(subset) for subset in subsets])
+    best = np.lexsort((sizes, np.round(totals, 2), missing_counts))[0]
+
+    subset = np.asarray(subsets[best])
+    chosen = store_columns[subset[np.argmin(costs[:, subset], axis=1)]]
+    lines, missing_ids = [], []
+    for position, item_id in enumerate(item_ids):
+        if covered[best, position]:
+            column = chosen[position]
+            lines.append((item_id, store_names[column], float(unit_prices[position, column]), quantities[item_id]))
+        else:
+            missing_ids.append(item_id)
+    return CartPlan([store_names[column] for column in store_columns[subset].tolist()],
+                    round(float(totals[best]), 2), lines, missing_ids)
+
+
+def optimize_cart(matrix, quantities, max_stores):
+    # quantities maps item_id -> quantity. Returns (cheapest single-store plan, cheapest plan with at most
+    # max_stores stores, IDs of items without any price); the plans are None when no store sells any item.
+    requested = np.fromiter(quantities.keys(), dtype=np.int64, count=len(quantities))
+    if len(matrix.item_ids) == 0:
+        return None, None, requested.tolist()
+    rows = np.minimum(np.searchsorted(matrix.item_ids, requested), len(matrix.item_ids) - 1)
+    known = matrix.item_ids[rows] == requested
+    not_found = requested[~known].tolist()
+    item_ids = requested[known].tolist()
+    if not item_ids:
+        return None, None, not_found
+
+    unit_prices = matrix.prices[rows[known]]
+    amounts = np.fromiter((quantities[item_id] for item_id in item_ids), dtype=np.float64, count=len(item_ids))
+    # Stores selling none of the items can't improve any plan
+    store_columns = np.flatnonzero(~np.isnan(unit_prices).all(axis=0))
+    costs = unit_prices[:, store_columns] * amounts[:, None]
+    costs[np.isnan(costs)] = np.inf
+
+    subsets, subset_costs = _subset_costs(costs, max(1, min(max_stores, len(store_columns))))
+    plan_inputs = (matrix.store_names, item_ids, quantities, unit_prices, costs, store_columns)
+    single = [position for position, subset in enumerate(subsets) if len(subset) == 1]
+    single_plan = _best_plan(*plan_inputs, [subsets[position] for position in single], subset_costs[single])
+    split_plan = _best_plan(*plan_inputs, subsets, subset_costs)
+    return single_plan, split_plan, not_found
+
+
+def plan_to_dict(plan):
+    if plan is None:
+        return None
+    return {
+        'stores': plan.stores,
+        'total': plan.total,
+        'items': [
+            {'id': item_id, 'store': store, 'price': price, 'quantity': quantity, 'line_total': round(price * quantity, 2)}
+            for item_id, store, price, quantity in plan.lines
+        ],
+        'missing_ids': plan.missing_ids,
+    }
@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+import normalize_data
+from consolidate_data import iter_consolidated_rows
+from pipeline_metrics import RunMetrics
+from run_pipeline import consolidated_frame
+
+# The store files bundled with the repo
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+@pytest.fixture(scope='session')
+def data_folder():
+    return DATA_FOLDER
+
+
+@pytest.fixture(scope='session')
+def consolidated_items():
+    # The bundled store files consolidated in memory, as run_pipeline.py does
+    rows = list(iter_consolidated_rows(DATA_FOLDER, {}, RunMetrics('test', argv=[])))
+    return consolidated_frame(rows)
+
+
+@pytest.fixture(scope='session')
+def normalized_frame(consolidated_items):
+    return normalize_data.normalize_data(consolidated_items.copy())
@@ -1,5 +1,16 @@
+import codecs
 import csv
+import hashlib
 import os
+import pickle
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from pipeline_metrics import RunMetrics, timed_call
 
 def get_cleaned_price(price_str, decimal_separator):
     if not price_str:
@@ -28,116 +39,327 @@ def get_cleaned_price(price_str, decimal_separator):
     except ValueError:
         return None
 
-def process_csv_files(data_folder, output_filename):
-    consolidated_data = []
-    item_name_to_id = {}
-    next_id = 1
-
-    files_to_process = [
-        # (filename, store_name, name_idx, price_idx, brand_idx, quantity_idx, unit_idx, category_idx, delimiter, encodings, dec_sep, skip, quote_char)
-        ('tommy.csv', 'tommy', 2, 7, 3, 6, 5, 4, ',', ['utf-8'], ',', 1, None),
-        ('spar.csv', 'spar', 0, 5, 2, 3, 4, 12, ';', ['utf-8', 'cp1250', 'iso-8859-2'], '.', 1, None),
-        ('lidl.csv', 'lidl', 0, 6, 5, 2, 3, 9, ',', ['utf-8', 'cp1250', 'iso-8859-2'], '.', 1, None),
-        ('konzum.csv', 'konzum', 0, 5, 2, 3, 4, 11, ',', ['utf-8'], '.', 1, None),
-        ('eurospin.csv', 'eurospin', 0, 5, 2, 3, 4, 12, ';', ['utf-8'], '.', 1, '"'),
-        ('studenac.csv', 'studenac', 0, 6, 5, 2, 3, 9, ',', ['utf-8', 'cp1250', 'iso-8859-2'], '.', 1, None)
-    ]
-
-    output_header = ['id', 'name', 'price', 'store', 'brand', 'net_quantity', 'unit_of_measure', 'category']
-    print(f"Output will be written to: {os.path.join(data_folder, output_filename)} with header: {output_header}")
-
-    for config in files_to_process:
-        filename, store_name, name_idx, price_idx, brand_idx, qty_idx, unit_idx, cat_idx, delimiter, encodings, dec_sep, skip_lines, quotechar_val = config
-        filepath = os.path.join(data_folder, filename)
-        print(f"\nProcessing {filename} for store {store_name}...")
-        
-        raw_file_content = None
-        used_encoding = None
-
-        for enc in encodings:
-            try:
-                with open(filepath, 'r', encoding=enc, newline='') as f:
-                    reader_obj = csv.reader(f, delimiter=delimiter, quotechar=quotechar_val) if quotechar_val else csv.reader(f, delimiter=delimiter)
-                    raw_file_content = list(reader_obj)
-                used_encoding = enc
-                print(f"Successfully read {filename} with encoding {used_encoding}")
-                break 
-            except UnicodeDecodeError:
-                print(f"Failed to decode {filename} with {enc}. Trying next...")
-            except FileNotFoundError:
-                print(f"File not found: {filepath}. Skipping.")
-                raw_file_content = None 
-                break
-            except Exception as e:
-                print(f"An error occurred while reading {filename} with {enc}: {e}. Skipping.")
-                raw_file_content = None 
-                break
-        
-        if raw_file_content is None:
-            print(f"Could not read file {filename} after trying specified encodings. Skipping.")
+# How one store's price list is laid out. Each column is a 0-based position or a header name (compared after
+# stripping whitespace and quotes); brand, net_quantity, unit_of_measure and category may be None for a store
+# without them. 'encodings' are tried in order and 'skip_lines' lines are skipped, the last of them being the header.
+# Adding a store is adding its StoreAdapter to FILES_TO_PROCESS.
+StoreAdapter = namedtuple('StoreAdapter', [
+    'filename', 'store', 'name', 'price', 'brand', 'net_quantity', 'unit_of_measure', 'category',
+    'delimiter', 'encodings', 'decimal_separator', 'skip_lines', 'quote_char',
+], defaults=(',', ('utf-8',), '.', 1, '"'))
+
+# Fields read from every store file, in the order of StoreAdapter
+ADAPTER_COLUMNS = ('name', 'price', 'brand', 'net_quantity', 'unit_of_measure', 'category')
+
+FILES_TO_PROCESS = [
+    StoreAdapter('tommy.csv', 'tommy', name=2, price=7, brand=3, net_quantity=6, unit_of_measure=5, category=4,
+                 decimal_separator=','),
+    StoreAdapter('spar.csv', 'spar', name=0, price=5, brand=2, net_quantity=3, unit_of_measure=4, category=12,
+                 delimiter=';', encodings=('utf-8', 'cp1250', 'iso-8859-2')),
+    StoreAdapter('lidl.csv', 'lidl', name=0, price=6, brand=5, net_quantity=2, unit_of_measure=3, category=9,
+                 encodings=('utf-8', 'cp1250', 'iso-8859-2')),
+    StoreAdapter('konzum.csv', 'konzum', name=0, price=5, brand=2, net_quantity=3, unit_of_measure=4, category=11),
+    StoreAdapter('eurospin.csv', 'eurospin', name=0, price=5, brand=2, net_quantity=3, unit_of_measure=4, category=12,
+                 delimiter=';'),
+    StoreAdapter('studenac.csv', 'studenac', name=0, price=6, brand=5, net_quantity=2, unit_of_measure=3, category=9,
+                 encodings=('utf-8', 'cp1250', 'iso-8859-2')),
+]
+
+OUTPUT_HEADER = ['id', 'name', 'price', 'store', 'brand', 'net_quantity', 'unit_of_measure', 'category']
+
+# Bytes read from the start of a file to pick its encoding
+ENCODING_SNIFF_BYTES = 64 * 1024
+# Parsed rows are handed from the workers to the writer in chunks of this size
+SPOOL_CHUNK_ROWS = 5000
+
+# Item IDs are kept across runs in <data folder>/cache/item_name_to_id.csv (normalized name -> ID), so a
+# product keeps its ID when other products come and go and the price history compares the same products
+# from one run to the next. New names are numbered after the existing ones; delete the file to renumber.
+CACHE_FOLDER_NAME = "cache"
+ITEM_IDS_FILENAME = "item_name_to_id.csv"
+
+def sniff_encoding(filepath, encodings):
+    # Returns the first encoding that can decode the start of the file, or None if none can.
+    # An incremental decoder is used so a multi-byte character cut off at the end of the sample doesn't count as an error.
+    with open(filepath, 'rb') as f:
+        sample = f.read(ENCODING_SNIFF_BYTES)
+    for enc in encodings:
+        try:
+            codecs.getincrementaldecoder(enc)().decode(sample, final=False)
+            return enc
+        except UnicodeDecodeError:
             continue
+    return None
 
-        header_skipped_count = 0
-        rows_processed_for_file = 0
-        for row_idx, row in enumerate(raw_file_content):
-            if header_skipped_count < skip_lines:
-                header_skipped_count += 1
-                continue
+def clean_prices(values, decimal_separator):
+    # get_cleaned_price over a Series of price fields at once: float64, NaN where it returns None.
+    # Fields with non-ASCII characters (digits of other scripts) are left to get_cleaned_price itself.
+    text = values.fillna('').astype(object)
+    prices = np.full(len(text), np.nan)
+    ascii_text = text.str.isascii().to_numpy(dtype=bool)
 
-            if not row or len(row) < max(name_idx, price_idx, brand_idx, qty_idx, unit_idx, cat_idx) +1: # check if row has enough columns
-                # print(f"Info: Skipping row {row_idx+1} in {filename} due to being empty or having insufficient columns.")
-                continue
+    text = text.str.strip().str.strip('"')
+    if decimal_separator == ',':
+        text = text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    elif decimal_separator == '.':
+        text = text.str.replace(',', '', regex=False)
+    # A minus sign is kept only before the first digit or point
+    negative = text.str.match(r'[^0-9.\-]*-').to_numpy(dtype=bool)
+    digits = text.str.replace(r'[^0-9.]', '', regex=True)
+    cleaned = digits.where(~negative, '-' + digits)
+    cleaned = cleaned.where(~cleaned.str.startswith('.'), '0' + cleaned)
+    valid = cleaned.str.fullmatch(r'-?(?:[0-9]+\.?[0-9]*|\.[0-9]+)').to_numpy(dtype=bool) & ascii_text
+    prices[valid] = cleaned[valid].to_numpy(dtype=object).astype(np.float64)
+
+    for position in np.flatnonzero(~ascii_text).tolist():
+        price = get_cleaned_price(values.iloc[position], decimal_separator)
+        prices[position] = np.nan if price is None else price
+    return prices
+
+def _distinct_values(values, clean):
+    # clean applied to each distinct value once and mapped back to every row. Store files repeat
+    # brands, units, categories and prices many times, so this is much less work than cleaning every field.
+    codes, uniques = pd.factorize(values)
+    cleaned = np.asarray(clean(pd.Series(uniques, dtype=object)))
+    return cleaned[codes] if len(codes) else cleaned[:0]
+
+def _strip_fields(values):
+    return values.str.strip().str.strip('"').to_numpy(dtype=object)
+
+def _rounded_prices(values, decimal_separator):
+    return np.array([round(price, 2) for price in clean_prices(values, decimal_separator).tolist()])
+
+def _read_header(filepath, config, encoding):
+    # The last of the skipped lines, as a list of fields
+    with open(filepath, 'r', encoding=encoding, newline='') as f:
+        for line_number, row in enumerate(csv.reader(f, delimiter=config.delimiter, quotechar=config.quote_char)):
+            if line_number == config.skip_lines - 1:
+                return row
+    return []
+
+def _column_positions(config, encoding, filepath):
+    # Position of each of ADAPTER_COLUMNS in the file, None for columns the store doesn't have
+    positions = {column: getattr(config, column) for column in ADAPTER_COLUMNS}
+    if any(isinstance(position, str) for position in positions.values()):
+        header = _read_header(filepath, config, encoding) if config.skip_lines > 0 else []
+        labels = [label.strip().strip('"').lstrip('\ufeff').strip() for label in header]
+        for column, position in positions.items():
+            if isinstance(position, str):
+                if position not in labels:
+                    raise ValueError(f"no column named {position!r} in the header of {config.filename}")
+                positions[column] = labels.index(position)
+    return positions
+
+def read_store_columns(filepath, config, encoding):
+    # Raw text of the store's columns (see _column_positions) for every record after the skipped lines that
+    # reaches the last of them, as {position: object array}. Shorter records are dropped, as the csv module
+    # reader did. Read with pandas' C parser, given the header's width so a short first record can't renumber
+    # the columns. The C parser reads missing trailing fields as empty, so a file where the last needed column
+    # is empty and isn't the name or price (rows without those are dropped anyway), or that the parser
+    # rejects, is read with the csv module instead.
+    column_positions = _column_positions(config, encoding, filepath)
+    positions = sorted({position for position in column_positions.values() if position is not None})
+    last_position = positions[-1]
+    header = _read_header(filepath, config, encoding) if config.skip_lines > 0 else []
+    try:
+        frame = pd.read_csv(filepath, sep=config.delimiter, quotechar=config.quote_char, encoding=encoding, header=None,
+                            names=range(max(len(header), last_position + 1)), skiprows=config.skip_lines,
+                            usecols=positions, dtype=object, na_filter=False)
+        if last_position not in (column_positions['name'], column_positions['price']) and (frame[last_position] == '').any():
+            frame = None
+    except pd.errors.EmptyDataError:
+        frame = pd.DataFrame({position: [] for position in positions}, dtype=object)
+    except (pd.errors.ParserError, ValueError):
+        frame = None
+    if frame is None:
+        with open(filepath, 'r', encoding=encoding, newline='') as f:
+            rows = list(csv.reader(f, delimiter=config.delimiter, quotechar=config.quote_char))[config.skip_lines:]
+        frame = pd.DataFrame([row for row in rows if len(row) > last_position], dtype=object).reindex(columns=positions).fillna('')
+    return {position: frame[position].to_numpy(dtype=object) for position in positions}
+
+def parse_store_frame(filepath, config, encoding):
+    # The usable rows of a store file as a frame with the fields of a parsed row (see iter_store_rows), price
+    # rounded to cents. Rows without a name or without a valid, non-negative price are dropped.
+    positions = _column_positions(config, encoding, filepath)
+    raw = read_store_columns(filepath, config, encoding)
+    row_count = len(next(iter(raw.values()))) if raw else 0
+    columns = {}
+    for column, position in positions.items():
+        if position is None:
+            columns[column] = np.full(row_count, '', dtype=object)
+        elif column == 'price':
+            columns[column] = _distinct_values(raw[position], lambda values: _rounded_prices(values, config.decimal_separator))
+        else:
+            columns[column] = _distinct_values(raw[position], _strip_fields)
 
+    keep = (columns['name'] != '') & (columns['price'] >= 0)
+    names = columns['name'][keep]
+    return pd.DataFrame({
+        'normalized_name': [' '.join(name.lower().split()) for name in names],
+        'name': names,
+        'price': columns['price'][keep].astype(np.float64),
+        'brand': columns['brand'][keep],
+        'net_quantity': columns['net_quantity'][keep],
+        'unit_of_measure': columns['unit_of_measure'][keep],
+        'category': columns['category'][keep],
+    })
+
+def iter_store_rows(filepath, config, encoding):
+    # Yields (normalized_name, name, price, brand, net_quantity, unit_of_measure, category) for every usable row.
+    # price is a float rounded to cents; it is only formatted as text when written to CSV (see csv_row).
+    frame = parse_store_frame(filepath, config, encoding)
+    yield from zip(*(frame[column].tolist() for column in frame.columns))
+
+def parse_store_file(data_folder, config, spool_path):
+    # Worker: parses one store file into a spool of pickled row chunks and returns
+    # (filename, used_encoding, rows_written, messages). used_encoding is None if the file was skipped.
+    filename = config.filename
+    encodings = list(config.encodings)
+    filepath = os.path.join(data_folder, filename)
+    messages = []
+
+    try:
+        sniffed = sniff_encoding(filepath, encodings)
+    except FileNotFoundError:
+        messages.append(f"File not found: {filepath}. Skipping.")
+        return filename, None, 0, messages
+    except Exception as e:
+        messages.append(f"An error occurred while reading {filename}: {e}. Skipping.")
+        return filename, None, 0, messages
+
+    # Encodings that failed on the sampled prefix would fail on the whole file too.
+    # Later ones are still tried in case an undecodable byte only shows up past the sample.
+    candidates = encodings[encodings.index(sniffed):] if sniffed else []
+    for enc in candidates:
+        rows_written = 0
+        try:
+            with open(spool_path, 'wb') as spool:
+                chunk = []
+                for row in iter_store_rows(filepath, config, enc):
+                    chunk.append(row)
+                    if len(chunk) >= SPOOL_CHUNK_ROWS:
+                        pickle.dump(chunk, spool, pickle.HIGHEST_PROTOCOL)
+                        rows_written += len(chunk)
+                        chunk = []
+                if chunk:
+                    pickle.dump(chunk, spool, pickle.HIGHEST_PROTOCOL)
+                    rows_written += len(chunk)
+            messages.append(f"Successfully read {filename} with encoding {enc}")
+            return filename, enc, rows_written, messages
+        except UnicodeDecodeError:
+            messages.append(f"Failed to decode {filename} with {enc}. Trying next...")
+        except Exception as e:
+            messages.append(f"An error occurred while reading {filename} with {enc}: {e}. Skipping.")
+            return filename, None, 0, messages
+
+    if not sniffed:
+        messages.append(f"Failed to decode the start of {filename} with any of {encodings}.")
+    return filename, None, 0, messages
+
+def iter_spool(spool_path):
+    with open(spool_path, 'rb') as spool:
+        while True:
             try:
-                item_name_raw = row[name_idx].strip().strip('"')
-                price_str = row[price_idx].strip().strip('"') 
-                brand_raw = row[brand_idx].strip().strip('"') if brand_idx is not None and row[brand_idx] else ''
-                qty_raw = row[qty_idx].strip().strip('"') if qty_idx is not None and row[qty_idx] else ''
-                unit_raw = row[unit_idx].strip().strip('"') if unit_idx is not None and row[unit_idx] else ''
-                cat_raw = row[cat_idx].strip().strip('"') if cat_idx is not None and row[cat_idx] else ''
-
-                if not item_name_raw: 
-                    continue
-
-                item_name_normalized = ' '.join(item_name_raw.lower().split())
-                price = get_cleaned_price(price_str, dec_sep)
-                
-                if price is None or price < 0: 
-                    continue
-
-                item_id = item_name_to_id.get(item_name_normalized)
-                if item_id is None:
-                    item_id = next_id
-                    item_name_to_id[item_name_normalized] = next_id
-                    next_id += 1
-                
-                # id, name, price, store, brand, net_quantity, unit_of_measure, category
-                consolidated_data.append([item_id, item_name_raw, f"{price:.2f}", store_name, brand_raw, qty_raw, unit_raw, cat_raw])
-                rows_processed_for_file +=1
-
-            except IndexError:
-                # print(f"Warning: Skipping row {row_idx+1} in {filename} due to missing columns. Row content: {'|'.join(row)}")
-                continue
-            except Exception as e:
-                # print(f"Warning: Error processing row {row_idx+1} in {filename}: {row}. Error: {e}")
+                chunk = pickle.load(spool)
+            except EOFError:
+                return
+            yield from chunk
+
+def load_item_ids(cache_folder):
+    item_name_to_id = {}
+    item_ids_path = os.path.join(cache_folder, ITEM_IDS_FILENAME)
+    if os.path.exists(item_ids_path):
+        with open(item_ids_path, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for name, item_id in reader:
+                item_name_to_id[name] = int(item_id)
+    return item_name_to_id
+
+def save_item_ids(cache_folder, item_name_to_id):
+    os.makedirs(cache_folder, exist_ok=True)
+    item_ids_path = os.path.join(cache_folder, ITEM_IDS_FILENAME)
+    with open(item_ids_path + '.tmp', 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'id'])
+        writer.writerows(item_name_to_id.items())
+    os.replace(item_ids_path + '.tmp', item_ids_path)
+
+def consolidate_store_rows(rows, store_name, item_name_to_id, seen_row_digests):
+    # Turns one store's parsed rows into output rows. Names not in item_name_to_id get the next free ID
+    # (IDs run 1..N in order of first appearance) and rows already in seen_row_digests are skipped.
+    for item_name_normalized, item_name_raw, price, brand_raw, qty_raw, unit_raw, cat_raw in rows:
+        item_id = item_name_to_id.get(item_name_normalized)
+        if item_id is None:
+            item_id = len(item_name_to_id) + 1
+            item_name_to_id[item_name_normalized] = item_id
+
+        # id, name, price, store, brand, net_quantity, unit_of_measure, category
+        out_row = (item_id, item_name_raw, price, store_name, brand_raw, qty_raw, unit_raw, cat_raw)
+        row_digest = hashlib.blake2b('\x1f'.join(map(str, out_row)).encode('utf-8'), digest_size=8).digest()
+        if row_digest in seen_row_digests:
+            continue
+        seen_row_digests.add(row_digest)
+        yield out_row
+
+def csv_row(out_row):
+    # An output row as written to the consolidated CSV, with the price to two decimals
+    return out_row[:2] + (f"{out_row[2]:.2f}",) + out_row[3:]
+
+def iter_consolidated_rows(data_folder, item_name_to_id, metrics, max_workers=None):
+    # Yields the output rows of every store file, in FILES_TO_PROCESS order. New names are added to item_name_to_id.
+    with tempfile.TemporaryDirectory(prefix='consolidate_') as spool_dir, \
+            ProcessPoolExecutor(max_workers=max_workers or len(FILES_TO_PROCESS)) as executor:
+        # All store files are parsed at the same time, one worker each
+        futures = [
+            executor.submit(timed_call, parse_store_file, data_folder, config, os.path.join(spool_dir, f"{position}.pickle"))
+            for position, config in enumerate(FILES_TO_PROCESS)
+        ]
+
+        seen_row_digests = set()
+        # Results are merged in FILES_TO_PROCESS order, whichever worker finishes first,
+        # so IDs are handed out exactly as in a sequential run
+        for position, (config, future) in enumerate(zip(FILES_TO_PROCESS, futures)):
+            store_name = config.store
+            print(f"\nProcessing {config.filename} for store {store_name}...")
+            (filename, used_encoding, rows_processed_for_file, messages), parse_stats = future.result()
+            for message in messages:
+                print(message)
+            metrics.record('parse', rows=rows_processed_for_file, store=store_name, **parse_stats)
+            if used_encoding is None:
+                print(f"Could not read file {filename} after trying specified encodings. Skipping.")
                 continue
-        print(f"Finished processing {filename}. Added {rows_processed_for_file} items.")
+
+            with metrics.stage('consolidate', store_name) as stage:
+                stage['rows'] = 0
+                for out_row in consolidate_store_rows(iter_spool(os.path.join(spool_dir, f"{position}.pickle")), store_name, item_name_to_id, seen_row_digests):
+                    yield out_row
+                    stage['rows'] += 1
+            print(f"Finished processing {filename}. Added {rows_processed_for_file} items.")
+
+def process_csv_files(data_folder, output_filename, max_workers=None, metrics=None):
+    # Stage timings go to metrics (a pipeline_metrics.RunMetrics); without one they are only printed
+    metrics = metrics or RunMetrics('consolidate', argv=[])
+    cache_folder = os.path.join(data_folder, CACHE_FOLDER_NAME)
+    item_name_to_id = load_item_ids(cache_folder)
 
     output_filepath = os.path.join(data_folder, output_filename)
-    try:
-        if consolidated_data:
-            unique_data_tuples = sorted(list(set(tuple(row) for row in consolidated_data)))
-            consolidated_data_unique_list = [list(t) for t in unique_data_tuples]
-        else:
-            consolidated_data_unique_list = []
+    print(f"Output will be written to: {output_filepath} with header: {OUTPUT_HEADER}")
 
+    try:
+        rows_written = 0
         with open(output_filepath, 'w', newline='', encoding='utf-8') as f_out:
             writer = csv.writer(f_out)
-            writer.writerow(output_header) 
-            writer.writerows(consolidated_data_unique_list) 
+            writer.writerow(OUTPUT_HEADER)
+            for out_row in iter_consolidated_rows(data_folder, item_name_to_id, metrics, max_workers):
+                writer.writerow(csv_row(out_row))
+                rows_written += 1
+        save_item_ids(cache_folder, item_name_to_id)
+
         print(f"\nConsolidated data successfully written to {output_filepath}")
         print(f"Total unique item names found (used for ID generation): {len(item_name_to_id)}")
-        print(f"Total rows in consolidated file (excluding header): {len(consolidated_data_unique_list)}")
+        print(f"Total rows in consolidated file (excluding header): {rows_written}")
+        return rows_written
     except Exception as e:
         print(f"Error writing to output file {output_filepath}: {e}")
 
@@ -149,4 +371,6 @@ if __name__ == "__main__":
         print(f"Error: Data directory '{data_directory}' not found. Please ensure it exists in the same location as the script.")
         exit()
 
-    process_csv_files(data_directory, output_csv_name) 
\ No newline at end of file
+    metrics = RunMetrics('consolidate')
+    rows_written = process_csv_files(data_directory, output_csv_name, metrics=metrics)
+    metrics.finish(rows=rows_written)
\ No newline at end of file
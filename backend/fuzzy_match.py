@@ -0,0 +1,236 @@
+import math
+import re
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Links items that exact signature matching left apart, e.g. the same product listed with slightly
+# different names by different stores. Runs on the output of match_high_confidence.apply_shared_ids:
+#   1. Each shared ID becomes one node with its name, brand, package size and the stores selling it.
+#   2. Nodes are blocked on (size unit, size bucket); only nodes in the same block are compared.
+#   3. Inside a block, candidate pairs come from MinHash/LSH over character trigrams of the name,
+#      so the work grows with the number of nodes, not with the number of pairs.
+#   4. Candidates are verified (same numbers in the name, compatible brands, no store in common)
+#      and scored by their estimated trigram Jaccard similarity.
+#   5. Accepted pairs are merged with union-find, best score first. Two groups are never merged
+#      if some store sells both, since a store doesn't list the same product twice.
+# The merged group gets the lowest ID of its members, like exact matching does.
+
+# Minimum estimated Jaccard similarity of name trigrams for a fuzzy link
+FUZZY_MATCH_THRESHOLD = 0.6
+
+# MinHash signature length, split into LSH bands of MINHASH_BAND_ROWS values each.
+# Pairs with similarity s become candidates with probability 1 - (1 - s^rows)^bands.
+MINHASH_PERMUTATIONS = 64
+MINHASH_BAND_ROWS = 4
+MINHASH_SEED = 20240601
+
+# Nodes sharing a band bucket are paired with up to this many neighbours in bucket order, which keeps
+# huge buckets (many near-identical names) from producing a quadratic number of pairs
+LSH_BUCKET_WINDOW = 16
+
+# Package sizes within about this ratio of each other fall into the same bucket
+QUANTITY_BUCKET_RATIO = 1.05
+
+# Sizes written in item names, e.g. "500 g", "0,5l", "4x29g". The last one in a name wins.
+SIZE_PATTERN = re.compile(r'(?:(\d+)\s*x\s*)?(\d+(?:[.,]\d+)?)\s*(kg|dag|gr|g|mg|lit|l|dl|cl|ml|kom)(?![a-zčćđšž])')
+SIZE_UNITS = {
+    'kg': ('g', 1000.0), 'dag': ('g', 10.0), 'gr': ('g', 1.0), 'g': ('g', 1.0), 'mg': ('g', 0.001),
+    'lit': ('ml', 1000.0), 'l': ('ml', 1000.0), 'dl': ('ml', 100.0), 'cl': ('ml', 10.0), 'ml': ('ml', 1.0),
+    'kom': ('kom', 1.0),
+}
+NUMBER_PATTERN = re.compile(r'\d+(?:[.,]\d+)?')
+IGNORED_BRANDS = {'', 'nan', 'no brand', 'none'}
+
+MatchStats = namedtuple('MatchStats', ['nodes', 'blocks', 'candidates', 'verified', 'merged', 'seconds'])
+
+def _mix64(values):
+    # splitmix64 finalizer; uint64 arithmetic wraps around
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xbf58476d1ce4e5b9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94d049bb133111eb)
+    return values ^ (values >> np.uint64(31))
+
+def parse_name(name, standardized_quantity, standardized_unit):
+    # Returns (size unit, size in base units or None, name without the size, numbers left in the name)
+    size_unit, size = '', None
+    matches = list(SIZE_PATTERN.finditer(name))
+    if matches:
+        match = matches[-1]
+        count, amount, unit = match.groups()
+        size_unit, factor = SIZE_UNITS[unit]
+        size = float(amount.replace(',', '.')) * factor * (int(count) if count else 1)
+        name = name[:match.start()] + ' ' + name[match.end():]
+    elif standardized_unit in ('g', 'ml') and standardized_quantity and standardized_quantity > 0:
+        size_unit, size = standardized_unit, float(standardized_quantity)
+
+    numbers = tuple(sorted(number.replace(',', '.') for number in NUMBER_PATTERN.findall(name)))
+    name = ' '.join(NUMBER_PATTERN.sub(' ', name).split())
+    return size_unit, size, name, numbers
+
+def build_nodes(df):
+    # One node per shared ID: first name and brand in file order, sizes from the name, and the
+    # stores that sell it as a bitmask
+    store_codes, store_names = pd.factorize(df['store'].astype(str))
+    if len(store_names) > 63:
+        raise ValueError(f"fuzzy matching supports up to 63 stores, got {len(store_names)}")
+
+    ids = df['id'].to_numpy(dtype=np.int64)
+    node_ids, first_positions, node_of_row = np.unique(ids, return_index=True, return_inverse=True)
+    store_masks = np.zeros(len(node_ids), dtype=np.int64)
+    np.bitwise_or.at(store_masks, node_of_row, np.left_shift(np.int64(1), store_codes.astype(np.int64)))
+
+    names = df['name'].astype(str).str.lower().to_numpy(dtype=object)[first_positions]
+    brands = df['brand'].astype(str).str.lower().str.strip().to_numpy(dtype=object)[first_positions]
+    quantities = pd.to_numeric(df['standardized_quantity'], errors='coerce').to_numpy(dtype=np.float64)[first_positions]
+    units = df['standardized_unit'].astype(str).str.lower().to_numpy(dtype=object)[first_positions]
+
+    parsed_by_key = {}
+    parsed = []
+    for key in zip(names, quantities, units):
+        entry = parsed_by_key.get(key)
+        if entry is None:
+            entry = parsed_by_key[key] = parse_name(*key)
+        parsed.append(entry)
+    size_units = [entry[0] for entry in parsed]
+    buckets = [
+        -1 if entry[1] is None else int(round(math.log(max(entry[1], 1e-6)) / math.log(QUANTITY_BUCKET_RATIO)))
+        for entry in parsed
+    ]
+    block_codes, _ = pd.factorize(pd.Series([f"{unit}|{bucket}" for unit, bucket in zip(size_units, buckets)]))
+
+    # Brand and the leftover numbers are compared as integer codes; -1 is an unknown brand
+    brand_keys = [brand.split()[0] if brand not in IGNORED_BRANDS else '' for brand in brands]
+    brand_codes, _ = pd.factorize(pd.Series(brand_keys))
+    brand_codes[np.array([key == '' for key in brand_keys], dtype=bool)] = -1
+    number_codes, _ = pd.factorize(pd.Series(['|'.join(entry[3]) for entry in parsed]))
+
+    return pd.DataFrame({
+        'id': node_ids,
+        'text': [entry[2] for entry in parsed],
+        'block': block_codes,
+        'brand': brand_codes,
+        'numbers': number_codes,
+        'stores': store_masks,
+    }), node_of_row
+
+def minhash_signatures(texts, permutations=MINHASH_PERMUTATIONS):
+    # (len(texts), permutations) uint32 MinHash signatures over character trigrams, computed without
+    # a Python loop over trigrams: the texts are laid out as a fixed-width array of code points.
+    # Each permutation is a multiply-shift hash of one 64-bit trigram hash.
+    distinct_texts, text_of_node = np.unique(np.array([f" {text} " for text in texts], dtype=str), return_inverse=True)
+    width = distinct_texts.dtype.itemsize // 4
+    codes = distinct_texts.view(np.uint32).reshape(len(distinct_texts), width).astype(np.uint64)
+
+    # Padded texts are at least 3 characters, so every text has a trigram
+    rows, columns = np.nonzero(codes[:, 2:] != 0)
+    grams = _mix64((codes[rows, columns] << np.uint64(42)) | (codes[rows, columns + 1] << np.uint64(21)) | codes[rows, columns + 2])
+    row_starts = np.searchsorted(rows, np.arange(len(distinct_texts)))
+
+    rng = np.random.default_rng(MINHASH_SEED)
+    multipliers = rng.integers(1, 1 << 63, size=permutations, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    increments = rng.integers(0, 1 << 63, size=permutations, dtype=np.uint64)
+    signatures = np.empty((len(distinct_texts), permutations), dtype=np.uint32)
+    for permutation in range(permutations):
+        hashed = (grams * multipliers[permutation] + increments[permutation]) >> np.uint64(32)
+        signatures[:, permutation] = np.minimum.reduceat(hashed, row_starts)
+    return signatures[text_of_node]
+
+def lsh_candidates(signatures, blocks, band_rows=MINHASH_BAND_ROWS, window=LSH_BUCKET_WINDOW):
+    # Unique (a, b) node pairs, a < b, that share a block and at least one LSH band bucket
+    node_count, permutations = signatures.shape
+    block_keys = _mix64(blocks.astype(np.uint64) + np.uint64(1))
+    pairs = []
+    for band_start in range(0, permutations - band_rows + 1, band_rows):
+        keys = _mix64(block_keys ^ np.uint64(band_start))
+        for column in range(band_start, band_start + band_rows):
+            keys = _mix64(keys ^ signatures[:, column].astype(np.uint64))
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        for offset in range(1, window + 1):
+            same = sorted_keys[offset:] == sorted_keys[:-offset]
+            if not same.any():
+                break
+            pairs.append(np.stack([order[:-offset][same], order[offset:][same]], axis=1))
+
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.sort(np.concatenate(pairs), axis=1).astype(np.int64)
+    pair_keys = np.sort(pairs[:, 0] * node_count + pairs[:, 1])
+    pair_keys = pair_keys[np.append(True, pair_keys[1:] != pair_keys[:-1])]
+    return np.stack([pair_keys // node_count, pair_keys % node_count], axis=1)
+
+def score_candidates(nodes, signatures, candidates):
+    # Drops pairs that can't be the same product and scores the rest. Returns (pairs, scores).
+    a, b = candidates[:, 0], candidates[:, 1]
+    block = nodes['block'].to_numpy()
+    brand = nodes['brand'].to_numpy()
+    numbers = nodes['numbers'].to_numpy()
+    stores = nodes['stores'].to_numpy()
+
+    keep = ((block[a] == block[b])
+            & (numbers[a] == numbers[b])
+            & ((brand[a] == brand[b]) | (brand[a] < 0) | (brand[b] < 0))
+            & ((stores[a] & stores[b]) == 0))
+    candidates = candidates[keep]
+    scores = np.empty(len(candidates), dtype=np.float64)
+    # Chunked so the (pairs, permutations) comparison stays small
+    for start in range(0, len(candidates), 100000):
+        chunk = candidates[start:start + 100000]
+        scores[start:start + 100000] = (signatures[chunk[:, 0]] == signatures[chunk[:, 1]]).mean(axis=1)
+    return candidates, scores
+
+def merge_pairs(nodes, pairs, scores, threshold):
+    # Union-find over accepted pairs, best score first. Returns (component root per node, link score per node).
+    parent = np.arange(len(nodes))
+    stores = nodes['stores'].to_numpy().copy()
+    link_scores = np.ones(len(nodes), dtype=np.float64)
+
+    def find(node):
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    accepted = scores >= threshold
+    order = np.argsort(-scores[accepted], kind='stable')
+    merged = 0
+    for (a, b), score in zip(pairs[accepted][order].tolist(), scores[accepted][order].tolist()):
+        root_a, root_b = find(a), find(b)
+        if root_a == root_b or stores[root_a] & stores[root_b]:
+            continue
+        if root_b < root_a:
+            root_a, root_b = root_b, root_a
+        parent[root_b] = root_a
+        stores[root_a] |= stores[root_b]
+        link_scores[a] = min(link_scores[a], score)
+        link_scores[b] = min(link_scores[b], score)
+        merged += 1
+
+    roots = np.array([find(node) for node in range(len(nodes))], dtype=np.int64)
+    return roots, link_scores, merged
+
+def apply_fuzzy_ids(df, threshold=FUZZY_MATCH_THRESHOLD):
+    # Merges the shared IDs of df in place of exact-only matching and adds 'match_confidence':
+    # 1.0 for rows whose ID came from exact matching alone, otherwise the lowest score among the
+    # fuzzy links of their item. Returns (df, MatchStats).
+    start_time = time.perf_counter()
+    df = df.copy()
+    nodes, node_of_row = build_nodes(df)
+    signatures = minhash_signatures(nodes['text'].tolist())
+    candidates = lsh_candidates(signatures, nodes['block'].to_numpy())
+    pairs, scores = score_candidates(nodes, signatures, candidates)
+    roots, link_scores, merged = merge_pairs(nodes, pairs, scores, threshold)
+
+    # Roots are the lowest node of their component and nodes are sorted by ID, so the root's ID is the lowest
+    node_ids = nodes['id'].to_numpy()
+    df['id'] = node_ids[roots][node_of_row]
+    df['match_confidence'] = np.round(link_scores[node_of_row], 4)
+    stats = MatchStats(len(nodes), int(nodes['block'].nunique()), len(candidates), len(pairs), merged,
+                       time.perf_counter() - start_time)
+    return df, stats
@@ -0,0 +1,20 @@
+import os
+
+# gunicorn settings for wsgi.py: gunicorn -c gunicorn.conf.py wsgi:app
+# Overridable through environment variables: BIND, WEB_CONCURRENCY (worker processes) and
+# GUNICORN_THREADS (threads per worker).
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', str(min(2 * (os.cpu_count() or 1) + 1, 8))))
+# Handlers only read the in-memory snapshot, so threads serve requests while another one is encoding
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+preload_app = True
+keepalive = 5
+accesslog = None
+
+def post_fork(server, worker):
+    # Threads don't survive fork, so each worker watches the data files itself; a reload
+    # replaces that worker's snapshot only
+    import app
+    app.start_data_watcher()
@@ -0,0 +1,239 @@
+import csv
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import match_high_confidence
+import normalize_data
+from consolidate_data import FILES_TO_PROCESS, OUTPUT_HEADER, CACHE_FOLDER_NAME, parse_store_file, iter_spool, consolidate_store_rows, csv_row, load_item_ids, save_item_ids
+from pipeline_metrics import RunMetrics, timed_call
+from matched_data import columnar_path_for, read_matched_csv, write_columnar_data
+from price_history import HISTORY_FOLDER, record_snapshot
+
+# Runs consolidate -> normalize -> match, but only for the store files that changed since the last run.
+# Each store's intermediate results are cached under data/cache and the full output files are
+# reassembled from the cache. Item IDs come from a persisted name -> ID map, so an item keeps its ID
+# across runs and new names are numbered after the existing ones.
+# Usage: python incremental_pipeline.py [--full] [--fuzzy] [--profile] [--trace-memory]
+# Every run writes a report of stage timings and memory to data/reports (see pipeline_metrics.py).
+
+DATA_FOLDER = "data"
+MANIFEST_FILENAME = "manifest.json"
+
+# Bump when a change to parsing, normalization or matching makes the cached store outputs stale
+CACHE_VERSION = 5
+
+# Read as text regardless of what a single store's values look like, so every store is
+# typed the same way it is in the combined file
+TEXT_COLUMNS = ['name', 'store', 'brand', 'net_quantity', 'unit_of_measure', 'category', 'standardized_unit', 'unit_price_unit']
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def file_sha256(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_fingerprint(filepath, previous):
+    # Content hash, size and mtime of a file. The hash is only recomputed when size or mtime moved.
+    stat = os.stat(filepath)
+    if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+        sha256 = previous['sha256']
+    else:
+        sha256 = file_sha256(filepath)
+    return {'sha256': sha256, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def load_manifest(cache_folder):
+    manifest_path = os.path.join(cache_folder, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return {'cache_version': CACHE_VERSION, 'stores': {}}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('cache_version') != CACHE_VERSION:
+        print(f"Cache version changed ({manifest.get('cache_version')} -> {CACHE_VERSION}). Rebuilding every store.")
+        return {'cache_version': CACHE_VERSION, 'stores': {}}
+    return manifest
+
+def save_manifest(cache_folder, manifest):
+    manifest_path = os.path.join(cache_folder, MANIFEST_FILENAME)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def store_cache_paths(cache_folder, store_name):
+    return {
+        'consolidated': os.path.join(cache_folder, f"{store_name}.consolidated.csv"),
+        'normalized': os.path.join(cache_folder, f"{store_name}.normalized.csv"),
+        'matching': os.path.join(cache_folder, f"{store_name}.matching.pkl"),
+    }
+
+def read_store_csv(filepath):
+    # Only empty fields are missing, as in run_pipeline.consolidated_frame, so a brand such as 'NaN' stays text,
+    # and floats are read back exactly as written
+    header = pd.read_csv(filepath, nrows=0).columns
+    return pd.read_csv(filepath, dtype={col: str for col in TEXT_COLUMNS if col in header},
+                       keep_default_na=False, na_values=[''], float_precision='round_trip')
+
+def rebuild_store(cache_folder, store_name, rows, item_name_to_id, metrics):
+    # Consolidates, normalizes and prepares one store for matching, writing each stage to the cache
+    paths = store_cache_paths(cache_folder, store_name)
+
+    rows_written = 0
+    with metrics.stage('consolidate', store_name) as stage:
+        with open(paths['consolidated'], 'w', newline='', encoding='utf-8') as f_out:
+            writer = csv.writer(f_out)
+            writer.writerow(OUTPUT_HEADER)
+            for out_row in consolidate_store_rows(rows, store_name, item_name_to_id, set()):
+                writer.writerow(csv_row(out_row))
+                rows_written += 1
+        stage['rows'] = rows_written
+
+    with metrics.stage('normalize', store_name) as stage:
+        df_normalized = normalize_data.normalize_data(read_store_csv(paths['consolidated']))
+        df_normalized.to_csv(paths['normalized'], index=False, encoding='utf-8')
+        stage['rows'] = len(df_normalized)
+
+    # Signatures are computed here once; only the signature -> lowest ID table is combined across stores
+    with metrics.stage('match_signatures', store_name) as stage:
+        df_matching = match_high_confidence.prepare_for_matching(read_store_csv(paths['normalized']))
+        df_matching = match_high_confidence.add_match_signature(df_matching)
+        signature_ids = df_matching.groupby('match_signature')['id'].min()
+        pd.to_pickle({'rows': df_matching, 'signature_ids': signature_ids}, paths['matching'])
+        stage['rows'] = len(df_matching)
+    return rows_written
+
+def concatenate_csv_files(filepaths, output_filepath):
+    # Writes the header of the first file followed by the data rows of all of them
+    with open(output_filepath, 'w', newline='', encoding='utf-8') as f_out:
+        for position, filepath in enumerate(filepaths):
+            with open(filepath, 'r', newline='', encoding='utf-8') as f_in:
+                header = f_in.readline()
+                if position == 0:
+                    f_out.write(header)
+                for block in iter(lambda: f_in.read(HASH_BLOCK_SIZE), ''):
+                    f_out.write(block)
+
+def write_matched_output(matching_paths, output_filepath, fuzzy=False):
+    cached = [pd.read_pickle(path) for path in matching_paths]
+    shared_ids = pd.concat([entry['signature_ids'] for entry in cached]).groupby(level=0).min()
+
+    df_matched = pd.concat([entry['rows'] for entry in cached], ignore_index=True)
+    df_matched['id'] = df_matched['match_signature'].map(shared_ids)
+    df_matched.drop(columns=['match_signature'], inplace=True)
+    # Fuzzy links span stores, so they are found on the combined rows every time
+    if fuzzy:
+        df_matched = match_high_confidence.apply_fuzzy_matching(df_matched)
+
+    cols_order = ['id'] + [c for c in df_matched.columns if c != 'id']
+    df_matched = df_matched[cols_order]
+    df_matched.to_csv(output_filepath, index=False, encoding='utf-8')
+    print(f"Number of unique shared IDs: {df_matched['id'].nunique()}")
+    return len(df_matched)
+
+def run_incremental(data_folder=DATA_FOLDER, force_full=False, max_workers=None, fuzzy=False, metrics=None):
+    # Stage timings go to metrics (a pipeline_metrics.RunMetrics); without one they are only printed
+    metrics = metrics or RunMetrics('incremental_pipeline', argv=[])
+    cache_folder = os.path.join(data_folder, CACHE_FOLDER_NAME)
+    os.makedirs(cache_folder, exist_ok=True)
+
+    manifest = {'cache_version': CACHE_VERSION, 'stores': {}} if force_full else load_manifest(cache_folder)
+    # Kept even on a full rebuild so IDs don't churn; delete the cache folder to renumber from scratch
+    item_name_to_id = load_item_ids(cache_folder)
+    previous_stores = manifest['stores']
+
+    current_stores = {}
+    changed_configs = []
+    for config in FILES_TO_PROCESS:
+        filename, store_name = config.filename, config.store
+        filepath = os.path.join(data_folder, filename)
+        if not os.path.exists(filepath):
+            print(f"File not found: {filepath}. Skipping.")
+            continue
+
+        previous = previous_stores.get(filename)
+        fingerprint = file_fingerprint(filepath, previous)
+        fingerprint['store'] = store_name
+        fingerprint['config'] = repr(config)
+        cache_present = all(os.path.exists(path) for path in store_cache_paths(cache_folder, store_name).values())
+        if (previous and cache_present and previous['sha256'] == fingerprint['sha256']
+                and previous['config'] == fingerprint['config']):
+            fingerprint['rows'] = previous['rows']
+            print(f"{filename} unchanged, using cached results.")
+        else:
+            changed_configs.append(config)
+        current_stores[filename] = fingerprint
+
+    if changed_configs:
+        print(f"Reprocessing {len(changed_configs)} changed store file(s): {', '.join(c.filename for c in changed_configs)}")
+        with tempfile.TemporaryDirectory(prefix='incremental_') as spool_dir, \
+                ProcessPoolExecutor(max_workers=max_workers or len(changed_configs)) as executor:
+            futures = [
+                executor.submit(timed_call, parse_store_file, data_folder, config, os.path.join(spool_dir, f"{position}.pickle"))
+                for position, config in enumerate(changed_configs)
+            ]
+            # New names get their IDs in FILES_TO_PROCESS order, as in a full run
+            for position, (config, future) in enumerate(zip(changed_configs, futures)):
+                (filename, used_encoding, rows_parsed, messages), parse_stats = future.result()
+                for message in messages:
+                    print(message)
+                metrics.record('parse', rows=rows_parsed, store=config.store, **parse_stats)
+                if used_encoding is None:
+                    print(f"Could not read file {filename} after trying specified encodings. Skipping.")
+                    del current_stores[filename]
+                    continue
+                rows = iter_spool(os.path.join(spool_dir, f"{position}.pickle"))
+                current_stores[filename]['rows'] = rebuild_store(cache_folder, config.store, rows, item_name_to_id, metrics)
+                print(f"Rebuilt {filename}: {current_stores[filename]['rows']} rows.")
+
+    store_names = [config.store for config in FILES_TO_PROCESS if config.filename in current_stores]
+    if not store_names:
+        print("No store data available. Nothing written.")
+        return 0
+
+    consolidated_path = os.path.join(data_folder, os.path.basename(normalize_data.INPUT_CSV))
+    normalized_path = os.path.join(data_folder, os.path.basename(match_high_confidence.INPUT_CSV))
+    matched_path = os.path.join(data_folder, os.path.basename(match_high_confidence.OUTPUT_CSV))
+    outputs_present = all(os.path.exists(path) for path in [consolidated_path, normalized_path, matched_path])
+    if (not changed_configs and current_stores.keys() == previous_stores.keys() and outputs_present
+            and manifest.get('fuzzy', False) == fuzzy):
+        print("No store files changed. Outputs are up to date.")
+        save_manifest(cache_folder, dict(manifest, stores=current_stores)) # Picks up touched-but-identical files' mtimes
+        return 0
+
+    # Full outputs are reassembled from the per-store cache, in FILES_TO_PROCESS order
+    store_paths = [store_cache_paths(cache_folder, store_name) for store_name in store_names]
+    with metrics.stage('assemble'):
+        concatenate_csv_files([paths['consolidated'] for paths in store_paths], consolidated_path)
+        concatenate_csv_files([paths['normalized'] for paths in store_paths], normalized_path)
+    with metrics.stage('match') as stage:
+        matched_rows = write_matched_output([paths['matching'] for paths in store_paths], matched_path, fuzzy)
+        stage['rows'] = matched_rows
+    with metrics.stage('write_columnar') as stage:
+        df_matched = read_matched_csv(matched_path)
+        write_columnar_data(df_matched, columnar_path_for(matched_path))
+        stage['rows'] = len(df_matched)
+    with metrics.stage('record_history'):
+        record_snapshot(df_matched, folder=os.path.join(data_folder, os.path.basename(HISTORY_FOLDER)))
+
+    save_item_ids(cache_folder, item_name_to_id)
+    manifest['stores'] = current_stores
+    manifest['fuzzy'] = fuzzy
+    save_manifest(cache_folder, manifest)
+    print(f"\nWrote {consolidated_path}, {normalized_path} and {matched_path} ({matched_rows} rows).")
+    return matched_rows
+
+if __name__ == "__main__":
+    if not os.path.isdir(DATA_FOLDER):
+        print(f"Error: Data directory '{DATA_FOLDER}' not found. Please ensure it exists in the same location as the script.")
+        exit()
+
+    metrics = RunMetrics('incremental_pipeline')
+    matched_rows = run_incremental(force_full='--full' in sys.argv, fuzzy='--fuzzy' in sys.argv, metrics=metrics)
+    metrics.finish(matched_rows=matched_rows)
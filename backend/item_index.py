@@ -0,0 +1,261 @@
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from normalize_data import UNIT_PRICE_UNITS
+
+# Minimum number of distinct stores an item needs to show up in the /items listing
+MIN_STORES_FOR_LISTING = 3
+
+# One entry per shared item ID. 'prices' is sorted ascending and 'store_codes' is aligned with it;
+# codes index into ItemIndex.store_names. 'unit_prices' and 'unit_codes' are aligned too: the price
+# per UNIT_PRICE_UNITS[code], NaN and -1 where the package size is unknown.
+ItemRecord = namedtuple('ItemRecord', ['id', 'name', 'prices', 'store_codes', 'unit_prices', 'unit_codes'])
+
+# Sort orders accepted by list_items(). 'unit_price' needs a unit and lists only items priced in it.
+LISTING_SORTS = ('id', 'cheapest', 'spread', 'unit_price')
+
+# Arrays behind /items, aligned with 'ids' (ascending IDs of every item that has a price).
+# 'orders' maps a sort name to item positions in that order, 'store_members' is one boolean mask
+# per store code and 'category_positions' maps a lowercased category to the sorted positions of
+# the items any store files under it. 'unit_price_orders' maps (lowercased category or None for all
+# items, unit) to the positions of the items priced in that unit, cheapest per unit first.
+ItemListing = namedtuple('ItemListing', [
+    'ids', 'store_counts', 'min_prices', 'price_spreads', 'orders', 'store_members', 'category_positions',
+    'unit_price_orders'
+])
+
+# Immutable view over the matched data, built once per load.
+# 'items' maps item_id -> ItemRecord, 'listed_ids' holds the IDs (ascending) sold in at least
+# MIN_STORES_FOR_LISTING stores, 'build_seconds' is how long the index took to build.
+ItemIndex = namedtuple('ItemIndex', ['items', 'store_names', 'listed_ids', 'listing', 'row_count', 'build_seconds'])
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+def _empty_listing():
+    empty_positions = _read_only(np.empty(0, dtype=np.intp))
+    return ItemListing(
+        _read_only(np.empty(0, dtype=np.int64)), _read_only(np.empty(0, dtype=np.int64)),
+        _read_only(np.empty(0, dtype=np.float64)), _read_only(np.empty(0, dtype=np.float64)),
+        MappingProxyType({sort: empty_positions for sort in LISTING_SORTS if sort != 'unit_price'}), (),
+        MappingProxyType({}), MappingProxyType({}),
+    )
+
+
+def empty_index():
+    return ItemIndex(MappingProxyType({}), (), (), _empty_listing(), 0, 0.0)
+
+
+def build_item_index(df):
+    start_time = time.perf_counter()
+    if df is None or df.empty:
+        return empty_index()
+
+    ids = df['id'].to_numpy(dtype=np.int64)
+    names = df['name'].to_numpy(dtype=object)
+    prices = df['price'].to_numpy(dtype=np.float64)
+    store_codes, store_names = pd.factorize(df['store'], sort=True)
+    store_names = tuple(str(s) for s in store_names)
+    if 'unit_price' in df.columns and 'unit_price_unit' in df.columns:
+        unit_prices = df['unit_price'].to_numpy(dtype=np.float64)
+        unit_codes = pd.Index(UNIT_PRICE_UNITS).get_indexer(df['unit_price_unit'].astype(str)).astype(np.int8)
+    else: # Data written before unit prices existed
+        unit_prices = np.full(len(df), np.nan)
+        unit_codes = np.full(len(df), -1, dtype=np.int8)
+
+    # Display name is taken from the first row of each item, in file order
+    _, first_positions = np.unique(ids, return_index=True)
+
+    # Only rows with a price contribute price entries. lexsort is stable, so equal prices keep file order.
+    valid = ~np.isnan(prices)
+    valid_ids = ids[valid]
+    valid_prices = prices[valid]
+    valid_codes = store_codes[valid].astype(np.int16)
+    order = np.lexsort((valid_prices, valid_ids))
+    valid_ids = valid_ids[order]
+    valid_prices = _read_only(valid_prices[order])
+    valid_codes = _read_only(valid_codes[order])
+    valid_unit_prices = _read_only(unit_prices[valid][order])
+    valid_unit_codes = _read_only(unit_codes[valid][order])
+
+    # Each record holds read-only views into the two sorted arrays
+    group_ids, group_starts = np.unique(valid_ids, return_index=True)
+    group_bounds = np.append(group_starts, len(valid_ids)).tolist()
+    price_slices = {}
+    for pos, item_id in enumerate(group_ids.tolist()):
+        lo, hi = group_bounds[pos], group_bounds[pos + 1]
+        price_slices[item_id] = (valid_prices[lo:hi], valid_codes[lo:hi], valid_unit_prices[lo:hi], valid_unit_codes[lo:hi])
+
+    empty_slices = (_read_only(np.empty(0, dtype=np.float64)), _read_only(np.empty(0, dtype=np.int16)),
+                    _read_only(np.empty(0, dtype=np.float64)), _read_only(np.empty(0, dtype=np.int8)))
+    items = {}
+    for pos in first_positions.tolist():
+        item_id = int(ids[pos])
+        items[item_id] = ItemRecord(item_id, names[pos], *price_slices.get(item_id, empty_slices))
+
+    listing = _build_listing(group_ids, group_starts, valid_ids, valid_prices, valid_codes, valid_unit_prices,
+                             valid_unit_codes, len(store_names), ids[valid], df['category'].to_numpy(dtype=object)[valid])
+    listed_ids = tuple(listing.ids[listing.store_counts >= MIN_STORES_FOR_LISTING].tolist())
+
+    return ItemIndex(MappingProxyType(items), store_names, listed_ids, listing, len(df), time.perf_counter() - start_time)
+
+
+def _build_listing(group_ids, group_starts, sorted_ids, sorted_prices, sorted_codes, sorted_unit_prices, sorted_unit_codes,
+                   store_count, row_ids, row_categories):
+    # sorted_* are the price entries grouped by item (prices ascending), row_* the same rows in file order
+    item_count = len(group_ids)
+    if item_count == 0:
+        return _empty_listing()
+
+    group_ends = np.append(group_starts[1:], len(sorted_ids))
+    entry_positions = np.repeat(np.arange(item_count), group_ends - group_starts)
+    min_prices = sorted_prices[group_starts]
+    price_spreads = sorted_prices[group_ends - 1] - min_prices
+
+    store_members = np.zeros((store_count, item_count), dtype=bool)
+    store_members[sorted_codes, entry_positions] = True
+    store_counts = store_members.sum(axis=0)
+
+    # Stores don't agree on categories, so an item is listed under every category it appears with
+    category_codes, category_names = pd.factorize(pd.Series(row_categories, dtype=object).astype(str).str.lower())
+    row_positions = np.searchsorted(group_ids, row_ids)
+    pair_keys = np.unique(category_codes.astype(np.int64) * item_count + row_positions)
+    pair_codes = pair_keys // item_count
+    bounds = np.searchsorted(pair_codes, np.arange(len(category_names) + 1))
+    category_positions = {
+        name: _read_only(pair_keys[bounds[code]:bounds[code + 1]] % item_count)
+        for code, name in enumerate(category_names)
+    }
+    unit_price_orders = _build_unit_price_orders(group_ids, entry_positions, sorted_unit_prices, sorted_unit_codes,
+                                                 pair_codes, pair_keys % item_count, category_names)
+
+    orders = {
+        'id': np.arange(item_count),
+        'cheapest': np.lexsort((group_ids, min_prices)),
+        'spread': np.lexsort((group_ids, -price_spreads)), # Biggest difference between stores first
+    }
+    return ItemListing(
+        _read_only(group_ids.astype(np.int64)), _read_only(store_counts), _read_only(min_prices), _read_only(price_spreads),
+        MappingProxyType({sort: _read_only(order) for sort, order in orders.items()}),
+        tuple(_read_only(mask) for mask in store_members), MappingProxyType(category_positions),
+        MappingProxyType(unit_price_orders),
+    )
+
+
+def _build_unit_price_orders(group_ids, entry_positions, unit_prices, unit_codes, pair_codes, pair_positions, category_names):
+    # An item's unit price in a unit is its lowest one among the stores. One sort per unit covers every
+    # category: (category, item) pairs are ordered by category, then unit price, then ID, and split.
+    item_count = len(group_ids)
+    orders = {}
+    for unit_code, unit in enumerate(UNIT_PRICE_UNITS):
+        best = np.full(item_count, np.nan)
+        in_unit = unit_codes == unit_code
+        np.fmin.at(best, entry_positions[in_unit], unit_prices[in_unit])
+
+        priced = np.flatnonzero(~np.isnan(best))
+        orders[(None, unit)] = _read_only(priced[np.lexsort((group_ids[priced], best[priced]))])
+
+        keep = ~np.isnan(best[pair_positions])
+        positions, codes = pair_positions[keep], pair_codes[keep]
+        order = np.lexsort((group_ids[positions], best[positions], codes))
+        positions, codes = positions[order], codes[order]
+        bounds = np.searchsorted(codes, np.arange(len(category_names) + 1))
+        for code, name in enumerate(category_names):
+            if bounds[code + 1] > bounds[code]:
+                orders[(name, unit)] = _read_only(positions[bounds[code]:bounds[code + 1]])
+    return orders
+
+
+def list_items(index, sort='id', min_stores=MIN_STORES_FOR_LISTING, store=None, category=None, cursor=None, limit=100,
+               unit=None):
+    # One page of item IDs for /items, the cursor for the next page (None on the last page) and the
+    # number of items that pass the filters.
+    # A cursor is the position in the sort order of the last item returned, so it stays valid for
+    # any combination of filters and costs the same however deep the page is.
+    # Filters are checked only for the items in the sort order; for 'unit_price' that is the presorted
+    # list of one category and unit, not the whole catalog.
+    listing = index.listing
+    if sort == 'unit_price':
+        if unit not in UNIT_PRICE_UNITS:
+            raise ValueError(f"Sorting by unit price needs a unit: one of {', '.join(UNIT_PRICE_UNITS)}.")
+        category = category.strip().lower() if category is not None else None
+        order = listing.unit_price_orders.get((category, unit), listing.orders['id'][:0])
+        category = None # Already applied by the order
+    else:
+        order = listing.orders.get(sort)
+        if order is None:
+            raise ValueError(f"Unknown sort '{sort}'. Use one of: {', '.join(LISTING_SORTS)}.")
+
+    keep = listing.store_counts[order] >= min_stores
+    if store is not None:
+        store = store.strip().lower()
+        if store not in index.store_names:
+            return [], None, 0
+        keep &= listing.store_members[index.store_names.index(store)][order]
+    if category is not None:
+        category_mask = np.zeros(len(listing.ids), dtype=bool)
+        category_mask[listing.category_positions.get(category.strip().lower(), [])] = True
+        keep &= category_mask[order]
+
+    # Positions in 'order' of the items that pass the filters, ascending
+    ranks = np.flatnonzero(keep)
+    start = 0 if cursor is None else np.searchsorted(ranks, cursor, side='right')
+    page_ranks = ranks[start:start + limit]
+    next_cursor = int(page_ranks[-1]) if start + limit < len(ranks) else None
+    return listing.ids[order[page_ranks]].tolist(), next_cursor, len(ranks)
+
+
+def _unit_price_to_dict(unit_price, unit_code):
+    if unit_code < 0:
+        return {'unit_price': None, 'unit': None}
+    return {'unit_price': round(unit_price, 2), 'unit': UNIT_PRICE_UNITS[unit_code]}
+
+
+def item_to_dict(index, record):
+    # Each price carries the store's price per kg, l or piece ('unit_price' and 'unit'), or None for both
+    return {
+        'id': record.id,
+        'name': record.name,
+        'prices': [
+            {'price': price, 'store': index.store_names[code], **_unit_price_to_dict(unit_price, unit_code)}
+            for price, code, unit_price, unit_code in zip(
+                record.prices.tolist(), record.store_codes.tolist(), record.unit_prices.tolist(), record.unit_codes.tolist())
+        ],
+    }
+
+
+def cart_store_totals(index, records, quantities):
+    # Per-store totals for a cart, over the stores that sell at least one of the items.
+    # Returns dicts sorted by total; an item a store doesn't sell is listed in that store's 'missing_ids'.
+    # A store listing an item more than once counts with its lowest price, as in cart_optimizer.build_price_matrix.
+    if not records:
+        return []
+
+    entry_counts = [len(record.prices) for record in records]
+    codes = np.concatenate([record.store_codes for record in records]).astype(np.intp)
+    prices = np.concatenate([record.prices for record in records])
+    entry_rows = np.repeat(np.arange(len(records)), entry_counts)
+
+    unit_prices = np.full((len(records), len(index.store_names)), np.nan)
+    np.fmin.at(unit_prices, (entry_rows, codes), prices)
+    present = ~np.isnan(unit_prices)
+    totals = np.where(present, unit_prices * np.asarray(quantities, dtype=np.float64)[:, None], 0.0).sum(axis=0)
+
+    record_ids = np.array([record.id for record in records])
+    store_totals = []
+    for code in np.flatnonzero(present.any(axis=0)).tolist():
+        store_totals.append({
+            'store': index.store_names[code],
+            'total': round(float(totals[code]), 2),
+            'item_count': int(present[:, code].sum()),
+            'missing_ids': record_ids[~present[:, code]].tolist(),
+        })
+    store_totals.sort(key=lambda entry: entry['total'])
+    return store_totals
@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError: # Optional; the standard library encoder is used without it
+    orjson = None
+
+# JSON encoding for the API. With orjson installed, responses are encoded by orjson straight to bytes,
+# numpy scalars and arrays included. Without it (or with API_JSON_ENCODER=stdlib) Flask's encoder is
+# used, taught the same numpy types. Keys are sorted either way, as Flask does by default.
+
+ORJSON_ENABLED = orjson is not None and os.environ.get('API_JSON_ENCODER', 'orjson') != 'stdlib'
+ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def _numpy_default(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return DefaultJSONProvider.default(value)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    default = staticmethod(_numpy_default)
+
+    def dumps(self, obj, **kwargs):
+        if ORJSON_ENABLED and not kwargs:
+            return orjson.dumps(obj, default=_numpy_default, option=ORJSON_OPTIONS).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if not ORJSON_ENABLED:
+            return super().response(*args, **kwargs)
+        body = orjson.dumps(self._prepare_response_obj(args, kwargs), default=_numpy_default, option=ORJSON_OPTIONS)
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -1,58 +1,80 @@
+import numpy as np
 import pandas as pd
 import os
+import sys
+
+from matched_data import columnar_path_for, read_matched_csv, write_columnar_data
+from fuzzy_match import apply_fuzzy_ids
+from price_history import record_snapshot
+from pipeline_metrics import RunMetrics
 
 # --- Configuration ---
 INPUT_CSV = os.path.join("data", "normalized_items.csv")
 OUTPUT_CSV = os.path.join("data", "matched_items_v1.csv")
+# Typed, memory-mappable copy of OUTPUT_CSV that the API loads instead of parsing the CSV
+OUTPUT_COLUMNAR_DIR = columnar_path_for(OUTPUT_CSV)
+
+# Run with --fuzzy to also link near-identical items across stores after exact matching (see fuzzy_match.py)
 
 # Columns to use for creating a unique product signature for exact matching
 EXACT_MATCH_COLUMNS = ['name', 'brand', 'standardized_quantity', 'standardized_unit']
+# Quantities are compared in millionths of their unit
+QUANTITY_KEY_SCALE = 10 ** 6
+MISSING_QUANTITY_KEY = np.iinfo(np.int64).min
 
-# --- Main Matching Logic ---
-def apply_shared_ids(df):
-    print("Applying shared IDs based on high-confidence matches...")
+# String columns coerced when normalized data is loaded for matching
+STRING_COLUMNS_FOR_PREP = ['name', 'brand', 'unit_of_measure', 'category', 'standardized_unit', 'unit_price_unit']
 
-    # Ensure key columns are in the expected type (string for text, allow float for quantity)
-    for col in ['name', 'brand', 'standardized_unit', 'id']: # Added 'id' to ensure it's a clean string for later ops if needed, though it should be int
+# --- Main Matching Logic ---
+def prepare_for_matching(df):
+    for col in STRING_COLUMNS_FOR_PREP:
         if col in df.columns:
-            if col == 'id':
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int) # Ensure ID is int
-            else:
-                df[col] = df[col].astype(str).fillna('') 
+            df[col] = df[col].astype(str).fillna('')
         else:
-            print(f"Warning: Column '{col}' not found. This might affect matching or ID assignment.")
-            if col in EXACT_MATCH_COLUMNS or col == 'id':
-                print(f"Critical: Column '{col}' is missing. Results might be incorrect.")
-                # If ID is missing, we can't proceed with this logic easily, might need to halt or assign temp IDs.
-                # For now, let script fail if 'id' is truly missing as it's fundamental.
-
-    if 'standardized_quantity' in df.columns:
-        df['standardized_quantity_str'] = df['standardized_quantity'].astype(str).fillna('') 
+            print(f"Warning: Column '{col}' missing from input CSV during type conversion.")
+    df['id'] = pd.to_numeric(df['id'], errors='coerce').fillna(0).astype(int)
+    return df
+
+def canonical_quantities(quantities):
+    # Quantities as integers in millionths, so 500, 500.0 and '500' are one key and float noise
+    # such as 148.79999999999998 lands on 148.8. Missing or unparsable quantities share MISSING_QUANTITY_KEY.
+    values = pd.to_numeric(quantities, errors='coerce').to_numpy(dtype=float)
+    keys = np.full(len(values), MISSING_QUANTITY_KEY, dtype=np.int64)
+    present = np.isfinite(values)
+    keys[present] = np.round(values[present] * QUANTITY_KEY_SCALE).astype(np.int64)
+    return pd.Series(keys, index=quantities.index)
+
+def add_match_signature(df):
+    # Adds 'match_signature', a 64-bit hash of the EXACT_MATCH_COLUMNS. Text is compared lowercased
+    # and stripped, quantities through canonical_quantities.
+    if 'id' in df.columns:
+        df['id'] = pd.to_numeric(df['id'], errors='coerce').fillna(0).astype(int)
     else:
-        print("Warning: Column 'standardized_quantity' not found. It will be ignored if in EXACT_MATCH_COLUMNS.")
-        if 'standardized_quantity' in EXACT_MATCH_COLUMNS:
-             print(f"Critical: Key matching column 'standardized_quantity' is missing. Results might be incorrect.")
-        df['standardized_quantity_str'] = '' 
-
-    def create_match_signature(row):
-        parts = []
-        for col in EXACT_MATCH_COLUMNS:
-            actual_col_name = col
-            if col == 'standardized_quantity':
-                actual_col_name = 'standardized_quantity_str'
-            if actual_col_name in row:
-                parts.append(str(row[actual_col_name]).lower().strip())
-            else:
-                parts.append('') 
-        return '|'.join(parts)
-
-    df['match_signature'] = df.apply(create_match_signature, axis=1)
-
-    # Group by signature and assign the ID of the first item in each group to all items in that group
+        print("Critical: Column 'id' is missing. Results might be incorrect.")
+
+    key_columns = {}
+    for col in EXACT_MATCH_COLUMNS:
+        if col not in df.columns:
+            print(f"Critical: Key matching column '{col}' is missing. Results might be incorrect.")
+            key_columns[col] = np.zeros(len(df), dtype=np.int64) if col == 'standardized_quantity' else ''
+        elif col == 'standardized_quantity':
+            key_columns[col] = canonical_quantities(df[col])
+        else:
+            key_columns[col] = df[col].astype(str).str.lower().str.strip()
+
+    keys = pd.DataFrame(key_columns, index=df.index)
+    df['match_signature'] = pd.util.hash_pandas_object(keys, index=False).astype(np.int64)
+    return df
+
+def apply_shared_ids(df):
+    print("Applying shared IDs based on high-confidence matches...")
+    df = add_match_signature(df)
+
+    # Group by signature and assign the lowest ID in each group to all items in that group
     # We need to ensure the 'id' column is suitable to be taken as the group's representative ID.
-    # The .transform('first') will pick the 'id' from the first row within each group.
-    print("Grouping by match signature and propagating first encountered ID to matched items...")
-    df['id'] = df.groupby('match_signature')['id'].transform('first')
+    # The .transform('min') picks the same ID whatever order the consolidated rows arrive in.
+    print("Grouping by match signature and propagating lowest ID to matched items...")
+    df['id'] = df.groupby('match_signature')['id'].transform('min')
     
     # The number of unique IDs after this process should be equal to the number of unique match_signatures
     num_unique_ids_after_match = df['id'].nunique()
@@ -62,42 +84,65 @@ def apply_shared_ids(df):
     if num_unique_ids_after_match != num_unique_signatures:
         print("Warning: Mismatch between unique signatures and unique IDs after matching. Check grouping logic.")
 
-    df.drop(columns=['match_signature', 'standardized_quantity_str'], inplace=True, errors='ignore')
+    df.drop(columns=['match_signature'], inplace=True)
     
     return df
 
+def apply_fuzzy_matching(df):
+    # Second pass that links shared IDs whose names differ slightly between stores (see fuzzy_match.py)
+    print("Linking near-identical items across stores with fuzzy matching...")
+    df, stats = apply_fuzzy_ids(df)
+    print(f"Compared {stats.verified} candidate pairs of {stats.nodes} items in {stats.blocks} size blocks; "
+          f"{stats.merged} links accepted in {stats.seconds:.2f}s.")
+    print(f"Number of unique IDs after fuzzy matching: {df['id'].nunique()}")
+    return df
+
 if __name__ == "__main__":
     if not os.path.exists(INPUT_CSV):
         print(f"Error: Input file '{INPUT_CSV}' not found. Please run `normalize_data.py` first.")
     else:
+        metrics = RunMetrics('match')
         print(f"Loading normalized data from {INPUT_CSV}...")
-        df_normalized = pd.read_csv(INPUT_CSV)
-        
-        string_cols_for_prep = ['name', 'brand', 'unit_of_measure', 'category', 'standardized_unit']
-        for col in string_cols_for_prep:
-            if col in df_normalized.columns:
-                df_normalized[col] = df_normalized[col].astype(str).fillna('')
-            else:
-                print(f"Warning: Column '{col}' missing from input CSV during type conversion.")
+        with metrics.stage('read') as stage:
+            df_normalized = pd.read_csv(INPUT_CSV)
+            stage['rows'] = len(df_normalized)
         
         # Ensure 'id' column exists and is numeric before matching starts
         if 'id' not in df_normalized.columns:
             print("Critical Error: 'id' column is missing from normalized_items.csv. Cannot proceed.")
             exit()
-        df_normalized['id'] = pd.to_numeric(df_normalized['id'], errors='coerce').fillna(0).astype(int)
-
-
-        df_matched = apply_shared_ids(df_normalized)
+        with metrics.stage('exact_match') as stage:
+            df_normalized = prepare_for_matching(df_normalized)
+            df_matched = apply_shared_ids(df_normalized)
+            stage['rows'] = len(df_matched)
+        if '--fuzzy' in sys.argv:
+            with metrics.stage('fuzzy_match') as stage:
+                df_matched = apply_fuzzy_matching(df_matched)
+                stage['rows'] = len(df_matched)
         
         # Reorder columns to have id first (which is now the shared ID)
         cols_order = ['id'] + [c for c in df_matched.columns if c != 'id']
         df_matched = df_matched[cols_order]
 
         print(f"\\nSaving matched data to {OUTPUT_CSV}...")
-        df_matched.to_csv(OUTPUT_CSV, index=False, encoding='utf-8')
+        with metrics.stage('write') as stage:
+            df_matched.to_csv(OUTPUT_CSV, index=False, encoding='utf-8')
+            stage['rows'] = len(df_matched)
         print("Saved successfully.")
+
+        # Built from the saved CSV with the API's own loader, so both give the API the same rows and values
+        print(f"Writing columnar copy to {OUTPUT_COLUMNAR_DIR}...")
+        with metrics.stage('write_columnar') as stage:
+            df_saved = read_matched_csv(OUTPUT_CSV)
+            write_columnar_data(df_saved, OUTPUT_COLUMNAR_DIR)
+            stage['rows'] = len(df_saved)
+        # IDs come from the name -> ID map consolidate_data.py keeps across runs, so the history
+        # compares the same products from one snapshot to the next
+        with metrics.stage('record_history'):
+            record_snapshot(df_saved)
         
         print("\\nSample of matched data (first 5 rows):")
         print(df_matched.head())
         print(f"\\nTotal rows in matched file: {len(df_matched)}")
-        print(f"Number of unique shared IDs: {df_matched['id'].nunique()}") 
\ No newline at end of file
+        print(f"Number of unique shared IDs: {df_matched['id'].nunique()}")
+        metrics.finish(rows=len(df_matched), unique_ids=int(df_matched['id'].nunique()))
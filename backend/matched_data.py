@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Reading the matched items for the API, either from the CSV written by match_high_confidence.py
+# or from its columnar copy: a directory with one .npy file per column that is memory-mapped on load,
+# so every worker process shares the same page cache instead of parsing the CSV again.
+
+EXPECTED_COLUMNS = [
+    'id', 'name', 'price', 'store', 'brand',
+    'net_quantity', 'unit_of_measure', 'category',
+    'standardized_quantity', 'standardized_unit',
+    'unit_price', 'unit_price_unit'
+]
+
+STRING_COLUMNS = ['name', 'store', 'brand', 'unit_of_measure', 'category', 'standardized_unit', 'net_quantity', 'unit_price_unit']
+
+COLUMNAR_FORMAT_VERSION = 1
+COLUMNAR_META_FILENAME = 'meta.json'
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def columnar_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + '.columns'
+
+def data_version(path):
+    # Content hash of the CSV file or of every file in the columnar directory, used to tell
+    # whether the data behind a cached response changed
+    if os.path.isdir(path):
+        filepaths = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+    else:
+        filepaths = [path]
+
+    digest = hashlib.sha256()
+    for filepath in filepaths:
+        digest.update(os.path.basename(filepath).encode('utf-8') + b'\0')
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+def read_matched_csv(data_file):
+    if not os.path.exists(data_file):
+        print(f"Error: Data file {data_file} not found.")
+        return pd.DataFrame(columns=EXPECTED_COLUMNS)
+
+    df_items = pd.read_csv(data_file)
+    if df_items.empty and os.path.getsize(data_file) > 0:
+        print(f"Warning: {data_file} was read as an empty DataFrame despite having content. Check formatting/headers.")
+        return pd.DataFrame(columns=EXPECTED_COLUMNS)
+    elif df_items.empty:
+        print(f"Warning: {data_file} is empty.")
+        return pd.DataFrame(columns=EXPECTED_COLUMNS)
+
+    # Verify and type columns
+    for col in EXPECTED_COLUMNS:
+        if col not in df_items.columns:
+            print(f"Warning: Column '{col}' missing in {data_file}. Adding it as empty.")
+            # Default types for potentially missing columns
+            if col in ('id', 'standardized_quantity', 'unit_price'): # id is primary, the others are numeric
+                df_items[col] = pd.Series(dtype='Int64' if col == 'id' else float)
+            elif col == 'price':
+                 df_items[col] = pd.Series(dtype=float)
+            else: # name, store, brand, units, category
+                df_items[col] = pd.Series(dtype=str)
+
+    # Specific type conversions for existing columns
+    if 'id' in df_items.columns:
+        df_items['id'] = pd.to_numeric(df_items['id'], errors='coerce').astype('Int64')
+        df_items.dropna(subset=['id'], inplace=True) # Critical: items must have a shared ID
+
+    if 'price' in df_items.columns:
+        df_items['price'] = pd.to_numeric(df_items['price'], errors='coerce')
+
+    for col in ['standardized_quantity', 'unit_price']:
+        if col in df_items.columns:
+            df_items[col] = pd.to_numeric(df_items[col], errors='coerce')
+
+    for col in STRING_COLUMNS:
+        if col in df_items.columns:
+            df_items[col] = df_items[col].astype(str).fillna('') # Ensure string types and handle NaNs
+
+    # Drop rows where critical info for grouping/display might be missing
+    # Name and Store are essential for individual price entries.
+    # ID is essential for grouping.
+    df_items.dropna(subset=['id', 'name', 'store'], inplace=True)
+
+    print(f"Successfully loaded and processed {data_file}. Shape: {df_items.shape}")
+    if df_items.empty and os.path.getsize(data_file) > 0:
+        print("Warning: Data file resulted in an empty DataFrame after processing.")
+    return df_items
+
+def write_columnar_data(df, directory):
+    # Numeric columns are stored as plain arrays, everything else as categorical codes plus the list of categories.
+    # Written to a temporary directory first; meta.json is what readers check for.
+    tmp_directory = directory + '.tmp'
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+
+    columns = []
+    for col in df.columns:
+        series = df[col]
+        if col == 'id':
+            np.save(os.path.join(tmp_directory, f"{col}.npy"), series.to_numpy(dtype=np.int64))
+            columns.append({'name': col, 'kind': 'numeric'})
+        elif pd.api.types.is_numeric_dtype(series):
+            np.save(os.path.join(tmp_directory, f"{col}.npy"), series.to_numpy(dtype=np.float64))
+            columns.append({'name': col, 'kind': 'numeric'})
+        else:
+            categorical = pd.Categorical(series.astype(str))
+            np.save(os.path.join(tmp_directory, f"{col}.codes.npy"), categorical.codes)
+            columns.append({'name': col, 'kind': 'categorical', 'categories': [str(c) for c in categorical.categories]})
+
+    meta = {'format_version': COLUMNAR_FORMAT_VERSION, 'rows': len(df), 'columns': columns}
+    with open(os.path.join(tmp_directory, COLUMNAR_META_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    # Processes that already mapped the old files keep reading them until they reload
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+
+def read_columnar_data(directory):
+    with open(os.path.join(directory, COLUMNAR_META_FILENAME), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format_version') != COLUMNAR_FORMAT_VERSION:
+        raise ValueError(f"unsupported columnar format version {meta.get('format_version')}")
+
+    data = {}
+    for column in meta['columns']:
+        col = column['name']
+        if column['kind'] == 'numeric':
+            data[col] = np.load(os.path.join(directory, f"{col}.npy"), mmap_mode='r')
+        else:
+            codes = np.load(os.path.join(directory, f"{col}.codes.npy"), mmap_mode='r')
+            data[col] = pd.Categorical.from_codes(codes, categories=column['categories'])
+        if len(data[col]) != meta['rows']:
+            raise ValueError(f"column '{col}' has {len(data[col])} rows, expected {meta['rows']}")
+
+    # copy=False keeps the memory-mapped arrays as the column storage
+    return pd.DataFrame(data, copy=False)
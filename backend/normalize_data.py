@@ -1,7 +1,10 @@
+import numpy as np
 import pandas as pd
 import re
 import os
 
+from pipeline_metrics import RunMetrics
+
 # --- Configuration for Normalization ---
 INPUT_CSV = os.path.join("data", "consolidated_items.csv")
 OUTPUT_CSV = os.path.join("data", "normalized_items.csv")
@@ -20,6 +23,51 @@ ABBREVIATION_DICT = {
     # Add more common abbreviations you find in your data
 }
 
+# All abbreviations as one pattern, used to find the values that need expanding
+ABBREVIATION_PATTERN = re.compile('|'.join(f'(?:{abbr})' for abbr in ABBREVIATION_DICT), re.IGNORECASE)
+
+# Unit standardization table, checked top to bottom against the lowercased unit with periods removed.
+# Same rules as standardize_unit: (match type, token, quantity multiplier, standardized unit)
+UNIT_CONVERSION_RULES = [
+    # Weight
+    ('contains', 'kg', 1000, 'g'),
+    ('equals', 'kilogram', 1000, 'g'),
+    ('contains', 'g', 1, 'g'),
+    # Volume
+    ('equals', 'l', 1000, 'ml'),
+    ('contains', 'lit', 1000, 'ml'), # Also covers 'litra'
+    ('contains', 'ml', 1, 'ml'),
+    ('contains', 'cl', 10, 'ml'),
+    ('contains', 'dl', 100, 'ml'),
+    # Pieces
+    ('startswith', 'kom', 1, 'kom'),
+    ('equals', 'psc', 1, 'kom'),
+    ('equals', 'pcs', 1, 'kom'),
+    ('equals', 'st', 1, 'kom'),
+    ('equals', 'kos', 1, 'kom'),
+    ('contains', 'kom', 1, 'kom'),
+]
+
+# Units unit prices are given in, and how much of that unit one of each measure unit is.
+# Store feeds write the measure either in unit_of_measure ('500g', '4x0,5l'), in net_quantity ('0.18 kg')
+# or as a plain number in net_quantity with a bare unit in unit_of_measure ('0,250' + 'kg').
+UNIT_PRICE_UNITS = ('kg', 'l', 'kom')
+MEASURE_UNITS = {
+    'kg': (1, 'kg'), 'dag': (0.01, 'kg'), 'g': (0.001, 'kg'),
+    'l': (1, 'l'), 'lt': (1, 'l'), 'lit': (1, 'l'), 'litra': (1, 'l'), 'dl': (0.1, 'l'), 'cl': (0.01, 'l'), 'ml': (0.001, 'l'),
+    'kom': (1, 'kom'), 'komad': (1, 'kom'), 'komada': (1, 'kom'), 'ko': (1, 'kom'), 'kos': (1, 'kom'),
+    'pz': (1, 'kom'), 'st': (1, 'kom'), 'psc': (1, 'kom'), 'pcs': (1, 'kom'), 'ea': (1, 'kom'),
+}
+# Weights and volumes outside this range (in kg or l) are feed errors, such as 1000 l of mouthwash or
+# 0.45 g of chocolate, and get no unit price
+MIN_PACKAGE_AMOUNT = 0.001
+MAX_PACKAGE_AMOUNT = 50
+# Optional pack count, amount and unit, e.g. '4x0,5l', '250 g', '0.18 kg'. Longer units are listed first.
+MEASURE_PATTERN = re.compile(
+    r'(?:(\d+)\s*x\s*)?(\d+(?:[.,]\d+)?)\s*(' + '|'.join(sorted(MEASURE_UNITS, key=len, reverse=True)) + r')\b',
+    re.IGNORECASE,
+)
+
 # --- Helper Functions ---
 
 def clean_text_field(text):
@@ -43,18 +91,12 @@ def parse_quantity(quantity_str):
     
     original_quantity_str = quantity_str # For debugging
     
-    # Handle ranges like "2x1.5L" or "3x80g" - try to extract primary quantity
-    # This is a basic attempt, might need more robust parsing for complex cases
+    # Packs like "2x1.5L" or "3x80g" are the total: pack count times the single item quantity
+    num_items = 1
     match_multiple = re.search(r'(\d+)\s*x\s*([\d,.]+)', quantity_str, re.IGNORECASE)
     if match_multiple:
-        try:
-            num_items = int(match_multiple.group(1))
-            single_item_qty_str = match_multiple.group(2)
-            # For simplicity, we might just take the single_item_qty_str for now, 
-            # or you could multiply num_items * single_item_qty for total quantity
-            quantity_str = single_item_qty_str 
-        except:
-            pass # Stick to original quantity_str if parsing fails
+        num_items = int(match_multiple.group(1))
+        quantity_str = match_multiple.group(2)
 
     # Standardize decimal separator and remove thousands separators
     quantity_str = quantity_str.replace('.', '', quantity_str.count('.') -1).replace(',', '.')
@@ -63,7 +105,7 @@ def parse_quantity(quantity_str):
     numeric_match = re.search(r'[\d.]+', quantity_str)
     if numeric_match:
         try:
-            return float(numeric_match.group(0))
+            return num_items * float(numeric_match.group(0))
         except ValueError:
             # print(f"Warning: Could not parse quantity from '{original_quantity_str}' -> '{quantity_str}'")
             return None
@@ -103,6 +145,188 @@ def standardize_unit(unit_str, quantity_val):
     # print(f"Warning: Unit '{unit_str}' not explicitly handled. Returning as is.")
     return quantity_val, unit_str_lower
 
+def parse_measure(text):
+    # (amount in a UNIT_PRICE_UNITS unit, that unit) for text with a unit such as '4x0,5l', or None
+    if not isinstance(text, str):
+        return None
+    match = MEASURE_PATTERN.search(text)
+    if match is None:
+        return None
+    count = int(match.group(1)) if match.group(1) else 1
+    factor, unit = MEASURE_UNITS[match.group(3).lower()]
+    return count * float(match.group(2).replace(',', '.')) * factor, unit
+
+def unit_price(price, net_quantity, unit_of_measure, name=None):
+    # (price per kg, l or piece, unit) for one row, or (NaN, '') when the package size is unknown.
+    # The measure in unit_of_measure wins over the one in net_quantity; a bare unit takes the number
+    # from net_quantity. A piece count has to be a whole number, except that some feeds give kg or l
+    # with a piece unit: a fractional count then takes the weight or volume unit of the size in the name.
+    # name is the name as in the store file, before clean_text_field. Weights and volumes outside
+    # MIN_PACKAGE_AMOUNT..MAX_PACKAGE_AMOUNT get no unit price either.
+    measure = parse_measure(unit_of_measure) or parse_measure(net_quantity)
+    if measure is None and isinstance(unit_of_measure, str):
+        bare_unit = MEASURE_UNITS.get(unit_of_measure.lower().strip().replace('.', ''))
+        quantity = parse_quantity(net_quantity)
+        if bare_unit is not None and quantity is not None:
+            measure = (quantity * bare_unit[0], bare_unit[1])
+            name_measure = parse_measure(name)
+            if measure[1] == 'kom' and measure[0] != int(measure[0]) and name_measure and name_measure[1] != 'kom':
+                measure = (quantity, name_measure[1])
+    if measure is None or not (measure[0] > 0) or (measure[1] == 'kom' and measure[0] != int(measure[0])):
+        return np.nan, ''
+    if not isinstance(price, (int, float)) or not (price > 0): # Also rejects NaN
+        return np.nan, ''
+    if measure[1] != 'kom' and not MIN_PACKAGE_AMOUNT <= measure[0] <= MAX_PACKAGE_AMOUNT:
+        return np.nan, ''
+    return price / measure[0], measure[1]
+
+# --- Vectorized Column Functions ---
+# Column-wise equivalents of the helpers above. Each one works on the distinct values of a column
+# (store feeds repeat the same brands, categories and units thousands of times) and maps the
+# results back to the rows.
+
+def _distinct_values(series):
+    codes, uniques = pd.factorize(series)
+    uniques = pd.Series(uniques, dtype=object)
+    is_text = np.array([isinstance(value, str) for value in uniques], dtype=bool)
+    return codes, uniques[is_text], is_text
+
+def _to_rows(unique_results, codes, missing_value):
+    # Code -1 marks a missing value; it picks the appended placeholder
+    return np.append(unique_results, missing_value).take(codes)
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+def clean_text_column(series):
+    codes, text, is_text = _distinct_values(series)
+    text = text.str.lower().str.strip()
+
+    has_abbreviation = text.str.contains(ABBREVIATION_PATTERN)
+    if has_abbreviation.any():
+        # Expanded one abbreviation at a time, as in clean_text_field: an expansion can swallow the
+        # word boundary the next abbreviation needs, so a single combined substitution would differ
+        expanded = text[has_abbreviation]
+        for abbr, full in ABBREVIATION_DICT.items():
+            expanded = expanded.str.replace(abbr, full, regex=True, flags=re.IGNORECASE)
+        text[has_abbreviation] = expanded
+
+    text = text.str.replace(r'[^\w\s.\']', '', regex=True)
+    text = text.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+    cleaned = np.full(len(is_text), '', dtype=object)
+    cleaned[is_text] = text.to_numpy(dtype=object)
+    return pd.Series(_to_rows(cleaned, codes, '').tolist(), index=series.index)
+
+def parse_quantity_column(series):
+    codes, text, is_text = _distinct_values(series)
+
+    # For packs like "2x1.5L" parse the single item quantity and multiply by the count, as parse_quantity does
+    pack = text.str.extract(r'(\d+)\s*x\s*([\d,.]+)', flags=re.IGNORECASE)
+    text = pack[1].where(pack[1].notna(), text)
+    counts = pd.to_numeric(pack[0]).fillna(1).to_numpy(dtype=float)
+
+    # Drop every '.' except the last one, then read ',' as the decimal separator
+    text = text.str.replace(r'\.(?=[^.]*\.)', '', regex=True).str.replace(',', '.', regex=False)
+    numeric = text.str.extract(r'([\d.]+)', expand=False).map(_to_float, na_action='ignore')
+
+    quantities = np.full(len(is_text), np.nan)
+    quantities[is_text] = numeric.to_numpy(dtype=float) * counts
+    return pd.Series(_to_rows(quantities, codes, np.nan), index=series.index)
+
+def _measure_column(series):
+    # Per row: (amount, UNIT_PRICE_UNITS code or -1) of parse_measure
+    codes, text, is_text = _distinct_values(series)
+    parts = text.str.extract(MEASURE_PATTERN)
+    units = parts[2].str.lower()
+    factors = units.map(lambda unit: MEASURE_UNITS[unit][0], na_action='ignore').to_numpy(dtype=float)
+    unit_codes = units.map(lambda unit: UNIT_PRICE_UNITS.index(MEASURE_UNITS[unit][1]), na_action='ignore')
+    amounts = (pd.to_numeric(parts[0]).fillna(1).to_numpy(dtype=float)
+               * pd.to_numeric(parts[1].str.replace(',', '.', regex=False)).to_numpy(dtype=float) * factors)
+
+    unique_amounts = np.full(len(is_text), np.nan)
+    unique_amounts[is_text] = amounts
+    unique_units = np.full(len(is_text), -1)
+    unique_units[is_text] = unit_codes.fillna(-1).to_numpy(dtype=int)
+    return _to_rows(unique_amounts, codes, np.nan), _to_rows(unique_units, codes, -1)
+
+def _bare_unit_column(series):
+    # Per row: (factor, UNIT_PRICE_UNITS code or -1) when the whole value is a unit such as 'kg' or 'KOM.'
+    codes, text, is_text = _distinct_values(series)
+    bare = text.str.lower().str.strip().str.replace('.', '', regex=False).map(MEASURE_UNITS.get)
+    unique_factors = np.full(len(is_text), np.nan)
+    unique_factors[is_text] = [entry[0] if entry else np.nan for entry in bare]
+    unique_units = np.full(len(is_text), -1)
+    unique_units[is_text] = [UNIT_PRICE_UNITS.index(entry[1]) if entry else -1 for entry in bare]
+    return _to_rows(unique_factors, codes, np.nan), _to_rows(unique_units, codes, -1)
+
+def unit_price_columns(prices, net_quantities, units_of_measure, names=None):
+    # Column-wise unit_price: (price per unit, unit) Series with the same precedence rules
+    amounts, unit_codes = _measure_column(units_of_measure)
+    net_amounts, net_unit_codes = _measure_column(net_quantities)
+    use_net = unit_codes < 0
+    amounts = np.where(use_net, net_amounts, amounts)
+    unit_codes = np.where(use_net, net_unit_codes, unit_codes)
+
+    bare_factors, bare_unit_codes = _bare_unit_column(units_of_measure)
+    use_bare = unit_codes < 0
+    net_numbers = parse_quantity_column(net_quantities).to_numpy(dtype=float)
+    amounts = np.where(use_bare, net_numbers * bare_factors, amounts)
+    unit_codes = np.where(use_bare, bare_unit_codes, unit_codes)
+
+    pieces = unit_codes == UNIT_PRICE_UNITS.index('kom')
+    if names is not None:
+        with np.errstate(invalid='ignore'):
+            from_name = use_bare & pieces & (amounts != np.floor(amounts)) & ~np.isnan(amounts)
+        # Only the names of those rows are parsed
+        name_unit_codes = np.full(len(from_name), -1)
+        name_unit_codes[from_name] = _measure_column(names[from_name])[1]
+        from_name &= (name_unit_codes >= 0) & (name_unit_codes != UNIT_PRICE_UNITS.index('kom'))
+        amounts = np.where(from_name, net_numbers, amounts)
+        unit_codes = np.where(from_name, name_unit_codes, unit_codes)
+        pieces &= ~from_name
+    with np.errstate(invalid='ignore'):
+        valid = (unit_codes >= 0) & (amounts > 0) & ~(pieces & (amounts != np.floor(amounts)))
+        valid &= pieces | ((amounts >= MIN_PACKAGE_AMOUNT) & (amounts <= MAX_PACKAGE_AMOUNT))
+    with np.errstate(invalid='ignore'):
+        valid &= np.asarray(prices, dtype=float) > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_unit = np.where(valid, np.asarray(prices, dtype=float) / amounts, np.nan)
+    unit_names = np.append(np.array(UNIT_PRICE_UNITS, dtype=object), '')
+    return (pd.Series(per_unit, index=prices.index),
+            pd.Series(unit_names.take(np.where(valid, unit_codes, -1)).tolist(), index=prices.index))
+
+def standardize_unit_columns(unit_series, quantities):
+    codes, unit, is_text = _distinct_values(unit_series)
+    unit = unit.str.lower().str.strip().str.replace('.', '', regex=False)
+
+    factors = np.ones(len(unit))
+    standardized = unit.to_numpy(dtype=object).copy() # Units no rule matches are kept as cleaned
+    matched = np.zeros(len(unit), dtype=bool)
+    for match_type, token, multiplier, standardized_unit in UNIT_CONVERSION_RULES:
+        if match_type == 'contains':
+            hit = unit.str.contains(token, regex=False)
+        elif match_type == 'startswith':
+            hit = unit.str.startswith(token)
+        else:
+            hit = unit == token
+        hit = hit.to_numpy(dtype=bool) & ~matched
+        factors[hit] = multiplier
+        standardized[hit] = standardized_unit
+        matched |= hit
+
+    unique_factors = np.ones(len(is_text))
+    unique_factors[is_text] = factors
+    unique_units = np.full(len(is_text), '', dtype=object)
+    unique_units[is_text] = standardized
+
+    standardized_quantity = quantities.to_numpy(dtype=float) * _to_rows(unique_factors, codes, 1.0)
+    return (pd.Series(standardized_quantity, index=quantities.index),
+            pd.Series(_to_rows(unique_units, codes, '').tolist(), index=unit_series.index))
+
 def croatian_stemmer_placeholder(text):
     # Placeholder: Real Croatian stemming is more complex.
     # For a real solution, consider libraries like 'nltk' with Croatian resources
@@ -114,11 +338,14 @@ def croatian_stemmer_placeholder(text):
 def normalize_data(df):
     print("Starting data normalization...")
 
+    # Unit prices read package sizes from the name as the store wrote it, before cleaning
+    raw_names = df['name'].copy() if 'name' in df.columns else None
+
     # 1. Clean text columns
     for col in TEXT_COLUMNS_TO_CLEAN:
         if col in df.columns:
             print(f"Cleaning column: {col}")
-            df[col] = df[col].apply(clean_text_field)
+            df[col] = clean_text_column(df[col])
         else:
             print(f"Warning: Column {col} not found for text cleaning.")
 
@@ -128,19 +355,27 @@ def normalize_data(df):
         
         # Apply parsing and standardization
         # Note: The order of operations (parsing quantity first) is important
-        parsed_quantities = df['net_quantity'].apply(parse_quantity)
-        
-        # Apply standardization using the parsed numeric quantity
-        standardized_q_u = df.apply(lambda row: standardize_unit(row['unit_of_measure'], parsed_quantities[row.name]), axis=1)
-        
-        df['standardized_quantity'] = [item[0] for item in standardized_q_u]
-        df['standardized_unit'] = [item[1] for item in standardized_q_u]
+        parsed_quantities = parse_quantity_column(df['net_quantity'])
+
+        # Row by row, so a store normalized on its own (incremental_pipeline.py) gets the same values
+        # as in the combined frame, even when none of its quantities parse
+        df['standardized_quantity'], df['standardized_unit'] = standardize_unit_columns(df['unit_of_measure'], parsed_quantities)
     else:
         print("Warning: 'net_quantity' or 'unit_of_measure' columns not found. Skipping standardization.")
         df['standardized_quantity'] = None
         df['standardized_unit'] = ''
         
-    # 3. Apply Stemming/Lemmatization (Placeholder)
+    # 3. Price per kg, litre or piece, so package sizes can be compared
+    if 'price' in df.columns and 'net_quantity' in df.columns and 'unit_of_measure' in df.columns:
+        print("Computing unit prices...")
+        df['unit_price'], df['unit_price_unit'] = unit_price_columns(
+            pd.to_numeric(df['price'], errors='coerce'), df['net_quantity'], df['unit_of_measure'], raw_names)
+    else:
+        print("Warning: 'price', 'net_quantity' or 'unit_of_measure' columns not found. Skipping unit prices.")
+        df['unit_price'] = np.nan
+        df['unit_price_unit'] = ''
+
+    # 4. Apply Stemming/Lemmatization (Placeholder)
     # print("Applying stemming/lemmatization (placeholder)...")
     # if 'name' in df.columns:
     #     df['name_stemmed'] = df['name'].apply(croatian_stemmer_placeholder)
@@ -152,22 +387,29 @@ if __name__ == "__main__":
     if not os.path.exists(INPUT_CSV):
         print(f"Error: Input file '{INPUT_CSV}' not found. Please run `consolidate_data.py` first.")
     else:
+        metrics = RunMetrics('normalize')
         print(f"Loading data from {INPUT_CSV}...")
-        # Try to detect encoding, default to utf-8
-        try:
-            df_consolidated = pd.read_csv(INPUT_CSV, encoding='utf-8')
-        except UnicodeDecodeError:
-            print("UTF-8 decoding failed, trying cp1250...")
+        with metrics.stage('read') as stage:
+            # Try to detect encoding, default to utf-8
             try:
-                df_consolidated = pd.read_csv(INPUT_CSV, encoding='cp1250')
+                df_consolidated = pd.read_csv(INPUT_CSV, encoding='utf-8')
             except UnicodeDecodeError:
-                print("cp1250 decoding failed, trying iso-8859-2...")
-                df_consolidated = pd.read_csv(INPUT_CSV, encoding='iso-8859-2')
-        
-        df_normalized = normalize_data(df_consolidated)
-        
+                print("UTF-8 decoding failed, trying cp1250...")
+                try:
+                    df_consolidated = pd.read_csv(INPUT_CSV, encoding='cp1250')
+                except UnicodeDecodeError:
+                    print("cp1250 decoding failed, trying iso-8859-2...")
+                    df_consolidated = pd.read_csv(INPUT_CSV, encoding='iso-8859-2')
+            stage['rows'] = len(df_consolidated)
+
+        with metrics.stage('normalize') as stage:
+            df_normalized = normalize_data(df_consolidated)
+            stage['rows'] = len(df_normalized)
+
         print(f"\nSaving normalized data to {OUTPUT_CSV}...")
-        df_normalized.to_csv(OUTPUT_CSV, index=False, encoding='utf-8')
+        with metrics.stage('write') as stage:
+            df_normalized.to_csv(OUTPUT_CSV, index=False, encoding='utf-8')
+            stage['rows'] = len(df_normalized)
         print("Saved successfully.")
         
         print("\nSample of normalized data (first 5 rows):")
@@ -176,4 +418,5 @@ if __name__ == "__main__":
         if 'standardized_quantity' in df_normalized.columns:
             print(df_normalized[['net_quantity', 'unit_of_measure', 'standardized_quantity', 'standardized_unit']].sample(10)) # Sample 10 rows
             print("\nUnique standardized units:")
-            print(df_normalized['standardized_unit'].unique()) 
\ No newline at end of file
+            print(df_normalized['standardized_unit'].unique()) 
+        metrics.finish(rows=len(df_normalized))
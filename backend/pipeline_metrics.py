@@ -0,0 +1,213 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError: # Not available on Windows; peak RSS is then left out of the report
+    resource = None
+
+# Shared instrumentation for the data pipeline scripts. Each run records wall time, rows per second
+# and memory for every stage, per store where a stage works store by store, and writes a JSON run
+# report to data/reports. Two reports can be compared with:
+#   python pipeline_metrics.py data/reports/<old>.json data/reports/<new>.json
+# Opt-in extras, as command line flags of the pipeline scripts or environment variables:
+#   --profile (PIPELINE_PROFILE=1)            cProfile of the main process, saved next to the report
+#   --trace-memory (PIPELINE_TRACE_MEMORY=1)  peak Python allocations per stage through tracemalloc
+#                                             (numpy and pandas buffers included); slows the run down
+# Only a RunMetrics created without 'argv' reads them, from sys.argv and the environment; it is the one
+# a script's __main__ creates and finishes. Pipeline functions called without metrics create one with
+# argv=[], which only times and prints stages and is never finished.
+# The profile covers the main process only: store files parsed in worker processes show up as time
+# spent waiting for results, and their own time is in the 'parse' stages.
+
+REPORTS_FOLDER = os.path.join("data", "reports")
+# Functions listed in the report when profiling, by cumulative time
+PROFILE_TOP_FUNCTIONS = 25
+# Relative change in a stage's seconds or memory that compare_reports marks
+COMPARE_THRESHOLD = 0.10
+
+MB = 1024 * 1024
+
+
+def _flag_enabled(flag, env_name, argv=None):
+    if argv is not None:
+        return flag in argv
+    return flag in sys.argv or os.environ.get(env_name, '') not in ('', '0')
+
+
+def max_rss_mb(children=False):
+    # High-water resident set size of this process (or of its finished child processes)
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(usage.ru_maxrss / (MB if sys.platform == 'darwin' else 1024), 1)
+
+
+def _peak_traced_mb():
+    return round(tracemalloc.get_traced_memory()[1] / MB, 1) if tracemalloc.is_tracing() else None
+
+
+def timed_call(function, *args):
+    # Runs function(*args) and returns (result, stats), stats being keyword arguments for RunMetrics.record.
+    # Submitted to worker processes in place of the function itself, so work done in a worker is measured
+    # where it runs. Forked workers inherit tracemalloc from the parent when --trace-memory is on.
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    start_time = time.perf_counter()
+    result = function(*args)
+    stats = {'seconds': time.perf_counter() - start_time, 'max_rss': max_rss_mb(), 'peak_traced': _peak_traced_mb()}
+    return result, stats
+
+
+class RunMetrics:
+    def __init__(self, pipeline, argv=None, folder=REPORTS_FOLDER):
+        self.pipeline = pipeline
+        self.folder = folder
+        self.profile = _flag_enabled('--profile', 'PIPELINE_PROFILE', argv)
+        self.trace_memory = _flag_enabled('--trace-memory', 'PIPELINE_TRACE_MEMORY', argv)
+        self.stages = []
+        self.started_at = datetime.now(timezone.utc)
+        self.start_time = time.perf_counter()
+        self.profiler = None
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def record(self, name, seconds, rows=None, store=None, max_rss=None, peak_traced=None):
+        entry = {
+            'name': name,
+            'store': store,
+            'seconds': round(seconds, 4),
+            'rows': rows,
+            'rows_per_second': round(rows / seconds, 1) if rows is not None and seconds > 0 else None,
+            'max_rss_mb': max_rss,
+            'peak_traced_mb': peak_traced,
+        }
+        self.stages.append(entry)
+        return entry
+
+    @contextmanager
+    def stage(self, name, store=None):
+        # Times the block. Set 'rows' on the yielded dict to get rows per second for the stage.
+        counters = {'rows': None}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start_time = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            seconds = time.perf_counter() - start_time
+            entry = self.record(name, seconds, counters['rows'], store, max_rss_mb(), _peak_traced_mb())
+            rate = f", {entry['rows_per_second']:,.0f} rows/s" if entry['rows_per_second'] is not None else ''
+            print(f"[metrics] {name}{f' ({store})' if store else ''}: {seconds:.3f}s{rate}")
+
+    def _profile_summary(self, report_path):
+        self.profiler.disable()
+        profile_path = os.path.splitext(report_path)[0] + '.prof'
+        self.profiler.dump_stats(profile_path)
+        stats = pstats.Stats(self.profiler, stream=io.StringIO()).sort_stats('cumulative')
+        top = []
+        for function in stats.fcn_list[:PROFILE_TOP_FUNCTIONS]:
+            primitive_calls, calls, total_time, cumulative_time, _ = stats.stats[function]
+            filename, line, function_name = function
+            top.append({
+                'function': f"{os.path.basename(filename)}:{line}({function_name})",
+                'calls': calls,
+                'total_seconds': round(total_time, 4),
+                'cumulative_seconds': round(cumulative_time, 4),
+            })
+        return {'path': profile_path, 'scope': 'main process only; worker processes are not profiled',
+                'top_cumulative': top}
+
+    def finish(self, **summary):
+        # Writes the run report and returns its path. Keyword arguments are stored under 'summary'.
+        os.makedirs(self.folder, exist_ok=True)
+        stamp = self.started_at.strftime('%Y%m%dT%H%M%SZ')
+        report_path = os.path.join(self.folder, f"{self.pipeline}-{stamp}.json")
+        report = {
+            'pipeline': self.pipeline,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'argv': sys.argv[1:],
+            'python': sys.version.split()[0],
+            'cpu_count': os.cpu_count(),
+            'total_seconds': round(time.perf_counter() - self.start_time, 4),
+            'max_rss_mb': max_rss_mb(),
+            'children_max_rss_mb': max_rss_mb(children=True),
+            'trace_memory': self.trace_memory,
+            'stages': self.stages,
+            'summary': summary,
+            'profile': self._profile_summary(report_path) if self.profiler else None,
+        }
+        if self.trace_memory:
+            tracemalloc.stop()
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"[metrics] Run report written to {report_path} ({report['total_seconds']:.2f}s total)")
+        return report_path
+
+
+def _stage_totals(report):
+    # (name, store) -> summed seconds and rows, peak memory. A stage recorded more than once is combined.
+    # Memory is the traced peak of the stage when the run had --trace-memory, else the process high-water RSS.
+    totals = {}
+    for entry in report['stages']:
+        key = (entry['name'], entry['store'] or '')
+        total = totals.setdefault(key, {'seconds': 0.0, 'rows': None, 'memory_mb': None})
+        total['seconds'] += entry['seconds']
+        if entry['rows'] is not None:
+            total['rows'] = (total['rows'] or 0) + entry['rows']
+        memory = entry['peak_traced_mb'] if entry['peak_traced_mb'] is not None else entry['max_rss_mb']
+        if memory is not None:
+            total['memory_mb'] = max(total['memory_mb'] or 0, memory)
+    return totals
+
+
+def _change(old, new):
+    if old is None or new is None:
+        return ''
+    if old == 0:
+        return '' if new == 0 else '     new'
+    ratio = (new - old) / old
+    return f"{ratio:+8.1%}{' *' if abs(ratio) >= COMPARE_THRESHOLD else ''}"
+
+
+def compare_reports(old_path, new_path):
+    # Prints seconds and memory per stage of two run reports; changes of COMPARE_THRESHOLD or more are starred
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    old_totals, new_totals = _stage_totals(old), _stage_totals(new)
+
+    print(f"{'stage':<28} {'store':<10} {'old s':>9} {'new s':>9} {'change':>10} {'old MB':>8} {'new MB':>8} {'change':>10}")
+    for key in list(old_totals) + [key for key in new_totals if key not in old_totals]:
+        before, after = old_totals.get(key, {}), new_totals.get(key, {})
+        row_seconds = [before.get('seconds'), after.get('seconds')]
+        row_memory = [before.get('memory_mb'), after.get('memory_mb')]
+        print(f"{key[0]:<28} {key[1]:<10} "
+              + ' '.join(f"{value:9.3f}" if value is not None else f"{'-':>9}" for value in row_seconds)
+              + f" {_change(*row_seconds):>10} "
+              + ' '.join(f"{value:8.1f}" if value is not None else f"{'-':>8}" for value in row_memory)
+              + f" {_change(*row_memory):>10}")
+        if before.get('rows') is not None and after.get('rows') is not None and before['rows'] != after['rows']:
+            print(f"{'':<28} {'':<10} rows {before['rows']} -> {after['rows']}")
+    print(f"{'total':<28} {'':<10} {old['total_seconds']:9.3f} {new['total_seconds']:9.3f} "
+          f"{_change(old['total_seconds'], new['total_seconds']):>10}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python pipeline_metrics.py <old report>.json <new report>.json")
+        exit(1)
+    compare_reports(sys.argv[1], sys.argv[2])
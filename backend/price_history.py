@@ -0,0 +1,395 @@
+import datetime
+import json
+import os
+import sys
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from matched_data import read_matched_csv
+
+# Append-only price history, one snapshot of the matched data per day.
+# Only changes are stored: a row is written when an (item, store) pair gets a new price, appears or
+# disappears (price MISSING_PRICE_CENTS). The first snapshot of each calendar month is written in full,
+# so the state on any day can be rebuilt from at most two months of partitions.
+# Snapshots are compared by item ID, so an ID has to name the same product from one run to the next:
+# every pipeline takes its IDs from the name -> ID map that consolidate_data.py keeps in data/cache.
+#
+# Layout under HISTORY_FOLDER:
+#   meta.json              store names (codes index into it) and the last recorded day
+#   state.npy              latest price of every pair, used to compute the next day's changes
+#   days/YYYY-MM-DD.npy    changes recorded that day
+#   months/YYYY-MM.npy     a finished month's days merged into one file
+#   changes/YYYY-MM-DD.npy that day's change set: old and new price of every pair that went up, went
+#                          down, appeared or disappeared since the previous day, largest change first
+# Every partition is a structured array sorted by (item_id, store, day), memory-mapped on read, so
+# looking up one item is a binary search in each partition the requested range touches.
+# Usage: python price_history.py [matched csv] [--date YYYY-MM-DD]
+
+HISTORY_FOLDER = os.path.join('data', 'history')
+META_FILENAME = 'meta.json'
+STATE_FILENAME = 'state.npy'
+PREVIOUS_STATE_FILENAME = 'state.previous.npy'
+HISTORY_FORMAT_VERSION = 1
+
+MISSING_PRICE_CENTS = -1
+
+HISTORY_DTYPE = np.dtype([('item_id', '<i8'), ('store', '<i2'), ('day', '<i4'), ('price_cents', '<i4')])
+STATE_DTYPE = np.dtype([('item_id', '<i8'), ('store', '<i2'), ('price_cents', '<i4')])
+
+# One row per changed pair. 'kind' indexes CHANGE_KINDS; 'old_cents' is MISSING_PRICE_CENTS for a new
+# listing and 'new_cents' for a delisting, which have a NaN 'pct'.
+CHANGE_DTYPE = np.dtype([('item_id', '<i8'), ('store', '<i2'), ('day', '<i4'), ('kind', 'i1'),
+                         ('old_cents', '<i4'), ('new_cents', '<i4'), ('pct', '<f4')])
+CHANGE_KINDS = ('increase', 'drop', 'new', 'delisted')
+CHANGE_INCREASE, CHANGE_DROP, CHANGE_NEW, CHANGE_DELISTED = range(len(CHANGE_KINDS))
+
+# Changes of one store for one item, oldest first. 'days' are days since 1970-01-01.
+StoreHistory = namedtuple('StoreHistory', ['store', 'days', 'prices'])
+
+def _day_number(day):
+    return (day - datetime.date(1970, 1, 1)).days
+
+def _day_from_number(number):
+    return datetime.date(1970, 1, 1) + datetime.timedelta(days=int(number))
+
+def _pair_keys(item_ids, stores):
+    return item_ids.astype(np.int64) * 65536 + stores.astype(np.int64)
+
+def _load_meta(folder):
+    meta_path = os.path.join(folder, META_FILENAME)
+    if not os.path.exists(meta_path):
+        return {'format_version': HISTORY_FORMAT_VERSION, 'stores': [], 'last_day': None}
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format_version') != HISTORY_FORMAT_VERSION:
+        raise ValueError(f"unsupported price history format version {meta.get('format_version')}")
+    return meta
+
+def _save_array(path, array):
+    # Written next to the target and renamed, so readers never see a partial file
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, array)
+    os.replace(path + '.tmp', path)
+
+def _load_state(path):
+    if not os.path.exists(path):
+        return np.empty(0, dtype=STATE_DTYPE)
+    return np.load(path)
+
+def snapshot_state(df, store_names):
+    # Lowest price per (item, store) in a matched frame, sorted by pair. New stores are added to store_names.
+    rows = df[['id', 'store', 'price']].dropna()
+    rows = rows[rows['price'] >= 0]
+    for store in sorted(set(rows['store'].astype(str)) - set(store_names)):
+        store_names.append(store)
+    store_codes = {store: code for code, store in enumerate(store_names)}
+
+    prices = pd.DataFrame({
+        'item_id': rows['id'].to_numpy(dtype=np.int64),
+        'store': rows['store'].astype(str).map(store_codes).to_numpy(dtype=np.int16),
+        'price_cents': np.round(rows['price'].to_numpy(dtype=np.float64) * 100).astype(np.int32),
+    })
+    prices = prices.groupby(['item_id', 'store'], sort=True, as_index=False)['price_cents'].min()
+
+    state = np.empty(len(prices), dtype=STATE_DTYPE)
+    for field in STATE_DTYPE.names:
+        state[field] = prices[field].to_numpy()
+    return state
+
+def diff_states(previous, current, full=False):
+    # Rows for one day: pairs whose price changed or that are new, plus pairs that disappeared.
+    # With full=True every current pair is included, changed or not.
+    previous_keys = _pair_keys(previous['item_id'], previous['store'])
+    current_keys = _pair_keys(current['item_id'], current['store'])
+
+    positions = np.searchsorted(previous_keys, current_keys)
+    positions = np.minimum(positions, max(len(previous_keys) - 1, 0))
+    known = len(previous_keys) > 0
+    unchanged = np.zeros(len(current), dtype=bool)
+    if known:
+        unchanged = ((previous_keys[positions] == current_keys)
+                     & (previous['price_cents'][positions] == current['price_cents']))
+    changed = np.ones(len(current), dtype=bool) if full else ~unchanged
+
+    removed = ~np.isin(previous_keys, current_keys, assume_unique=True)
+    removed &= previous['price_cents'] != MISSING_PRICE_CENTS
+
+    rows = np.empty(int(changed.sum() + removed.sum()), dtype=HISTORY_DTYPE)
+    count = int(changed.sum())
+    for field in ('item_id', 'store'):
+        rows[field][:count] = current[field][changed]
+        rows[field][count:] = previous[field][removed]
+    rows['price_cents'][:count] = current['price_cents'][changed]
+    rows['price_cents'][count:] = MISSING_PRICE_CENTS
+    return rows[np.lexsort((rows['store'], rows['item_id']))]
+
+def diff_changes(previous, current):
+    # Change set between two states, as CHANGE_DTYPE rows without 'day'. Pairs are joined on
+    # (item_id, store) with a binary search of the sorted previous keys. Price changes come first,
+    # largest relative change first, then new listings and delistings.
+    previous_keys = _pair_keys(previous['item_id'], previous['store'])
+    current_keys = _pair_keys(current['item_id'], current['store'])
+
+    matched = np.zeros(len(current), dtype=bool)
+    old_cents = np.full(len(current), MISSING_PRICE_CENTS, dtype=np.int32)
+    if len(previous_keys):
+        positions = np.minimum(np.searchsorted(previous_keys, current_keys), len(previous_keys) - 1)
+        matched = previous_keys[positions] == current_keys
+        old_cents[matched] = previous['price_cents'][positions[matched]]
+        matched &= old_cents != MISSING_PRICE_CENTS
+    repriced = matched & (old_cents != current['price_cents'])
+    added = ~matched
+    removed = ~np.isin(previous_keys, current_keys, assume_unique=True)
+    removed &= previous['price_cents'] != MISSING_PRICE_CENTS
+
+    rows = np.empty(int(repriced.sum() + added.sum() + removed.sum()), dtype=CHANGE_DTYPE)
+    rows['day'] = 0
+    parts = [
+        (current[repriced], old_cents[repriced], current['price_cents'][repriced]),
+        (current[added], np.full(int(added.sum()), MISSING_PRICE_CENTS), current['price_cents'][added]),
+        (previous[removed], previous['price_cents'][removed], np.full(int(removed.sum()), MISSING_PRICE_CENTS)),
+    ]
+    start = 0
+    for pairs, old, new in parts:
+        end = start + len(pairs)
+        rows['item_id'][start:end] = pairs['item_id']
+        rows['store'][start:end] = pairs['store']
+        rows['old_cents'][start:end] = old
+        rows['new_cents'][start:end] = new
+        start = end
+
+    priced = (rows['old_cents'] != MISSING_PRICE_CENTS) & (rows['new_cents'] != MISSING_PRICE_CENTS)
+    rows['kind'] = np.where(rows['new_cents'] > rows['old_cents'], CHANGE_INCREASE, CHANGE_DROP)
+    rows['kind'][rows['old_cents'] == MISSING_PRICE_CENTS] = CHANGE_NEW
+    rows['kind'][rows['new_cents'] == MISSING_PRICE_CENTS] = CHANGE_DELISTED
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rows['pct'] = np.where(priced, (rows['new_cents'] - rows['old_cents']) / rows['old_cents'] * 100, np.nan)
+    return rows[np.lexsort((rows['store'], rows['item_id'], -_change_magnitudes(rows)))]
+
+def _change_magnitudes(rows):
+    # Absolute relative change, -1 for new listings and delistings so they sort after every price change
+    return np.where(np.isnan(rows['pct']), -1.0, np.abs(rows['pct'].astype(np.float64)))
+
+def record_snapshot(df, day=None, folder=HISTORY_FOLDER):
+    # Appends the prices in a matched frame as the snapshot for 'day' (default today).
+    # Recording the same day again replaces that day's snapshot; earlier days can't be rewritten.
+    day = day or datetime.date.today()
+    days_folder = os.path.join(folder, 'days')
+    os.makedirs(days_folder, exist_ok=True)
+    meta = _load_meta(folder)
+    last_day = datetime.date.fromisoformat(meta['last_day']) if meta['last_day'] else None
+
+    state_path = os.path.join(folder, STATE_FILENAME)
+    previous_state_path = os.path.join(folder, PREVIOUS_STATE_FILENAME)
+    if last_day is not None and day < last_day:
+        raise ValueError(f"{day} is before the last recorded day {last_day}")
+    if last_day != day:
+        # Kept so a rerun on the same day is compared with the state before that day's first run
+        _save_array(previous_state_path, _load_state(state_path))
+    previous = _load_state(previous_state_path)
+
+    current = snapshot_state(df, meta['stores'])
+    full = _is_first_day_of_month(folder, day)
+    rows = diff_states(previous, current, full=full)
+    rows['day'] = _day_number(day)
+
+    _save_array(os.path.join(days_folder, f"{day.isoformat()}.npy"), rows)
+    # Nothing to compare the very first snapshot with
+    if len(previous):
+        changes = diff_changes(previous, current)
+        changes['day'] = _day_number(day)
+        os.makedirs(os.path.join(folder, 'changes'), exist_ok=True)
+        _save_array(os.path.join(folder, 'changes', f"{day.isoformat()}.npy"), changes)
+        counts = np.bincount(changes['kind'], minlength=len(CHANGE_KINDS)).tolist()
+        print("Price changes since the previous snapshot: "
+              + ', '.join(f"{count} {kind}" for kind, count in zip(CHANGE_KINDS, counts)) + '.')
+    _save_array(state_path, current)
+    meta['last_day'] = day.isoformat()
+    with open(os.path.join(folder, META_FILENAME + '.tmp'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(os.path.join(folder, META_FILENAME + '.tmp'), os.path.join(folder, META_FILENAME))
+
+    compact_months(folder, before=day)
+    print(f"Recorded price history for {day}: {len(rows)} rows ({'full' if full else 'changes only'}), "
+          f"{len(current)} (item, store) pairs.")
+    return len(rows)
+
+def _is_first_day_of_month(folder, day):
+    # True when no earlier day of the same month was recorded; those days are never compacted yet
+    days_folder = os.path.join(folder, 'days')
+    month_prefix = day.isoformat()[:7]
+    return not any(name.startswith(month_prefix) and name < f"{day.isoformat()}.npy" for name in os.listdir(days_folder))
+
+def compact_months(folder=HISTORY_FOLDER, before=None):
+    # Merges the day files of every month before the month of 'before' into one file per month
+    days_folder = os.path.join(folder, 'days')
+    months_folder = os.path.join(folder, 'months')
+    if not os.path.isdir(days_folder):
+        return
+    current_month = (before or datetime.date.today()).isoformat()[:7]
+
+    by_month = {}
+    for name in sorted(os.listdir(days_folder)):
+        if name.endswith('.npy') and name[:7] < current_month:
+            by_month.setdefault(name[:7], []).append(os.path.join(days_folder, name))
+
+    for month, paths in by_month.items():
+        os.makedirs(months_folder, exist_ok=True)
+        month_path = os.path.join(months_folder, f"{month}.npy")
+        parts = [np.load(path) for path in paths]
+        if os.path.exists(month_path):
+            parts.append(np.load(month_path))
+        rows = np.concatenate(parts)
+        rows = rows[np.lexsort((rows['day'], rows['store'], rows['item_id']))]
+        _save_array(month_path, rows)
+        for path in paths:
+            os.remove(path)
+        print(f"Compacted {len(paths)} day file(s) of {month} into {month_path} ({len(rows)} rows).")
+
+@lru_cache(maxsize=256)
+def _open_partition(path, mtime_ns):
+    # mtime_ns is part of the cache key, so a rewritten partition is mapped again
+    return np.load(path, mmap_mode='r')
+
+def _partition_paths(folder, first_day, last_day):
+    # Month files and day files that can hold rows between the two days, oldest first
+    months = set()
+    month = datetime.date(first_day.year, first_day.month, 1)
+    while month <= last_day:
+        months.add(month.isoformat()[:7])
+        month = (month + datetime.timedelta(days=32)).replace(day=1)
+
+    paths = []
+    for subfolder in ('months', 'days'):
+        directory = os.path.join(folder, subfolder)
+        if os.path.isdir(directory):
+            paths.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                         if name.endswith('.npy') and name[:7] in months)
+    return paths
+
+def item_history(item_id, days, folder=HISTORY_FOLDER, today=None):
+    # Price changes of one item over the last 'days' days, per store, plus each store's price at the
+    # start of that range. Returns (first day, last day, [StoreHistory]).
+    meta = _load_meta(folder)
+    last_day = today or (datetime.date.fromisoformat(meta['last_day']) if meta['last_day'] else datetime.date.today())
+    first_day = last_day - datetime.timedelta(days=days - 1)
+    # The month before the range is read too, for the price in effect on first_day; its first
+    # snapshot is a full one, so nothing older is needed
+    lookback_day = (datetime.date(first_day.year, first_day.month, 1) - datetime.timedelta(days=1)).replace(day=1)
+
+    slices = []
+    for path in _partition_paths(folder, lookback_day, last_day):
+        rows = _open_partition(path, os.stat(path).st_mtime_ns)
+        item_ids = rows['item_id']
+        lo = np.searchsorted(item_ids, item_id, side='left')
+        hi = np.searchsorted(item_ids, item_id, side='right')
+        if hi > lo:
+            slices.append(np.array(rows[lo:hi]))
+    if not slices:
+        return first_day, last_day, []
+
+    rows = np.concatenate(slices)
+    rows = rows[(rows['day'] <= _day_number(last_day))]
+    rows = rows[np.lexsort((rows['day'], rows['store']))]
+
+    first_number = _day_number(first_day)
+    histories = []
+    for store in np.unique(rows['store']).tolist():
+        store_rows = rows[rows['store'] == store]
+        before = store_rows[store_rows['day'] <= first_number]
+        in_range = store_rows[store_rows['day'] > first_number]
+        days_list, prices = [], []
+        if len(before):
+            days_list.append(first_number)
+            prices.append(int(before['price_cents'][-1]))
+        days_list.extend(in_range['day'].tolist())
+        prices.extend(in_range['price_cents'].tolist())
+        # Nothing to show for a store that was already gone before the range and never came back
+        if any(price != MISSING_PRICE_CENTS for price in prices):
+            histories.append(StoreHistory(meta['stores'][store], days_list, prices))
+    return first_day, last_day, histories
+
+def read_changes(since=None, folder=HISTORY_FOLDER, store=None, min_pct=0, kind=None):
+    # Change set rows recorded from day 'since' on (default: the last recorded change set only),
+    # largest change first, newest first among equal ones.
+    # store is a store name, kind one of CHANGE_KINDS. With min_pct above 0 only price changes of at
+    # least that many percent are kept. Returns (rows, store names the 'store' codes index into).
+    meta = _load_meta(folder)
+    store_code = None
+    if store is not None:
+        if store not in meta['stores']:
+            return np.empty(0, dtype=CHANGE_DTYPE), meta['stores']
+        store_code = meta['stores'].index(store)
+
+    changes_folder = os.path.join(folder, 'changes')
+    names = sorted(name for name in os.listdir(changes_folder) if name.endswith('.npy')) if os.path.isdir(changes_folder) else []
+    names = names[-1:] if since is None else [name for name in names if name[:-4] >= since.isoformat()]
+    parts = []
+    for name in names:
+        path = os.path.join(changes_folder, name)
+        rows = _open_partition(path, os.stat(path).st_mtime_ns)
+        keep = np.ones(len(rows), dtype=bool)
+        if store_code is not None:
+            keep &= rows['store'] == store_code
+        if kind is not None:
+            keep &= rows['kind'] == CHANGE_KINDS.index(kind)
+        if min_pct > 0:
+            keep &= np.abs(rows['pct']) >= min_pct # NaN for new listings and delistings, never kept
+        parts.append(np.array(rows[keep]))
+    if not parts:
+        return np.empty(0, dtype=CHANGE_DTYPE), meta['stores']
+
+    rows = np.concatenate(parts)
+    if len(parts) > 1:
+        rows = rows[np.lexsort((rows['store'], rows['item_id'], -rows['day'], -_change_magnitudes(rows)))]
+    return rows, meta['stores']
+
+def change_to_dict(row, stores, name):
+    return {
+        'id': int(row['item_id']),
+        'name': name,
+        'store': stores[row['store']],
+        'date': _day_from_number(row['day']).isoformat(),
+        'kind': CHANGE_KINDS[row['kind']],
+        'old_price': None if row['old_cents'] == MISSING_PRICE_CENTS else int(row['old_cents']) / 100,
+        'new_price': None if row['new_cents'] == MISSING_PRICE_CENTS else int(row['new_cents']) / 100,
+        'change_pct': None if np.isnan(row['pct']) else round(float(row['pct']), 2),
+    }
+
+def history_to_dict(item_id, first_day, last_day, histories):
+    return {
+        'id': item_id,
+        'from': first_day.isoformat(),
+        'to': last_day.isoformat(),
+        'stores': [
+            {
+                'store': history.store,
+                'points': [
+                    {
+                        'date': _day_from_number(day).isoformat(),
+                        'price': None if cents == MISSING_PRICE_CENTS else cents / 100,
+                    }
+                    for day, cents in zip(history.days, history.prices)
+                ],
+            }
+            for history in histories
+        ],
+    }
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    day = None
+    if '--date' in args:
+        position = args.index('--date')
+        day = datetime.date.fromisoformat(args[position + 1])
+        del args[position:position + 2]
+    data_file = args[0] if args else os.path.join('data', 'matched_items_v1.csv')
+
+    df_matched = read_matched_csv(data_file)
+    if df_matched.empty:
+        print(f"No data in {data_file}. Nothing recorded.")
+        exit()
+    record_snapshot(df_matched, day)
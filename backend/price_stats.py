@@ -0,0 +1,120 @@
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+import numpy as np
+
+# Store and category price indexes behind /stats, built once per data load from the item x store price
+# matrix (cart_optimizer.PriceMatrix). Only items sold in at least MIN_STORES_FOR_STATS stores take part.
+# For each of them, a store's price is divided by the median price of the item across the stores selling it:
+# a store's 'median_relative_price' is the median of those ratios (below 1 = usually cheaper than the
+# other stores) and its 'basket_index' is what the shared items it sells cost there, against what they cost
+# at the median price, times 100. 'shared_items' counts those items and 'coverage' is their share of all of
+# them in the scope (every item, or one category).
+
+MIN_STORES_FOR_STATS = 2
+
+# 'stores' is the /stats/stores body; 'categories' maps a lowercased category to its /stats/categories/<name>
+# body and 'category_counts' lists (category, shared items) for /stats/categories.
+PriceStats = namedtuple('PriceStats', ['stores', 'categories', 'category_counts', 'build_seconds'])
+
+
+def empty_price_stats():
+    return PriceStats({'shared_items': 0, 'stores': []}, MappingProxyType({}), (), 0.0)
+
+
+def _group_medians(groups, values, group_count):
+    # Median of 'values' per group code, NaN for groups without values
+    counts = np.bincount(groups, minlength=group_count)
+    medians = np.full(group_count, np.nan)
+    if len(values) == 0:
+        return medians
+    sorted_values = values[np.lexsort((values, groups))]
+    starts = np.cumsum(counts) - counts
+    present = counts > 0
+    low = sorted_values[(starts + (counts - 1) // 2)[present]]
+    high = sorted_values[(starts + counts // 2)[present]]
+    medians[present] = (low + high) / 2
+    return medians
+
+
+def _scope_stats(groups, group_count, prices, reference_prices):
+    # (median relative price, basket index, shared items) per group code
+    medians = _group_medians(groups, prices / reference_prices, group_count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        baskets = (np.bincount(groups, weights=prices, minlength=group_count)
+                   / np.bincount(groups, weights=reference_prices, minlength=group_count) * 100)
+    return medians, baskets, np.bincount(groups, minlength=group_count)
+
+
+def _scope_to_dict(store_names, shared_count, medians, baskets, counts, item_counts=None):
+    # Stores selling any of the scope's shared items, lowest basket index first
+    stores = []
+    for code in np.flatnonzero(counts).tolist():
+        entry = {
+            'store': store_names[code],
+            'median_relative_price': round(float(medians[code]), 4),
+            'basket_index': round(float(baskets[code]), 2),
+            'shared_items': int(counts[code]),
+            'coverage': round(int(counts[code]) / shared_count, 4),
+        }
+        if item_counts is not None:
+            entry['items'] = int(item_counts[code])
+        stores.append(entry)
+    stores.sort(key=lambda entry: (entry['basket_index'], entry['store']))
+    return {'shared_items': shared_count, 'stores': stores}
+
+
+def build_price_stats(matrix, category_positions):
+    # category_positions as in ItemListing: lowercased category -> positions of its items, which are
+    # also the rows of matrix.prices since both follow ItemListing.ids
+    start_time = time.perf_counter()
+    prices = matrix.prices
+    store_names = matrix.store_names
+    store_count = len(store_names)
+    sold = ~np.isnan(prices)
+    shared = np.flatnonzero(sold.sum(axis=1) >= MIN_STORES_FOR_STATS)
+    if len(shared) == 0:
+        return empty_price_stats()
+
+    # One entry per (shared item, store selling it), grouped by item
+    shared_prices = prices[shared]
+    entry_rows, entry_stores = np.nonzero(sold[shared])
+    entry_prices = shared_prices[entry_rows, entry_stores]
+    # Median price of each entry's item across the stores selling it
+    reference_prices = _group_medians(entry_rows, entry_prices, len(shared))[entry_rows]
+
+    stores = _scope_to_dict(store_names, len(shared),
+                            *_scope_stats(entry_stores, store_count, entry_prices, reference_prices), sold.sum(axis=0))
+
+    # Every (category, shared item) pair expanded to the item's entries; group code is category x store
+    shared_rows = np.full(len(prices), -1)
+    shared_rows[shared] = np.arange(len(shared))
+    names = list(category_positions.keys())
+    pair_rows = [shared_rows[category_positions[name]] for name in names]
+    pair_categories = np.repeat(np.arange(len(names)), [len(rows) for rows in pair_rows])
+    pair_rows = np.concatenate(pair_rows) if pair_rows else np.empty(0, dtype=np.intp)
+    keep = pair_rows >= 0
+    pair_categories, pair_rows = pair_categories[keep], pair_rows[keep]
+
+    row_entry_counts = np.bincount(entry_rows, minlength=len(shared))
+    row_entry_starts = np.cumsum(row_entry_counts) - row_entry_counts
+    pair_entry_counts = row_entry_counts[pair_rows]
+    offsets = np.arange(pair_entry_counts.sum()) - np.repeat(np.cumsum(pair_entry_counts) - pair_entry_counts, pair_entry_counts)
+    entries = np.repeat(row_entry_starts[pair_rows], pair_entry_counts) + offsets
+    groups = np.repeat(pair_categories, pair_entry_counts) * store_count + entry_stores[entries]
+    medians, baskets, counts = _scope_stats(groups, len(names) * store_count, entry_prices[entries], reference_prices[entries])
+
+    category_shared_counts = np.bincount(pair_categories, minlength=len(names))
+    categories = {}
+    for code in np.flatnonzero(category_shared_counts).tolist():
+        scope = slice(code * store_count, (code + 1) * store_count)
+        categories[names[code]] = _scope_to_dict(store_names, int(category_shared_counts[code]),
+                                                 medians[scope], baskets[scope], counts[scope])
+    category_counts = tuple(sorted((name, body['shared_items']) for name, body in categories.items()))
+    return PriceStats(stores, MappingProxyType(categories), category_counts, time.perf_counter() - start_time)
+
+
+def category_stats(stats, name):
+    # /stats/categories/<name> body, None for a category without shared items
+    return stats.categories.get(name.strip().lower())
@@ -0,0 +1,33 @@
+import csv
+
+import numpy as np
+
+from consolidate_data import get_cleaned_price
+
+# The row-by-row store-file reader consolidate_data.py used before the columnar one, and the price
+# fields it is checked on, shared by test_consolidate_data.py and bench_consolidate.py.
+
+TRICKY_PRICES = [
+    '1.234,56', ',99', '-1,50', '-0', '--5', '5-', '1.2.3', '.', '-.', '-', '', '   ', '"2,49"', ' "3.10" ',
+    '1,234.56', '12 EUR', 'EUR 12,00', '0,00', '1e3', '١٢,٥', '1²', '½', 'abc', '1.000.000,01', '+4,20', '−3,00',
+]
+
+def reference_store_rows(filepath, config, encoding):
+    # The csv module reader consolidate_data.py used before the columnar one
+    min_columns = max(getattr(config, column) for column in ('name', 'price', 'brand', 'net_quantity', 'unit_of_measure', 'category')) + 1
+    with open(filepath, 'r', encoding=encoding, newline='') as f:
+        for line_number, row in enumerate(csv.reader(f, delimiter=config.delimiter, quotechar=config.quote_char)):
+            if line_number < config.skip_lines or not row or len(row) < min_columns:
+                continue
+            name = row[config.name].strip().strip('"')
+            fields = [row[getattr(config, column)].strip().strip('"')
+                      for column in ('brand', 'net_quantity', 'unit_of_measure', 'category')]
+            price = get_cleaned_price(row[config.price].strip().strip('"'), config.decimal_separator)
+            if not name or price is None or price < 0:
+                continue
+            yield (' '.join(name.lower().split()), name, round(price, 2), *fields)
+
+def same_price(expected, actual):
+    if expected is None:
+        return np.isnan(actual)
+    return not np.isnan(actual) and expected == actual and np.signbit(expected) == np.signbit(actual)
@@ -0,0 +1,27 @@
+import pandas as pd
+
+from match_high_confidence import EXACT_MATCH_COLUMNS
+
+# The per-row string signatures match_high_confidence.py used before hashing, kept as the reference the
+# hashed signatures are checked against by test_match_signatures.py and bench_signatures.py.
+
+def legacy_signatures(df):
+    # The signature as match_high_confidence built it before hashing: one joined string per row
+    df = df.copy()
+    df['standardized_quantity_str'] = df['standardized_quantity'].astype(str).fillna('')
+
+    def create_match_signature(row):
+        parts = []
+        for col in EXACT_MATCH_COLUMNS:
+            actual_col_name = 'standardized_quantity_str' if col == 'standardized_quantity' else col
+            parts.append(str(row[actual_col_name]).lower().strip())
+        return '|'.join(parts)
+
+    return df.apply(create_match_signature, axis=1)
+
+def same_groups(first, second):
+    # True when two key arrays partition the rows the same way, whatever the key values are
+    first_codes = pd.factorize(first)[0]
+    second_codes = pd.factorize(second)[0]
+    pairs = pd.DataFrame({'first': first_codes, 'second': second_codes}).drop_duplicates()
+    return pairs['first'].is_unique and pairs['second'].is_unique
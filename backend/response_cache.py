@@ -0,0 +1,70 @@
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+# Serialized API responses, reused until the loaded data changes.
+# Entries belong to the data version the app published last (a hash of the loaded artifact):
+# advance() moves the cache to a new version and drops the older entries. Requests still holding
+# the previous snapshot during a reload only miss; they neither clear the cache nor fill it.
+# Each cache holds at most 'max_entries' responses and evicts the least recently used one when full.
+
+# 'body' is the serialized JSON, 'etag' a strong validator derived from it and 'headers' any
+# extra headers the endpoint sends with it
+CachedResponse = namedtuple('CachedResponse', ['body', 'etag', 'headers'])
+
+def body_etag(body):
+    return hashlib.blake2b(body, digest_size=12).hexdigest()
+
+class ResponseCache:
+    def __init__(self, name, max_entries):
+        self.name = name
+        self.max_entries = max_entries
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def advance(self, version):
+        # Called when a snapshot with this version is published
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+
+    def get(self, version, key):
+        with self._lock:
+            entry = self._entries.get(key) if version == self.version else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, version, key, body, headers=None):
+        entry = CachedResponse(body, body_etag(body), headers or {})
+        with self._lock:
+            # A response built from data that was replaced in the meantime is not kept
+            if version == self.version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return entry
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'version': self.version,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
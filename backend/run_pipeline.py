@@ -0,0 +1,117 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import match_high_confidence
+import normalize_data
+from consolidate_data import CACHE_FOLDER_NAME, OUTPUT_HEADER, iter_consolidated_rows, load_item_ids, save_item_ids
+from matched_data import columnar_path_for, read_matched_csv, write_columnar_data
+from pipeline_metrics import RunMetrics
+from price_history import HISTORY_FOLDER, record_snapshot
+
+# Runs consolidate -> normalize -> match in one process, handing typed DataFrames from one stage to
+# the next instead of writing and re-parsing consolidated_items.csv and normalized_items.csv.
+# Prices stay floats from the store file to the matched output. Only the matched CSV, its columnar
+# copy and the price history are written, as match_high_confidence.py does, plus the item ID map
+# shared with consolidate_data.py and incremental_pipeline.py, which keeps IDs stable between runs.
+# Usage: python run_pipeline.py [--fuzzy] [--debug-output] [--profile] [--trace-memory]
+#   --debug-output  also write the intermediate CSVs, in the same format as the standalone scripts
+
+DATA_FOLDER = "data"
+
+# Text columns of the consolidated rows. Empty values become missing, as when the CSV is read back.
+CONSOLIDATED_TEXT_COLUMNS = ['name', 'store', 'brand', 'net_quantity', 'unit_of_measure', 'category']
+
+def consolidated_frame(rows):
+    # rows are output rows of iter_consolidated_rows, in OUTPUT_HEADER order
+    columns = list(zip(*rows)) if rows else [()] * len(OUTPUT_HEADER)
+    df = pd.DataFrame({
+        'id': np.asarray(columns[0], dtype=np.int64),
+        'price': np.asarray(columns[2], dtype=np.float64),
+    })
+    for name, values in zip(OUTPUT_HEADER, columns):
+        if name in CONSOLIDATED_TEXT_COLUMNS:
+            text = pd.Series(values, dtype=str)
+            df[name] = text.mask(text == '')
+    return df[OUTPUT_HEADER]
+
+def write_consolidated_csv(df, output_filepath):
+    # Same rows and formatting as consolidate_data.process_csv_files
+    df_out = df.astype(object).where(df.notna(), '')
+    df_out['price'] = [f"{price:.2f}" for price in df['price']]
+    df_out.to_csv(output_filepath, index=False, encoding='utf-8', lineterminator='\r\n')
+
+def build_matched_frame(data_folder, metrics, fuzzy=False, debug_output=False, max_workers=None):
+    # The matched rows of every store file, columns ordered as in the matched CSV. Empty if no store could be read.
+    consolidated_path = os.path.join(data_folder, os.path.basename(normalize_data.INPUT_CSV))
+    normalized_path = os.path.join(data_folder, os.path.basename(match_high_confidence.INPUT_CSV))
+
+    cache_folder = os.path.join(data_folder, CACHE_FOLDER_NAME)
+    item_name_to_id = load_item_ids(cache_folder)
+    rows = list(iter_consolidated_rows(data_folder, item_name_to_id, metrics, max_workers))
+    save_item_ids(cache_folder, item_name_to_id)
+    with metrics.stage('build_frame') as stage:
+        df = consolidated_frame(rows)
+        del rows
+        stage['rows'] = len(df)
+    print(f"\nConsolidated {len(df)} rows, {len(item_name_to_id)} unique item names.")
+    if df.empty:
+        return df
+    if debug_output:
+        with metrics.stage('write_debug_consolidated'):
+            write_consolidated_csv(df, consolidated_path)
+        print(f"Wrote {consolidated_path}")
+
+    with metrics.stage('normalize') as stage:
+        df = normalize_data.normalize_data(df)
+        stage['rows'] = len(df)
+    if debug_output:
+        with metrics.stage('write_debug_normalized'):
+            df.to_csv(normalized_path, index=False, encoding='utf-8')
+        print(f"Wrote {normalized_path}")
+
+    with metrics.stage('exact_match') as stage:
+        df = match_high_confidence.apply_shared_ids(match_high_confidence.prepare_for_matching(df))
+        stage['rows'] = len(df)
+    if fuzzy:
+        with metrics.stage('fuzzy_match') as stage:
+            df = match_high_confidence.apply_fuzzy_matching(df)
+            stage['rows'] = len(df)
+
+    cols_order = ['id'] + [c for c in df.columns if c != 'id']
+    return df[cols_order]
+
+def run_pipeline(data_folder=DATA_FOLDER, fuzzy=False, debug_output=False, max_workers=None, metrics=None):
+    # Stage timings go to metrics (a pipeline_metrics.RunMetrics); without one they are only printed
+    metrics = metrics or RunMetrics('run_pipeline', argv=[])
+    df = build_matched_frame(data_folder, metrics, fuzzy, debug_output, max_workers)
+    if df.empty:
+        print("No store data available. Nothing written.")
+        return 0
+
+    matched_path = os.path.join(data_folder, os.path.basename(match_high_confidence.OUTPUT_CSV))
+    with metrics.stage('write') as stage:
+        df.to_csv(matched_path, index=False, encoding='utf-8')
+        stage['rows'] = len(df)
+
+    # Built from the saved CSV with the API's own loader, as in match_high_confidence.py
+    with metrics.stage('write_columnar') as stage:
+        df_saved = read_matched_csv(matched_path)
+        write_columnar_data(df_saved, columnar_path_for(matched_path))
+        stage['rows'] = len(df_saved)
+    with metrics.stage('record_history'):
+        record_snapshot(df_saved, folder=os.path.join(data_folder, os.path.basename(HISTORY_FOLDER)))
+
+    print(f"\nWrote {matched_path} ({len(df)} rows, {df['id'].nunique()} unique shared IDs).")
+    return len(df)
+
+if __name__ == "__main__":
+    if not os.path.isdir(DATA_FOLDER):
+        print(f"Error: Data directory '{DATA_FOLDER}' not found. Please ensure it exists in the same location as the script.")
+        exit()
+
+    metrics = RunMetrics('run_pipeline')
+    matched_rows = run_pipeline(fuzzy='--fuzzy' in sys.argv, debug_output='--debug-output' in sys.argv, metrics=metrics)
+    metrics.finish(matched_rows=matched_rows)
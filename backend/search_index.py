@@ -0,0 +1,239 @@
+import re
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Prefix search over the normalized name, brand and category of every item with a price.
+# Tokens are indexed accent-folded ("čokolada" -> "cokolada", "đ" -> "dj"), so queries match with or
+# without Croatian diacritics; typing the accents exactly as in the name ranks an item higher.
+# Every query term is matched as a prefix and all terms must match.
+
+# Prefixes up to this length get their matching items precomputed, so short queries don't
+# have to merge the posting lists of thousands of tokens
+PRECOMPUTED_PREFIX_LENGTH = 3
+
+# Score per query term, by where it matched
+NAME_PREFIX_WEIGHT = 2.0
+NAME_EXACT_BONUS = 1.0 # On top of the prefix weight when the term is a whole word of the name
+OTHER_FIELD_WEIGHT = 1.0 # brand or category
+ACCENT_BONUS = 0.5 # The name has the term with the same accents the query used
+
+# Brand values that only mean "no brand"
+IGNORED_BRANDS = {'', 'nan', 'no brand'}
+
+TOKEN_PATTERN = re.compile(r'\w+')
+ASCII_FOLDS = str.maketrans({'đ': 'dj', 'ß': 'ss', 'æ': 'ae', 'ø': 'o'})
+
+# One searchable field group. 'tokens' is the sorted token list and 'positions' the item positions of
+# every token one after the other, those of tokens[i] being positions[bounds[i]:bounds[i + 1]] (ascending
+# int32), so the tokens sharing a prefix have their items in one slice. 'by_token' maps a token to its
+# slice and 'prefixes' holds the precomputed items per short prefix.
+TokenIndex = namedtuple('TokenIndex', ['tokens', 'positions', 'bounds', 'by_token', 'prefixes'])
+
+# 'item_ids' maps an item position back to its ID; 'rank' is the fallback order for equal scores
+# (more stores first, then shorter names, then lower IDs).
+SearchIndex = namedtuple('SearchIndex', ['item_ids', 'rank', 'name', 'name_accented', 'other', 'build_seconds'])
+
+_EMPTY_POSTINGS = np.empty(0, dtype=np.int32)
+
+
+def fold_accents(text):
+    if text.isascii():
+        return text
+    text = text.translate(ASCII_FOLDS)
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _sorted_unique(values):
+    values = np.sort(values)
+    return values[np.append(True, values[1:] != values[:-1])] if len(values) else values
+
+
+def _group_positions(codes, positions, group_count, item_count):
+    # Sorted, de-duplicated item positions per group code: (int32 positions of every group in code
+    # order, bounds), the positions of group 'code' being positions[bounds[code]:bounds[code + 1]]
+    keys = _sorted_unique(codes.astype(np.int64) * item_count + positions)
+    bounds = np.searchsorted(keys // item_count, np.arange(group_count + 1))
+    return (keys % item_count).astype(np.int32), bounds
+
+
+def _split_positions(positions, bounds):
+    return [positions[bounds[code]:bounds[code + 1]] for code in range(len(bounds) - 1)]
+
+
+def _build_token_index(tokens, positions, item_count, fold=False):
+    # tokens and positions are parallel lists: token tokens[i] occurs in item positions[i].
+    # With fold=True the tokens are accent-folded first (once per distinct token).
+    token_codes, token_values = pd.factorize(pd.Series(tokens, dtype=object), sort=True)
+    if fold:
+        folded_codes, token_values = pd.factorize(pd.Series([fold_accents(t) for t in token_values], dtype=object), sort=True)
+        token_codes = folded_codes[token_codes] if len(token_codes) else token_codes
+    token_values = [str(token) for token in token_values]
+    positions = np.asarray(positions, dtype=np.int64)
+    token_positions, token_bounds = _group_positions(token_codes, positions, len(token_values), item_count)
+    by_token = dict(zip(token_values, _split_positions(token_positions, token_bounds)))
+
+    prefixes = {}
+    for length in range(1, PRECOMPUTED_PREFIX_LENGTH + 1):
+        # Tokens shorter than 'length' are already covered by their full-length entry
+        has_prefix = np.array([len(token) >= length for token in token_values], dtype=bool)
+        prefix_codes, prefix_values = pd.factorize(pd.Series([token[:length] for token in token_values], dtype=object))
+        prefix_codes[~has_prefix] = -1
+        pair_prefix_codes = prefix_codes[token_codes] if len(token_codes) else prefix_codes[:0]
+        keep = pair_prefix_codes >= 0
+        grouped = _split_positions(*_group_positions(pair_prefix_codes[keep], positions[keep], len(prefix_values), item_count))
+        for prefix, prefix_positions in zip(prefix_values, grouped):
+            if len(prefix) == length:
+                prefixes[prefix] = prefix_positions
+    return TokenIndex(token_values, token_positions, token_bounds, by_token, prefixes)
+
+
+def _prefix_matches(token_index, prefix):
+    if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH:
+        return token_index.prefixes.get(prefix, _EMPTY_POSTINGS)
+    lo = bisect_left(token_index.tokens, prefix)
+    hi = bisect_left(token_index.tokens, prefix + '\uffff', lo)
+    positions = token_index.positions[token_index.bounds[lo]:token_index.bounds[hi]]
+    return positions if hi - lo == 1 else _sorted_unique(positions)
+
+
+def empty_search_index():
+    empty = _build_token_index([], [], 1)
+    return SearchIndex(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32), empty, empty, empty, 0.0)
+
+
+def build_search_index(df, item_index):
+    start_time = time.perf_counter()
+    if df is None or df.empty or not item_index.items:
+        return empty_search_index()
+
+    # Items without a price can't be shown, so they are not searchable
+    item_ids = np.array(sorted(item_id for item_id, record in item_index.items.items() if len(record.prices)), dtype=np.int64)
+    item_count = len(item_ids)
+    position_of = {item_id: position for position, item_id in enumerate(item_ids.tolist())}
+
+    records = [item_index.items[item_id] for item_id in item_ids.tolist()]
+    names = pd.Series([record.name for record in records], dtype=object)
+    name_token_lists = names.str.lower().str.findall(TOKEN_PATTERN).explode().dropna()
+    name_tokens = name_token_lists.tolist()
+    name_positions = name_token_lists.index.to_numpy()
+
+    # Brands and categories differ between stores, so every distinct value of an item counts
+    other_tokens, other_positions = [], []
+    text_tokens = {}
+    fields = df[['id', 'brand', 'category']].astype({'id': np.int64, 'brand': str, 'category': str}).drop_duplicates()
+    for item_id, brand, category in zip(fields['id'].tolist(), fields['brand'].tolist(), fields['category'].tolist()):
+        position = position_of.get(item_id)
+        if position is None:
+            continue
+        texts = [category] if brand.lower() in IGNORED_BRANDS else [brand, category]
+        for text in texts:
+            tokens = text_tokens.get(text)
+            if tokens is None:
+                tokens = text_tokens[text] = [token for token in tokenize(text) if token != 'nan']
+            other_tokens.extend(tokens)
+            other_positions.extend([position] * len(tokens))
+
+    store_counts = np.array([len(set(record.store_codes.tolist())) for record in records])
+    name_lengths = names.str.len().to_numpy()
+    order = np.lexsort((item_ids, name_lengths, -store_counts))
+    rank = np.empty(item_count, dtype=np.int32)
+    rank[order] = np.arange(item_count, dtype=np.int32)
+
+    return SearchIndex(
+        item_ids,
+        rank,
+        _build_token_index(name_tokens, name_positions, item_count, fold=True),
+        _build_token_index(name_tokens, name_positions, item_count),
+        _build_token_index(other_tokens, other_positions, item_count, fold=True),
+        time.perf_counter() - start_time,
+    )
+
+
+def _term_matches(search_index, term):
+    # Sorted item positions a query term matches: (name prefix, brand or category prefix, whole name
+    # word, name prefix with the accents as typed)
+    folded = fold_accents(term)
+    accented = _prefix_matches(search_index.name_accented, term) if folded != term else _EMPTY_POSTINGS
+    return (_prefix_matches(search_index.name, folded), _prefix_matches(search_index.other, folded),
+            search_index.name.by_token.get(folded, _EMPTY_POSTINGS), accented)
+
+
+def _found_at(sorted_positions, positions):
+    # Indexes into the sorted 'positions' of those also in sorted_positions, looking up whichever
+    # array is shorter
+    if len(sorted_positions) == 0 or len(positions) == 0:
+        return _EMPTY_POSTINGS
+    if len(sorted_positions) < len(positions):
+        at = np.minimum(np.searchsorted(positions, sorted_positions), len(positions) - 1)
+        return at[positions.take(at) == sorted_positions]
+    at = np.minimum(np.searchsorted(sorted_positions, positions), len(sorted_positions) - 1)
+    return np.flatnonzero(sorted_positions.take(at) == positions)
+
+
+def _add_bonuses(scores, term_matches, positions):
+    _, _, exact, accented = term_matches
+    scores[_found_at(exact, positions)] += NAME_EXACT_BONUS
+    scores[_found_at(accented, positions)] += ACCENT_BONUS
+    return scores
+
+
+def _seed_scores(term_matches):
+    # Every item a term matches with its score: (sorted positions, scores). A term scores by the best
+    # field it matched in, plus the bonuses. Name matches sort before other matches of the same item,
+    # so the first entry per item tells the field.
+    name, other = term_matches[:2]
+    keys = np.sort(np.concatenate((name << 1, (other << 1) | 1)))
+    positions = keys >> 1
+    first = np.empty(len(keys), dtype=bool)
+    first[:1] = True
+    np.not_equal(positions[1:], positions[:-1], out=first[1:])
+    first = np.flatnonzero(first)
+    positions = positions.take(first)
+    scores = NAME_PREFIX_WEIGHT - (NAME_PREFIX_WEIGHT - OTHER_FIELD_WEIGHT) * (keys.take(first) & 1).astype(float)
+    return positions, _add_bonuses(scores, term_matches, positions)
+
+
+def _term_scores(term_matches, positions):
+    # Score of one term for each of the sorted 'positions', 0 where it didn't match
+    name, other = term_matches[:2]
+    scores = np.zeros(len(positions))
+    scores[_found_at(other, positions)] = OTHER_FIELD_WEIGHT
+    scores[_found_at(name, positions)] = NAME_PREFIX_WEIGHT
+    return _add_bonuses(scores, term_matches, positions)
+
+
+def search(search_index, query, limit):
+    # Returns up to 'limit' item IDs, best match first. The items matching the most selective term are
+    # the candidates and every term only scores those, so a query costs in proportion to that term's
+    # posting lists rather than to the catalog.
+    terms = tokenize(query)
+    if not terms or len(search_index.item_ids) == 0:
+        return []
+
+    matches = [_term_matches(search_index, term) for term in terms]
+    seed = min(range(len(terms)), key=lambda term: len(matches[term][0]) + len(matches[term][1]))
+    candidates, scores = _seed_scores(matches[seed])
+    for term_matches in matches[:seed] + matches[seed + 1:]:
+        term_scores = _term_scores(term_matches, candidates)
+        matched = np.flatnonzero(term_scores)
+        candidates, scores = candidates.take(matched), scores.take(matched) + term_scores.take(matched)
+        if len(candidates) == 0:
+            return []
+
+    # Highest score first, then by rank; scores are multiples of ACCENT_BONUS, so both fit one integer key
+    keys = search_index.rank[candidates] - (scores / ACCENT_BONUS).astype(np.int64) * len(search_index.item_ids)
+    if len(keys) > limit:
+        # Only the best 'limit' candidates need sorting
+        best = np.argpartition(keys, limit - 1)[:limit]
+        keys, candidates = keys[best], candidates[best]
+    return search_index.item_ids[candidates[np.argsort(keys)]].tolist()
@@ -0,0 +1,192 @@
+import csv
+import os
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from consolidate_data import FILES_TO_PROCESS
+
+# Seeded synthetic store files for scale benchmarks. Every store in FILES_TO_PROCESS gets a file in
+# its own dialect: column layout, delimiter, decimal separator, quoting, encoding and the way it writes
+# package sizes, as in the bundled files. Scale 1 writes as many rows per store as the bundled files have.
+# A share of each store's rows (the overlap) comes from one catalog of products all stores draw from,
+# with the same name, brand and size everywhere; the rest are products only that store sells.
+# The same seed, scale and overlap always give byte-identical files.
+# Usage: python synthetic_data.py <output folder> [--scale N] [--overlap 0.3] [--seed 0]
+
+# Rows per store at scale 1, as parsed from the bundled files
+STORE_ROWS = {'tommy': 13582, 'spar': 17286, 'lidl': 12886, 'konzum': 14910, 'eurospin': 5198, 'studenac': 12880}
+DEFAULT_OVERLAP = 0.3
+DEFAULT_SEED = 0
+# Rows generated and written at a time
+CHUNK_ROWS = 100_000
+
+# 'header' is the bundled file's header row; 'format_size' turns (amount, unit) with unit 'kg', 'l'
+# or 'kom' into the store's (net_quantity, unit_of_measure); 'quote_all' quotes every field.
+StoreDialect = namedtuple('StoreDialect', ['encoding', 'header', 'format_size', 'quote_all', 'name_case'])
+
+def _decimal_comma(text):
+    return text.replace('.', ',')
+
+def _gram_units(amount, unit):
+    if unit == 'kg':
+        return f"{amount * 1000:g}g"
+    if unit == 'l':
+        return f"{amount * 1000:g}ml"
+    return f"{amount:g}kom"
+
+STORE_DIALECTS = {
+    # Everything in pieces, with a decimal comma
+    'tommy': StoreDialect('utf-8', [
+        'BARKOD_ARTIKLA', 'SIFRA_ARTIKLA', 'NAZIV_ARTIKLA', 'BRAND', 'ROBNA_STRUKTURA', 'JEDINICA_MJERE', 'NETO_KOLICINA',
+        'MPC', 'MPC_POSEBNA_PRODAJA', 'CIJENA_PO_JM', 'MPC_NAJNIZA_30', 'MPC_020525', 'DATUM_ULASKA_NOVOG_ARTIKLA',
+        'PRVA_CIJENA_NOVOG_ARTIKLA',
+    ], lambda amount, unit: (_decimal_comma(f"{amount:.3f}"), 'kom'), False, str.upper),
+    'spar': StoreDialect('iso-8859-2', [
+        'naziv', 'šifra', 'marka', 'neto količina', 'jedinica mjere', 'MPC', 'cijena za jedinicu mjere',
+        'MPC za vrijeme posebnog oblika prodaje', 'Najniža cijena u posljednjih 30 dana', 'datum sidrene cijene',
+        'sidrena cijena na 2.5.2025.', 'barkod', 'kategorija proizvoda',
+    ], lambda amount, unit: (f"{amount:.4f}", {'kg': 'kg', 'l': 'L', 'kom': 'kom'}[unit]), False, str.upper),
+    'lidl': StoreDialect('cp1250', [
+        'NAZIV', 'ŠIFRA', 'NETO_KOLIČINA', 'JEDINICA_MJERE', 'PAKIRANJE', 'MARKA', 'MALOPRODAJNA_CIJENA',
+        'CIJENA_ZA_JEDINICU_MJERE', 'BARKOD', 'KATEGORIJA_PROIZVODA', 'Sidrena_cijena_na_02.05.2025',
+    ], lambda amount, unit: (f"{amount:g}", _gram_units(amount, unit)), False, str.capitalize),
+    # Size and unit in net_quantity, 'ko' as the unit
+    'konzum': StoreDialect('utf-8', [
+        'NAZIV PROIZVODA', 'ŠIFRA PROIZVODA', 'MARKA PROIZVODA', 'NETO KOLIČINA', 'JEDINICA MJERE', 'MALOPRODAJNA CIJENA',
+        'CIJENA ZA JEDINICU MJERE', 'MPC ZA VRIJEME POSEBNOG OBLIKA PRODAJE', 'NAJNIŽA CIJENA U POSLJEDNIH 30 DANA',
+        'SIDRENA CIJENA NA 2.5.2025', 'BARKOD', 'KATEGORIJA PROIZVODA',
+    ], lambda amount, unit: (f"{amount:.2f} {unit}", 'ko'), False, str.upper),
+    'eurospin': StoreDialect('utf-8', [
+        'NAZIV_PROIZVODA', 'ŠIFRA_PROIZVODA', 'MARKA_PROIZVODA', 'NETO_KOLIČINA', 'JEDINICA_MJERE', 'MALOPROD.CIJENA(EUR)',
+        'CIJENA_ZA_JEDINICU_MJERE', 'MPC_POSEB.OBLIK_PROD', 'POSEB.OBLIK_PROD__ZA_JEDINICU_MJERE', 'NAJNIŽA_MPC_U_30DANA',
+        'SIDRENA_CIJENA', 'BARKOD', 'KATEGORIJA_PROIZVODA',
+    ], lambda amount, unit: (f"{amount:g}", unit.upper()), True, str.upper),
+    'studenac': StoreDialect('cp1250', [
+        'NAZIV', 'ŠIFRA', 'NETO_KOLIČINA', 'JEDINICA_MJERE', 'PAKIRANJE', 'MARKA', 'MALOPRODAJNA_CIJENA',
+        'CIJENA_ZA_JEDINICU_MJERE', 'BARKOD', 'KATEGORIJA_PROIZVODA', 'Sidrena_cijena_na_02.05.2025',
+    ], lambda amount, unit: (f"{amount:g}", _gram_units(amount, unit)), False, str.capitalize),
+}
+
+PRODUCT_WORDS = [
+    'mlijeko', 'jogurt', 'sir', 'kruh', 'čokolada', 'kava', 'pivo', 'sok', 'voda', 'deterdžent', 'šampon',
+    'tjestenina', 'riža', 'brašno', 'ulje', 'keksi', 'maslac', 'vrhnje', 'šunka', 'kobasica', 'pašteta', 'čaj',
+    'med', 'džem', 'sapun', 'omekšivač', 'papir', 'salata', 'juha', 'umak', 'krekeri', 'napolitanke', 'vino',
+]
+VARIANT_WORDS = [
+    'jagoda', 'vanilija', 'light', 'classic', 'bio', 'integralni', 'domaći', 'trajni', 'svježi', 'dimljeni',
+    'punomasni', 'mliječna', 'tamna', 'gazirana', 'negazirana', 'naranča', 'jabuka', 'borovnica', 'lješnjak',
+    'original', 'extra', 'premium', 'mini', 'family', 'sensitive', 'fresh', 'limun', 'kakao', 'pileća', 'pureća',
+]
+LINE_SYLLABLES = ['ka', 'ro', 'mi', 'la', 'ne', 'vo', 'zu', 'ti', 'da', 'pe', 'ri', 'so', 'ba', 'lu', 'še', 'ći']
+BRANDS = [
+    '', 'Dukat', 'Vindija', 'Podravka', 'Kraš', 'Franck', 'Jamnica', 'Ledo', 'Zvijezda', 'Gavrilović', 'PIK',
+    'Meggle', 'Milka', 'Barcaffe', 'Cedevita', 'Bakina tajna', 'Pilos', 'K Plus', 'Spar', 'Milbona', 'Land',
+]
+CATEGORIES = ['Hrana', 'Piće', 'Mliječni proizvodi', 'Kućanstvo', 'Kozmetika', 'Meso i riba', 'Slatkiši']
+# (amount, unit) package sizes
+SIZES = [
+    (0.1, 'kg'), (0.15, 'kg'), (0.2, 'kg'), (0.25, 'kg'), (0.4, 'kg'), (0.5, 'kg'), (1.0, 'kg'), (2.5, 'kg'),
+    (0.2, 'l'), (0.33, 'l'), (0.5, 'l'), (0.75, 'l'), (1.0, 'l'), (1.5, 'l'), (2.0, 'l'),
+    (1.0, 'kom'), (4.0, 'kom'), (6.0, 'kom'), (10.0, 'kom'),
+]
+# Relative price level of each store
+STORE_PRICE_LEVELS = {'tommy': 1.02, 'spar': 1.05, 'lidl': 0.95, 'konzum': 1.0, 'eurospin': 0.93, 'studenac': 1.04}
+
+def _product_name(product, size_index):
+    # Name text of catalog product number 'product'; different products get different names
+    words = len(PRODUCT_WORDS) * len(VARIANT_WORDS)
+    line, rest = divmod(int(product), words)
+    noun, variant = divmod(rest, len(VARIANT_WORDS))
+    line_word = ''
+    while True:
+        line, syllable = divmod(line, len(LINE_SYLLABLES))
+        line_word += LINE_SYLLABLES[syllable]
+        if line == 0:
+            break
+    amount, unit = SIZES[size_index]
+    size_text = f"{amount * 1000:g}{'g' if unit == 'kg' else 'ml'}" if unit != 'kom' else f"{amount:g} kom"
+    return f"{PRODUCT_WORDS[noun]} {VARIANT_WORDS[variant]} {line_word} {size_text}"
+
+def _format_price(price, decimal_separator):
+    if decimal_separator == ',':
+        # Thousands with a period, as get_cleaned_price expects for decimal-comma stores
+        return f"{price:,.2f}".replace(',', ' ').replace('.', ',').replace(' ', '.')
+    return f"{price:.2f}"
+
+def _store_products(rng, rows, catalog_size, exclusive_start, overlap):
+    # Product numbers of one store's rows: shared catalog products first, then products of its own
+    shared_rows = min(int(round(rows * overlap)), catalog_size)
+    shared = rng.choice(catalog_size, shared_rows, replace=False)
+    exclusive = np.arange(exclusive_start, exclusive_start + rows - shared_rows)
+    products = np.concatenate([shared, exclusive])
+    rng.shuffle(products)
+    return products
+
+def _product_attributes(products, seed):
+    # Brand, category, size and base price per product number, the same in every store
+    rng = np.random.Generator(np.random.PCG64(seed))
+    # A fixed table indexed by product number mod its length keeps attributes independent of store order
+    table_size = 1 << 16
+    brands = rng.integers(0, len(BRANDS), table_size)
+    categories = rng.integers(0, len(CATEGORIES), table_size)
+    sizes = rng.integers(0, len(SIZES), table_size)
+    prices = np.round(rng.lognormal(1.0, 0.8, table_size), 2) + 0.29
+    slots = (products * 2654435761) % table_size # Spreads consecutive products over the table
+    return brands[slots], categories[slots], sizes[slots], prices[slots]
+
+def write_store_file(path, config, rows, catalog_size, exclusive_start, overlap, seed):
+    store_name = config.store
+    dialect = STORE_DIALECTS[store_name]
+    position = [c.store for c in FILES_TO_PROCESS].index(store_name)
+    rng = np.random.Generator(np.random.PCG64([seed, position]))
+    products = _store_products(rng, rows, catalog_size, exclusive_start, overlap)
+    price_noise = rng.normal(1.0, 0.04, len(products))
+
+    quoting = csv.QUOTE_ALL if dialect.quote_all else csv.QUOTE_MINIMAL
+    with open(path, 'w', encoding=dialect.encoding, newline='') as f:
+        writer = csv.writer(f, delimiter=config.delimiter, quotechar=config.quote_char, quoting=quoting)
+        writer.writerow(dialect.header)
+        for start in range(0, len(products), CHUNK_ROWS):
+            chunk = products[start:start + CHUNK_ROWS]
+            brands, categories, sizes, base_prices = _product_attributes(chunk, seed)
+            prices = np.maximum(np.round(base_prices * STORE_PRICE_LEVELS[store_name] * price_noise[start:start + CHUNK_ROWS], 2), 0.01)
+            for product, brand, category, size, price in zip(chunk.tolist(), brands.tolist(), categories.tolist(), sizes.tolist(), prices.tolist()):
+                # Columns the pipeline doesn't read hold the product code
+                row = [f"{product:08d}"] * len(dialect.header)
+                row[config.name] = dialect.name_case(_product_name(product, size))
+                row[config.price] = _format_price(price, config.decimal_separator)
+                row[config.brand] = BRANDS[brand]
+                row[config.net_quantity], row[config.unit_of_measure] = dialect.format_size(*SIZES[size])
+                row[config.category] = CATEGORIES[category]
+                writer.writerow(row)
+    return len(products)
+
+def generate_store_files(folder, scale=1, overlap=DEFAULT_OVERLAP, seed=DEFAULT_SEED):
+    # Writes one file per store in FILES_TO_PROCESS to folder and returns the number of rows written
+    os.makedirs(folder, exist_ok=True)
+    store_rows = {store: int(round(rows * scale)) for store, rows in STORE_ROWS.items()}
+    catalog_size = max(int(round(rows * overlap)) for rows in store_rows.values())
+    exclusive_start = catalog_size
+    total = 0
+    for config in FILES_TO_PROCESS:
+        store_name = config.store
+        total += write_store_file(os.path.join(folder, config.filename), config, store_rows[store_name],
+                                  catalog_size, exclusive_start, overlap, seed)
+        exclusive_start += store_rows[store_name]
+    return total
+
+def _option(name, default, convert):
+    return convert(sys.argv[sys.argv.index(name) + 1]) if name in sys.argv else default
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1].startswith('--'):
+        print("Usage: python synthetic_data.py <output folder> [--scale N] [--overlap 0.3] [--seed 0]")
+        sys.exit(1)
+    output_folder = sys.argv[1]
+    scale = _option('--scale', 1, float)
+    overlap = _option('--overlap', DEFAULT_OVERLAP, float)
+    seed = _option('--seed', DEFAULT_SEED, int)
+    rows = generate_store_files(output_folder, scale, overlap, seed)
+    print(f"Wrote {rows} rows for {len(FILES_TO_PROCESS)} stores to {output_folder} (scale {scale:g}, overlap {overlap:g}, seed {seed}).")
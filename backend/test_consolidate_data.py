@@ -0,0 +1,118 @@
+import csv
+import os
+
+import pandas as pd
+import pytest
+
+from consolidate_data import FILES_TO_PROCESS, StoreAdapter, clean_prices, get_cleaned_price, iter_store_rows, sniff_encoding
+from reference_consolidate import TRICKY_PRICES, reference_store_rows, same_price
+
+
+def write_store_file(folder, config, rows):
+    # rows as lists of fields, written with the adapter's dialect after its skipped lines
+    filepath = os.path.join(folder, config.filename)
+    with open(filepath, 'w', encoding=config.encodings[0], newline='') as f:
+        writer = csv.writer(f, delimiter=config.delimiter, quotechar=config.quote_char)
+        for line in range(config.skip_lines):
+            writer.writerow([f'header {line}'])
+        writer.writerows(rows)
+    return filepath
+
+
+def sample_rows(config):
+    # One row per price case, laid out in the adapter's columns. A ',' store writes 1.234,56, a '.' store 1,234.56.
+    thousands = '1.234,56' if config.decimal_separator == ',' else '1,234.56'
+    cents = ',99' if config.decimal_separator == ',' else '.99'
+    prices = [thousands, cents, '', '   ', '-1,50', '"2,49"', ' 3.10 ', 'EUR 12,00', '١٢,٥', '1²', 'abc', '0,00']
+    width = max(getattr(config, column) for column in ('name', 'price', 'brand', 'net_quantity', 'unit_of_measure', 'category')) + 1
+    rows = []
+    for position, price in enumerate(prices):
+        row = [''] * width
+        row[config.name] = f'  Artikl  {position} '
+        row[config.price] = price
+        row[config.brand] = f'"brand {position}"'
+        row[config.net_quantity] = '0,5'
+        row[config.unit_of_measure] = ' kg '
+        row[config.category] = 'hrana'
+        rows.append(row)
+    # No name: dropped whatever the price
+    rows.append([''] * width)
+    return rows
+
+
+@pytest.mark.parametrize('decimal_separator', [',', '.'])
+def test_clean_prices_matches_get_cleaned_price(decimal_separator):
+    prices = clean_prices(pd.Series(TRICKY_PRICES, dtype=object), decimal_separator)
+    for field, price in zip(TRICKY_PRICES, prices.tolist()):
+        assert same_price(get_cleaned_price(field, decimal_separator), price), field
+
+
+def test_clean_prices_reads_comma_decimals():
+    prices = clean_prices(pd.Series(['1.234,56', ',99', '-1,50', ''], dtype=object), ',').tolist()
+    assert prices[:3] == [1234.56, 0.99, -1.5]
+    assert pd.isna(prices[3])
+
+
+@pytest.mark.parametrize('config', FILES_TO_PROCESS, ids=lambda config: config.store)
+def test_store_rows_match_csv_module_reader_on_sample_rows(config, tmp_path):
+    filepath = write_store_file(tmp_path, config, sample_rows(config))
+    encoding = config.encodings[0]
+
+    rows = list(iter_store_rows(filepath, config, encoding))
+
+    assert rows == list(reference_store_rows(filepath, config, encoding))
+    # Empty, blank, negative and unreadable prices are dropped, as is the row without a name
+    assert [name for _, name, *_ in rows] == [f'Artikl  {position}' for position in (0, 1, 5, 6, 7, 8, 11)]
+    assert [price for _, _, price, *_ in rows][:2] == [1234.56, 0.99]
+    assert rows[0][3:] == ('brand 0', '0,5', 'kg', 'hrana')
+
+
+@pytest.mark.parametrize('config', FILES_TO_PROCESS, ids=lambda config: config.store)
+def test_short_rows_are_dropped(config, tmp_path):
+    # A first row and a middle row that stop before the last needed column
+    rows = sample_rows(config)
+    last_position = len(rows[0]) - 1
+    encoding = config.encodings[0]
+    expected = list(iter_store_rows(write_store_file(tmp_path, config, rows), config, encoding))
+    filepath = write_store_file(tmp_path, config, [rows[0][:last_position]] + rows[:5] + [rows[5][:2]] + rows[5:])
+
+    parsed = list(iter_store_rows(filepath, config, encoding))
+
+    assert parsed == expected
+    assert parsed == list(reference_store_rows(filepath, config, encoding))
+
+
+@pytest.mark.parametrize('config', FILES_TO_PROCESS, ids=lambda config: config.store)
+def test_store_rows_match_csv_module_reader_on_bundled_files(config, data_folder):
+    filepath = os.path.join(data_folder, config.filename)
+    encoding = sniff_encoding(filepath, config.encodings)
+
+    assert list(iter_store_rows(filepath, config, encoding)) == list(reference_store_rows(filepath, config, encoding))
+
+
+def test_adapter_columns_by_header_name_and_missing_columns(tmp_path):
+    # Columns found by header name; a store without brand, quantity or unit reads them as empty
+    config = StoreAdapter('named.csv', 'named', name='Naziv', price='Cijena', brand=None, net_quantity=None,
+                          unit_of_measure=None, category='Kategorija', delimiter=';', decimal_separator=',')
+    filepath = os.path.join(tmp_path, config.filename)
+    with open(filepath, 'w', encoding='utf-8', newline='') as f:
+        f.write('\ufeffCijena;"Kategorija";Naziv\r\n')
+        f.write('1.234,56;hrana;Mlijeko 1 l\r\n')
+        f.write(';hrana;Bez cijene\r\n')
+        f.write(',99;"pića";" Sok "\r\n')
+
+    rows = list(iter_store_rows(filepath, config, 'utf-8'))
+
+    assert rows == [
+        ('mlijeko 1 l', 'Mlijeko 1 l', 1234.56, '', '', '', 'hrana'),
+        ('sok', 'Sok', 0.99, '', '', '', 'pića'),
+    ]
+
+
+def test_adapter_column_name_missing_from_header(tmp_path):
+    config = StoreAdapter('named.csv', 'named', name='Naziv', price='Cijena', brand=None, net_quantity=None,
+                          unit_of_measure=None, category=None)
+    filepath = write_store_file(tmp_path, config, [['Mlijeko', '1.29']])
+
+    with pytest.raises(ValueError):
+        list(iter_store_rows(filepath, config, 'utf-8'))
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from cart_optimizer import build_price_matrix, optimize_cart
+from item_index import build_item_index, cart_store_totals
+
+
+def matched_frame(rows):
+    # rows are (id, name, price, store); the other matched columns are filled in
+    df = pd.DataFrame(rows, columns=['id', 'name', 'price', 'store'])
+    df['brand'] = ''
+    df['net_quantity'] = '1'
+    df['unit_of_measure'] = 'kom'
+    df['category'] = 'hrana'
+    df['standardized_quantity'] = 1.0
+    df['standardized_unit'] = 'kom'
+    df['unit_price'] = df['price']
+    df['unit_price_unit'] = 'kom'
+    return df
+
+
+def test_store_listing_an_item_twice_counts_its_lowest_price():
+    df = matched_frame([
+        (19, 'mlijeko', 4.29, 'tommy'),
+        (19, 'mlijeko', 3.29, 'tommy'),
+        (19, 'mlijeko', 3.49, 'konzum'),
+        (20, 'kruh', 1.10, 'tommy'),
+    ])
+    index = build_item_index(df)
+    records = [index.items[19], index.items[20]]
+
+    totals = {entry['store']: entry for entry in cart_store_totals(index, records, [2, 1])}
+
+    assert totals['tommy']['total'] == 7.68 # 2 x 3.29 + 1.10
+    assert totals['tommy']['item_count'] == 2
+    assert totals['konzum']['total'] == 6.98
+    assert totals['konzum']['missing_ids'] == [20]
+
+
+def test_store_totals_agree_with_cart_optimizer():
+    df = matched_frame([
+        (19, 'mlijeko', 4.29, 'tommy'),
+        (19, 'mlijeko', 3.29, 'tommy'),
+        (19, 'mlijeko', 3.49, 'konzum'),
+    ])
+    index = build_item_index(df)
+    matrix = build_price_matrix(df, index.listing.ids, index.store_names)
+
+    totals = cart_store_totals(index, [index.items[19]], [1])
+    single_plan, _, _ = optimize_cart(matrix, {19: 1}, 1)
+
+    assert totals[0]['store'] == single_plan.stores[0] == 'tommy'
+    assert np.isclose(totals[0]['total'], single_plan.total)
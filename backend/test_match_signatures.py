@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from match_high_confidence import add_match_signature, prepare_for_matching
+from reference_signatures import legacy_signatures, same_groups
+
+
+def test_hashed_signatures_group_like_string_signatures(normalized_frame):
+    df = prepare_for_matching(normalized_frame.copy())
+    # Canonical quantities, so the string signature doesn't split float spellings of one value
+    df['standardized_quantity'] = df['standardized_quantity'].round(6)
+
+    legacy = legacy_signatures(df)
+    hashed = add_match_signature(df.copy())['match_signature']
+
+    assert hashed.dtype == np.int64
+    assert same_groups(legacy, hashed)
+    assert hashed.nunique() == legacy.nunique()
+
+
+def test_quantity_spellings_share_a_signature():
+    df = pd.DataFrame({
+        'id': [1, 2, 3, 4, 5, 6],
+        'name': ['Mlijeko', 'mlijeko ', 'MLIJEKO', 'Mlijeko', 'Mlijeko', 'Mlijeko'],
+        'brand': ['Dukat'] * 6,
+        'standardized_quantity': pd.Series([500, 500.0, '500', np.nan, None, 148.79999999999998], dtype=object),
+        'standardized_unit': ['g'] * 6,
+    })
+    signatures = add_match_signature(df)['match_signature'].tolist()
+
+    assert signatures[0] == signatures[1] == signatures[2]
+    assert signatures[3] == signatures[4]
+    assert signatures[0] != signatures[3]
+    assert signatures[5] not in (signatures[0], signatures[3])
+
+
+def test_different_items_get_different_signatures():
+    df = pd.DataFrame({
+        'id': [1, 2, 3, 4],
+        'name': ['mlijeko', 'mlijeko', 'mlijeko', 'jogurt'],
+        'brand': ['dukat', 'z bregov', 'dukat', 'dukat'],
+        'standardized_quantity': [1.0, 1.0, 0.5, 1.0],
+        'standardized_unit': ['l', 'l', 'l', 'l'],
+    })
+    assert add_match_signature(df)['match_signature'].nunique() == 4
@@ -0,0 +1,78 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from consolidate_data import FILES_TO_PROCESS
+from incremental_pipeline import run_incremental
+from normalize_data import normalize_data, unit_price
+from run_pipeline import run_pipeline
+
+
+def consolidated(rows):
+    return pd.DataFrame(rows, columns=['id', 'name', 'price', 'store', 'brand', 'net_quantity', 'unit_of_measure', 'category'])
+
+
+def test_store_without_parsable_quantities_normalizes_the_same_alone():
+    # No quantity of store 'b' parses; its rows must not depend on the other store being present
+    store_a = [(1, 'mlijeko', 1.29, 'a', '', '1', 'l', 'hrana'), (2, 'sir', 3.49, 'a', '', '0,5', 'kg', 'hrana')]
+    store_b = [(3, 'jogurt', 0.79, 'b', '', '', 'kg', 'hrana'), (4, 'kruh', 1.10, 'b', '', 'x', 'kom', 'hrana')]
+
+    combined = normalize_data(consolidated(store_a + store_b))
+    alone = normalize_data(consolidated(store_b))
+
+    columns = ['standardized_quantity', 'standardized_unit', 'unit_price', 'unit_price_unit']
+    pd.testing.assert_frame_equal(combined[columns].iloc[2:].reset_index(drop=True), alone[columns].reset_index(drop=True))
+
+
+def test_unit_prices_match_unit_price_on_bundled_items(consolidated_items, normalized_frame):
+    expected = [unit_price(price, net_quantity, unit_of_measure, name) for price, net_quantity, unit_of_measure, name in zip(
+        consolidated_items['price'], consolidated_items['net_quantity'], consolidated_items['unit_of_measure'], consolidated_items['name'])]
+
+    np.testing.assert_allclose(normalized_frame['unit_price'], [value for value, _ in expected], rtol=1e-12)
+    assert normalized_frame['unit_price_unit'].tolist() == [unit for _, unit in expected]
+
+
+def test_unit_prices_read_sizes_from_names_as_written():
+    # Cleaned, the first name would lose the size after 'VS.' and the second would read '6 komad370 g', a
+    # 370 g size. As written, its first size is the count '6 KOM', which gives no weight.
+    df = normalize_data(consolidated([
+        (1, 'MARTEL VS.0,70 L+2 ČAŠE', 35.49, 'tommy', '', '0,700', 'kom', 'hrana'),
+        (2, 'TORTILLA 6 KOM 370 g MISSION', 2.69, 'tommy', '', '0,370', 'kom', 'hrana'),
+    ]))
+
+    assert np.isclose(df['unit_price'][0], 35.49 / 0.7) and df['unit_price_unit'][0] == 'l'
+    assert np.isnan(df['unit_price'][1]) and df['unit_price_unit'][1] == ''
+
+
+def test_implausible_package_sizes_get_no_unit_price():
+    df = normalize_data(consolidated([
+        (1, 'VODA ZA USTA COLGATE 1 L', 7.49, 'spar', 'Colgate', '1000.0000', 'l', 'kozmetika'),
+        (2, 'FLIPS SLANI 100 g', 0.59, 'spar', '', '0.1000', 'g', 'hrana'),
+        (3, 'PIVO BAČVA 30L', 79.99, 'spar', '', '30.0000', 'l', 'pića'),
+        (4, 'ZAČIN ŠAFRAN 0,1g', 2.09, 'spar', '', '0.0010', 'kg', 'hrana'),
+    ]))
+
+    assert df['unit_price'][:2].isna().all()
+    assert np.allclose(df['unit_price'][2:], [79.99 / 30, 2090.0])
+
+
+def copy_store_files(data_folder, folder):
+    os.makedirs(folder)
+    for config in FILES_TO_PROCESS:
+        shutil.copy(os.path.join(data_folder, config.filename), folder)
+    return str(folder)
+
+
+def test_incremental_output_matches_full_run(data_folder, tmp_path):
+    full_folder = copy_store_files(data_folder, tmp_path / 'full')
+    incremental_folder = copy_store_files(data_folder, tmp_path / 'incremental')
+
+    run_pipeline(full_folder)
+    run_incremental(incremental_folder)
+
+    # Compared as written, field by field
+    full = pd.read_csv(os.path.join(full_folder, 'matched_items_v1.csv'), dtype=str, keep_default_na=False)
+    incremental = pd.read_csv(os.path.join(incremental_folder, 'matched_items_v1.csv'), dtype=str, keep_default_na=False)
+    pd.testing.assert_frame_equal(full, incremental)
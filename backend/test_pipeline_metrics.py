@@ -0,0 +1,33 @@
+import json
+import os
+import sys
+import tracemalloc
+
+from pipeline_metrics import RunMetrics
+
+
+def test_default_instances_ignore_the_environment(monkeypatch):
+    monkeypatch.setenv('PIPELINE_PROFILE', '1')
+    monkeypatch.setenv('PIPELINE_TRACE_MEMORY', '1')
+    metrics = RunMetrics('test', argv=[])
+
+    assert metrics.profiler is None
+    assert not metrics.trace_memory
+    assert sys.getprofile() is None
+
+
+def test_profiled_run_writes_report_and_profile(monkeypatch, tmp_path):
+    monkeypatch.setenv('PIPELINE_PROFILE', '1')
+    monkeypatch.setattr(sys, 'argv', ['test'])
+    metrics = RunMetrics('test', folder=str(tmp_path))
+    with metrics.stage('work') as stage:
+        stage['rows'] = sum(range(1000))
+    report_path = metrics.finish()
+
+    with open(report_path, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+    assert report['stages'][0]['name'] == 'work'
+    assert report['profile']['scope'].startswith('main process only')
+    assert os.path.exists(report['profile']['path'])
+    assert sys.getprofile() is None
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,103 @@
+import csv
+import datetime
+import io
+import os
+import shutil
+
+import pandas as pd
+
+import run_pipeline
+from consolidate_data import FILES_TO_PROCESS, process_csv_files, sniff_encoding
+from match_high_confidence import apply_shared_ids, prepare_for_matching
+from normalize_data import normalize_data
+from price_history import CHANGE_KINDS, CHANGE_NEW, read_changes, record_snapshot
+
+FIRST_DAY = datetime.date(2026, 3, 2)
+SECOND_DAY = datetime.date(2026, 3, 3)
+STORES = ('tommy', 'spar')
+
+
+def copy_store_files(data_folder, folder, stores=STORES):
+    os.makedirs(folder, exist_ok=True)
+    for config in FILES_TO_PROCESS:
+        if config.store in stores:
+            shutil.copy(os.path.join(data_folder, config.filename), folder)
+    return str(folder)
+
+
+def edit_first_product(folder, store, column, value, keep_original=False):
+    # Sets one field of the store's first product, either in place or on a copy written before it.
+    # The first rows are where run-local IDs would shift the most.
+    config = next(config for config in FILES_TO_PROCESS if config.store == store)
+    filepath = os.path.join(folder, config.filename)
+    encoding = sniff_encoding(filepath, config.encodings)
+    with open(filepath, 'r', encoding=encoding, newline='') as f:
+        lines = f.readlines()
+    fields = next(csv.reader([lines[config.skip_lines]], delimiter=config.delimiter))
+    fields[column] = value
+    line = io.StringIO()
+    csv.writer(line, delimiter=config.delimiter, lineterminator='\n').writerow(fields)
+    kept = lines[config.skip_lines:] if keep_original else lines[config.skip_lines + 1:]
+    with open(filepath, 'w', encoding=encoding, newline='') as f:
+        f.writelines(lines[:config.skip_lines] + [line.getvalue()] + kept)
+
+
+def run_csv_chain(folder, day):
+    # consolidate_data.py -> normalize_data.py -> match_high_confidence.py, then that day's snapshot
+    process_csv_files(folder, 'consolidated_items.csv')
+    df = normalize_data(pd.read_csv(os.path.join(folder, 'consolidated_items.csv')))
+    df = apply_shared_ids(prepare_for_matching(df))
+    record_snapshot(df, day, os.path.join(folder, 'history'))
+    return df
+
+
+def test_inserted_product_is_the_only_recorded_change(data_folder, tmp_path):
+    folder = copy_store_files(data_folder, tmp_path)
+    run_csv_chain(folder, FIRST_DAY)
+    edit_first_product(folder, 'tommy', 2, 'TEST PROIZVOD 123 g', keep_original=True)
+    run_csv_chain(folder, SECOND_DAY)
+
+    changes, stores = read_changes(folder=os.path.join(folder, 'history'))
+
+    assert len(changes) == 1
+    assert stores[changes['store'][0]] == 'tommy'
+    assert changes['kind'][0] == CHANGE_NEW
+
+
+def test_run_pipeline_records_only_the_inserted_product(data_folder, tmp_path, monkeypatch):
+    # run_pipeline records today's snapshot; each run is given its own day instead
+    days = iter([FIRST_DAY, SECOND_DAY])
+    monkeypatch.setattr(run_pipeline, 'record_snapshot', lambda df, folder: record_snapshot(df, next(days), folder))
+    folder = copy_store_files(data_folder, tmp_path)
+    run_pipeline.run_pipeline(folder)
+    edit_first_product(folder, 'tommy', 2, 'TEST PROIZVOD 123 g', keep_original=True)
+    run_pipeline.run_pipeline(folder)
+
+    changes, stores = read_changes(folder=os.path.join(folder, 'history'))
+
+    assert len(changes) == 1
+    assert stores[changes['store'][0]] == 'tommy'
+    assert changes['kind'][0] == CHANGE_NEW
+
+
+def test_changes_are_reported_for_the_products_that_changed(data_folder, tmp_path):
+    # tommy's first product is replaced by a new one and spar's first product gets dearer. Numbered
+    # from scratch, every tommy ID after the first row and every spar ID would have moved.
+    folder = copy_store_files(data_folder, tmp_path)
+    first = run_csv_chain(folder, FIRST_DAY)
+    edit_first_product(folder, 'tommy', 2, 'TEST PROIZVOD 123 g')
+    edit_first_product(folder, 'spar', 5, '3.99')
+    second = run_csv_chain(folder, SECOND_DAY)
+
+    changes, stores = read_changes(folder=os.path.join(folder, 'history'))
+
+    def item_id(df, store, name):
+        return int(df.loc[(df['store'] == store) & (df['name'] == name), 'id'].iloc[0])
+    assert sorted((CHANGE_KINDS[row['kind']], stores[row['store']], int(row['item_id'])) for row in changes) == [
+        ('delisted', 'tommy', item_id(first, 'tommy', 'gin 070 l beefeater 24')),
+        ('increase', 'spar', item_id(second, 'spar', 'njoki cucina italia.1 kg')),
+        ('new', 'tommy', item_id(second, 'tommy', 'test proizvod 123 g')),
+    ]
+    assert item_id(first, 'spar', 'njoki cucina italia.1 kg') == item_id(second, 'spar', 'njoki cucina italia.1 kg')
+    spar_change = changes[changes['kind'] == CHANGE_KINDS.index('increase')][0]
+    assert (spar_change['old_cents'], spar_change['new_cents']) == (369, 399)
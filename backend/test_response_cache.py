@@ -0,0 +1,34 @@
+from response_cache import ResponseCache
+
+
+def test_lookups_with_the_previous_version_keep_the_cache():
+    cache = ResponseCache('test', max_entries=10)
+    cache.advance('old')
+    cache.put('old', 1, b'old body')
+    cache.advance('new')
+    cache.put('new', 1, b'new body')
+
+    # Requests still holding the old snapshot alternate with new ones during a reload
+    for _ in range(3):
+        assert cache.get('old', 1) is None
+        assert cache.get('new', 1).body == b'new body'
+    assert cache.stats()['entries'] == 1
+
+
+def test_responses_of_replaced_data_are_not_stored():
+    cache = ResponseCache('test', max_entries=10)
+    cache.advance('new')
+    cache.put('old', 1, b'old body')
+
+    assert cache.get('old', 1) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_advancing_drops_older_entries():
+    cache = ResponseCache('test', max_entries=10)
+    cache.advance('old')
+    cache.put('old', 1, b'old body')
+    cache.advance('new')
+
+    assert cache.stats()['entries'] == 0
+    assert cache.get('new', 1) is None
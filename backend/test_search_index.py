@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from item_index import build_item_index
+from match_high_confidence import apply_shared_ids, prepare_for_matching
+from search_index import ACCENT_BONUS, NAME_EXACT_BONUS, NAME_PREFIX_WEIGHT, OTHER_FIELD_WEIGHT, _EMPTY_POSTINGS, _prefix_matches, build_search_index, fold_accents, search, tokenize
+
+QUERIES = ['a', 'k', 'ba', 'mli', 'mlijeko', 'Mlijeko', 'cokolada', 'čokolada', 'čokolada milka', 'sir gauda',
+           'pivo', 'kava', 'dukat mlijeko 1 l', 'zzzz', 'mlijeko zzzz', 'coca cola', 'jogurt', 'vino crno',
+           'mlijeko mlijeko', 'kruh pšenični', 'šećer', 'sećer', 'čaj', 'b c', '1 l', '']
+
+
+def reference_search(search_index, query, limit):
+    # search() as it first shipped: every term scored in catalog-sized arrays
+    terms = tokenize(query)
+    if not terms or len(search_index.item_ids) == 0:
+        return []
+
+    item_count = len(search_index.item_ids)
+    scores = np.zeros(item_count, dtype=np.float32)
+    matched_terms = np.zeros(item_count, dtype=np.int16)
+    for term in terms:
+        folded = fold_accents(term)
+        term_scores = np.zeros(item_count, dtype=np.float32)
+        term_scores[_prefix_matches(search_index.other, folded)] = OTHER_FIELD_WEIGHT
+        term_scores[_prefix_matches(search_index.name, folded)] = NAME_PREFIX_WEIGHT
+        term_scores[search_index.name.by_token.get(folded, _EMPTY_POSTINGS)] += NAME_EXACT_BONUS
+        if folded != term:
+            term_scores[_prefix_matches(search_index.name_accented, term)] += ACCENT_BONUS
+        scores += term_scores
+        matched_terms += term_scores > 0
+
+    candidates = np.flatnonzero(matched_terms == len(terms))
+    order = np.lexsort((search_index.rank[candidates], -scores[candidates]))
+    return search_index.item_ids[candidates[order[:limit]]].tolist()
+
+
+@pytest.fixture(scope='module')
+def bundled_search_index(normalized_frame):
+    df = apply_shared_ids(prepare_for_matching(normalized_frame.copy()))
+    return build_search_index(df, build_item_index(df))
+
+
+def name_queries(search_index, count):
+    # Prefixes of one or two words of item names, as typed into the search box
+    rng = np.random.default_rng(7)
+    tokens = search_index.name_accented.tokens
+    queries = []
+    for _ in range(count):
+        words = [tokens[position] for position in rng.integers(0, len(tokens), rng.integers(1, 3))]
+        queries.append(' '.join(word[:rng.integers(1, len(word) + 1)] for word in words))
+    return queries
+
+
+@pytest.mark.parametrize('limit', [1, 20, 100000])
+def test_search_matches_dense_scoring_on_bundled_items(bundled_search_index, limit):
+    for query in QUERIES + name_queries(bundled_search_index, 300):
+        assert search(bundled_search_index, query, limit) == reference_search(bundled_search_index, query, limit), query
+
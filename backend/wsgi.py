@@ -0,0 +1,12 @@
+import gc
+
+from app import app, load_data
+
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+# With preload_app the data is loaded here once, in the gunicorn master, before the workers are
+# forked, so every worker starts with the same pages instead of reading and indexing the data again.
+# Frozen objects are left alone by the garbage collector, which would otherwise write to (and so
+# copy) every page holding the loaded indexes the first time it runs in a worker.
+
+load_data()
+gc.freeze()
@@ -5,8 +5,8 @@ import Image from "next/image"
 import Link from "next/link"
 import { Trash2, Plus, Minus, ArrowLeft } from "lucide-react"
 import { useState, useEffect } from "react"
-import { getItemDetails } from "@/lib/api"
-import type { ItemWithPrices } from "@/lib/types"
+import { getCartDetails, optimizeCart } from "@/lib/api"
+import type { CartOptimization, CartStoreTotal, ItemWithPrices } from "@/lib/types"
 import { formatPrice } from "@/lib/utils"
 
 // Import the components
@@ -16,6 +16,8 @@ import { CopyCartButton } from "./copy-cart-button"
 export function CartPage() {
   const { items, removeItem, updateQuantity, clearCart } = useCart()
   const [itemDetails, setItemDetails] = useState<Record<string, ItemWithPrices>>({})
+  const [storeTotals, setStoreTotals] = useState<CartStoreTotal[]>([])
+  const [optimization, setOptimization] = useState<CartOptimization | null>(null)
   const [isLoading, setIsLoading] = useState(true)
 
   useEffect(() => {
@@ -26,21 +28,26 @@ export function CartPage() {
       }
 
       setIsLoading(true)
-      const details: Record<string, ItemWithPrices> = {}
-
-      // Fetch details for all items in parallel
-      await Promise.all(
-        items.map(async (item) => {
-          try {
-            const itemDetail = await getItemDetails(item.id.toString())
-            details[item.id] = itemDetail
-          } catch (error) {
-            console.error(`Failed to fetch details for item ${item.id}:`, error)
-          }
-        }),
-      )
-
-      setItemDetails(details)
+
+      // One request for all items, including the per-store totals
+      try {
+        const cartDetails = await getCartDetails(items)
+        setItemDetails(cartDetails.itemDetails)
+        setStoreTotals(cartDetails.storeTotals)
+      } catch (error) {
+        console.error("Failed to fetch cart details:", error)
+        setItemDetails({})
+        setStoreTotals([])
+      }
+
+      // The split plan is optional; the totals above still show without it
+      try {
+        setOptimization(await optimizeCart(items))
+      } catch (error) {
+        console.error("Failed to optimize cart:", error)
+        setOptimization(null)
+      }
+
       setIsLoading(false)
     }
 
@@ -181,7 +188,7 @@ export function CartPage() {
 
           <div className="mt-8 pt-6 border-t border-gray-200">
             {!isLoading && Object.keys(itemDetails).length > 0 && (
-              <StoreTotals cartItems={items} itemDetails={itemDetails} />
+              <StoreTotals cartItems={items} storeTotals={storeTotals} optimization={optimization} />
             )}
 
             <div className="mt-6 text-sm text-gray-500 mb-4">
@@ -82,7 +82,14 @@ export function ItemDetails({ itemDetails }: { itemDetails: ItemWithPrices }) {
                       </div>
                     </div>
                     <div className="flex items-center gap-4">
-                      <span className="text-xl font-bold">{formatPrice(storePrice.price)}</span>
+                      <div className="flex flex-col items-end">
+                        <span className="text-xl font-bold">{formatPrice(storePrice.price)}</span>
+                        {storePrice.unitPrice !== undefined && storePrice.unit && (
+                          <span className="text-sm text-gray-500">
+                            {formatPrice(storePrice.unitPrice)} / {storePrice.unit}
+                          </span>
+                        )}
+                      </div>
                       {storePrice.url && (
                         <Link
                           href={storePrice.url}
@@ -93,7 +100,7 @@ export function ItemDetails({ itemDetails }: { itemDetails: ItemWithPrices }) {
                           <ExternalLink className="h-5 w-5" />
                         </Link>
                       )}
-                      <PriceHistory storePrice={storePrice} />
+                      <PriceHistory itemId={itemDetails.id} storePrice={storePrice} />
                     </div>
                   </div>
                 ))}
@@ -5,7 +5,7 @@ import Link from "next/link"
 import Image from "next/image"
 import { SearchBar } from "./search-bar"
 import { ItemsLoadingSkeleton } from "./loading-skeletons"
-import { getItems } from "@/lib/api"
+import { getItemsPage } from "@/lib/api"
 import type { Item } from "@/lib/types"
 import { AddToCartButton } from "./add-to-cart-button"
 import { AlertCircle } from "lucide-react"
@@ -18,6 +18,8 @@ export function ItemList() {
   const [isSearching, setIsSearching] = useState(false)
   const [searchQuery, setSearchQuery] = useState("")
   const [error, setError] = useState<string | null>(null)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
 
   // Fetch all items on component mount
   useEffect(() => {
@@ -26,10 +28,11 @@ export function ItemList() {
         setIsLoading(true)
         setError(null)
         console.log("Fetching items...")
-        const items = await getItems()
-        console.log(`Fetched ${items.length} items`)
-        setAllItems(items)
-        setFilteredItems(items)
+        const page = await getItemsPage()
+        console.log(`Fetched ${page.items.length} of ${page.total} items`)
+        setAllItems(page.items)
+        setFilteredItems(page.items)
+        setNextCursor(page.nextCursor)
       } catch (err) {
         console.error("Error fetching items:", err)
         setError(err instanceof Error ? err.message : "Failed to load items. Please try again later.")
@@ -41,6 +44,25 @@ export function ItemList() {
     fetchItems()
   }, [])
 
+  // Fetch the next page of items
+  const handleLoadMore = async () => {
+    if (!nextCursor) return
+    try {
+      setIsLoadingMore(true)
+      const page = await getItemsPage({ cursor: nextCursor })
+      const items = [...allItems, ...page.items]
+      setAllItems(items)
+      if (!searchQuery.trim()) {
+        setFilteredItems(items)
+      }
+      setNextCursor(page.nextCursor)
+    } catch (err) {
+      console.error("Error fetching more items:", err)
+    } finally {
+      setIsLoadingMore(false)
+    }
+  }
+
   // Handle search
   const handleSearch = async (query: string) => {
     setSearchQuery(query)
@@ -129,6 +151,17 @@ export function ItemList() {
               ))}
             </div>
           )}
+          {!isSearching && !searchQuery.trim() && nextCursor && (
+            <div className="text-center mt-8">
+              <button
+                onClick={handleLoadMore}
+                disabled={isLoadingMore}
+                className="px-4 py-2 bg-green-600 text-white rounded-md hover:bg-green-700 transition-colors disabled:opacity-50"
+              >
+                {isLoadingMore ? "Loading..." : "Load more"}
+              </button>
+            </div>
+          )}
         </>
       )}
     </div>
@@ -1,34 +1,55 @@
 "use client"
 
-import { useState } from "react"
-import type { StorePrice } from "@/lib/types"
+import { useEffect, useState } from "react"
+import type { PriceHistoryPoint, StorePrice } from "@/lib/types"
+import { getPriceHistory } from "@/lib/api"
 
-// Mock price history data
-const generateMockPriceHistory = (currentPrice: number) => {
-  const today = new Date()
-  const data = []
+const HISTORY_DAYS = 30
 
-  for (let i = 30; i >= 0; i--) {
-    const date = new Date(today)
-    date.setDate(date.getDate() - i)
+export function PriceHistory({ itemId, storePrice }: { itemId: string | number; storePrice: StorePrice }) {
+  const [showHistory, setShowHistory] = useState(false)
+  const [priceHistory, setPriceHistory] = useState<PriceHistoryPoint[] | null>(null)
+  const [error, setError] = useState<string | null>(null)
 
-    // Generate a price that fluctuates around the current price
-    const randomFactor = 0.9 + Math.random() * 0.2 // Between 0.9 and 1.1
-    const price = Math.round(currentPrice * randomFactor * 100) / 100
+  // Fetch the history the first time it is shown
+  useEffect(() => {
+    if (!showHistory || priceHistory !== null) return
 
-    data.push({
-      date: date.toISOString().split("T")[0],
-      price,
-    })
-  }
+    getPriceHistory(itemId, storePrice.store, HISTORY_DAYS)
+      .then(setPriceHistory)
+      .catch((err) => setError(err instanceof Error ? err.message : "Failed to load price history."))
+  }, [showHistory, priceHistory, itemId, storePrice.store])
 
-  return data
-}
+  const storeName = storePrice.store.charAt(0).toUpperCase() + storePrice.store.slice(1)
 
-export function PriceHistory({ storePrice }: { storePrice: StorePrice }) {
-  const [showHistory, setShowHistory] = useState(false)
-  const priceHistory = generateMockPriceHistory(storePrice.price)
+  return (
+    <div className="mt-4">
+      <button
+        onClick={() => setShowHistory(!showHistory)}
+        className="text-sm text-green-600 hover:text-green-700 flex items-center"
+      >
+        {showHistory ? "Hide price history" : "Show price history"}
+      </button>
 
+      {showHistory && (
+        <div className="mt-2 bg-white p-4 rounded-lg border border-gray-200">
+          <h4 className="text-sm font-medium mb-2">{HISTORY_DAYS}-Day Price History at {storeName}</h4>
+          {error ? (
+            <p className="text-sm text-red-600">{error}</p>
+          ) : priceHistory === null ? (
+            <p className="text-sm text-gray-500">Loading price history...</p>
+          ) : priceHistory.length < 2 ? (
+            <p className="text-sm text-gray-500">Not enough price history recorded yet.</p>
+          ) : (
+            <PriceChart priceHistory={priceHistory} />
+          )}
+        </div>
+      )}
+    </div>
+  )
+}
+
+function PriceChart({ priceHistory }: { priceHistory: PriceHistoryPoint[] }) {
   // Find min and max prices for scaling
   const minPrice = Math.min(...priceHistory.map((d) => d.price)) * 0.95
   const maxPrice = Math.max(...priceHistory.map((d) => d.price)) * 1.05
@@ -51,84 +72,69 @@ export function PriceHistory({ storePrice }: { storePrice: StorePrice }) {
   // Create SVG path
   const pathD = points.map((p, i) => `${i === 0 ? "M" : "L"} ${p.x} ${p.y}`).join(" ")
 
-  const storeName = storePrice.store.charAt(0).toUpperCase() + storePrice.store.slice(1)
+  // Show a handful of evenly spaced dates on the x-axis
+  const labelStep = Math.max(1, Math.floor((priceHistory.length - 1) / 3))
+  const labelIndexes = Array.from({ length: priceHistory.length }, (_, i) => i).filter((i) => i % labelStep === 0)
 
   return (
-    <div className="mt-4">
-      <button
-        onClick={() => setShowHistory(!showHistory)}
-        className="text-sm text-green-600 hover:text-green-700 flex items-center"
-      >
-        {showHistory ? "Hide price history" : "Show price history"}
-      </button>
-
-      {showHistory && (
-        <div className="mt-2 bg-white p-4 rounded-lg border border-gray-200">
-          <h4 className="text-sm font-medium mb-2">30-Day Price History at {storeName}</h4>
-          <div className="overflow-x-auto">
-            <svg width={width} height={height} className="mx-auto">
-              {/* X-axis */}
-              <line
-                x1={padding.left}
-                y1={padding.top + chartHeight}
-                x2={padding.left + chartWidth}
-                y2={padding.top + chartHeight}
-                stroke="#e5e7eb"
-              />
-
-              {/* Y-axis */}
-              <line
-                x1={padding.left}
-                y1={padding.top}
-                x2={padding.left}
-                y2={padding.top + chartHeight}
-                stroke="#e5e7eb"
-              />
-
-              {/* Price line */}
-              <path d={pathD} fill="none" stroke="#10b981" strokeWidth="2" />
-
-              {/* Data points */}
-              {points.map((point, i) => (
-                <circle key={i} cx={point.x} cy={point.y} r="3" fill="#10b981" />
-              ))}
-
-              {/* X-axis labels (show only a few dates) */}
-              {[0, 10, 20, 30].map((i) => {
-                if (i < priceHistory.length) {
-                  const point = points[i]
-                  return (
-                    <text
-                      key={i}
-                      x={point.x}
-                      y={padding.top + chartHeight + 15}
-                      textAnchor="middle"
-                      fontSize="10"
-                      fill="#6b7280"
-                    >
-                      {point.date.slice(5)} {/* Show only MM-DD */}
-                    </text>
-                  )
-                }
-                return null
-              })}
-
-              {/* Y-axis labels */}
-              {[minPrice, (minPrice + maxPrice) / 2, maxPrice].map((price, i) => {
-                const y = padding.top + chartHeight - ((price - minPrice) / priceRange) * chartHeight
-                return (
-                  <text key={i} x={padding.left - 5} y={y + 3} textAnchor="end" fontSize="10" fill="#6b7280">
-                    ${price.toFixed(2)}
-                  </text>
-                )
-              })}
-            </svg>
-          </div>
-          <p className="text-xs text-gray-500 mt-2">
-            Note: This is simulated price history data for demonstration purposes.
-          </p>
-        </div>
-      )}
+    <div className="overflow-x-auto">
+      <svg width={width} height={height} className="mx-auto">
+        {/* X-axis */}
+        <line
+          x1={padding.left}
+          y1={padding.top + chartHeight}
+          x2={padding.left + chartWidth}
+          y2={padding.top + chartHeight}
+          stroke="#e5e7eb"
+        />
+
+        {/* Y-axis */}
+        <line
+          x1={padding.left}
+          y1={padding.top}
+          x2={padding.left}
+          y2={padding.top + chartHeight}
+          stroke="#e5e7eb"
+        />
+
+        {/* Price line */}
+        <path d={pathD} fill="none" stroke="#10b981" strokeWidth="2" />
+
+        {/* Data points */}
+        {points.map((point, i) => (
+          <circle key={i} cx={point.x} cy={point.y} r="3" fill="#10b981" />
+        ))}
+
+        {/* X-axis labels (show only a few dates) */}
+        {labelIndexes.map((i) => {
+          if (i < priceHistory.length) {
+            const point = points[i]
+            return (
+              <text
+                key={i}
+                x={point.x}
+                y={padding.top + chartHeight + 15}
+                textAnchor="middle"
+                fontSize="10"
+                fill="#6b7280"
+              >
+                {point.date.slice(5)} {/* Show only MM-DD */}
+              </text>
+            )
+          }
+          return null
+        })}
+
+        {/* Y-axis labels */}
+        {[minPrice, (minPrice + maxPrice) / 2, maxPrice].map((price, i) => {
+          const y = padding.top + chartHeight - ((price - minPrice) / priceRange) * chartHeight
+          return (
+            <text key={i} x={padding.left - 5} y={y + 3} textAnchor="end" fontSize="10" fill="#6b7280">
+              ${price.toFixed(2)}
+            </text>
+          )
+        })}
+      </svg>
     </div>
   )
 }
@@ -5,7 +5,7 @@ import type React from "react"
 import { useState, useEffect, useRef } from "react"
 import { Search, Loader2 } from "lucide-react"
 import Image from "next/image"
-import { getItems } from "@/lib/api"
+import { searchItems } from "@/lib/api"
 import type { Item } from "@/lib/types"
 import { formatPrice } from "@/lib/utils"
 
@@ -20,45 +20,37 @@ export function SearchBar({ onSearch, isLoading = false }: SearchBarProps) {
   const [isLoadingSuggestions, setIsLoadingSuggestions] = useState(false)
   const [showSuggestions, setShowSuggestions] = useState(false)
   const [highlightedIndex, setHighlightedIndex] = useState(-1)
-  const [allItems, setAllItems] = useState<Item[]>([])
   const inputRef = useRef<HTMLInputElement>(null)
   const suggestionsRef = useRef<HTMLDivElement>(null)
 
-  // Fetch all items on component mount for suggestions
+  // Fetch suggestions from the search endpoint, debounced
   useEffect(() => {
-    const fetchItems = async () => {
+    if (!query.trim()) {
+      setSuggestions([])
+      return
+    }
+
+    let cancelled = false
+    const timer = setTimeout(async () => {
       try {
         setIsLoadingSuggestions(true)
-        const items = await getItems()
-        setAllItems(items)
+        const items = await searchItems(query, 5) // Limit to 5 suggestions
+        if (cancelled) return
+        setSuggestions(items)
+        setShowSuggestions(true)
+        setHighlightedIndex(-1)
       } catch (error) {
-        console.error("Failed to fetch items for autocomplete:", error)
+        console.error("Failed to fetch search suggestions:", error)
       } finally {
-        setIsLoadingSuggestions(false)
+        if (!cancelled) setIsLoadingSuggestions(false)
       }
-    }
-
-    fetchItems()
-  }, [])
+    }, 150)
 
-  // Filter suggestions based on query
-  useEffect(() => {
-    if (!query.trim()) {
-      setSuggestions([])
-      return
+    return () => {
+      cancelled = true
+      clearTimeout(timer)
     }
-
-    setIsLoadingSuggestions(true)
-    const lowerQuery = query.toLowerCase()
-
-    // Filter items that match the query
-    const filteredItems = allItems.filter((item) => item.name.toLowerCase().includes(lowerQuery)).slice(0, 5) // Limit to 5 suggestions
-
-    setSuggestions(filteredItems)
-    setIsLoadingSuggestions(false)
-    setShowSuggestions(true)
-    setHighlightedIndex(-1)
-  }, [query, allItems])
+  }, [query])
 
   // Handle debounced search
   useEffect(() => {
@@ -1,16 +1,15 @@
 "use client"
 
-import { useState, useEffect } from "react"
-import type { ItemWithPrices } from "@/lib/types"
+import { useState } from "react"
+import type { CartOptimization, CartStoreTotal } from "@/lib/types"
 import type { CartItem } from "@/lib/cart-context"
-import { Check, ChevronDown, ChevronUp, ShoppingBag } from "lucide-react"
-import { useCart } from "@/lib/cart-context"
-import { getItemDetails } from "@/lib/api"
+import { Check, ChevronDown, ChevronUp, ShoppingBag, Split } from "lucide-react"
 import { formatPrice } from "@/lib/utils"
 
 interface StoreTotalsProps {
   cartItems: CartItem[]
-  itemDetails: Record<string, ItemWithPrices>
+  storeTotals: CartStoreTotal[]
+  optimization?: CartOptimization | null
 }
 
 interface StoreTotal {
@@ -22,68 +21,28 @@ interface StoreTotal {
   hasAllItems: boolean
 }
 
-export function StoreTotals({ cartItems, itemDetails }: StoreTotalsProps) {
+export function StoreTotals({ cartItems, storeTotals: cartStoreTotals, optimization }: StoreTotalsProps) {
   const [isExpanded, setIsExpanded] = useState(true)
   const [expandedStore, setExpandedStore] = useState<string | null>(null)
 
-  // Calculate totals for each store
+  // Totals come from the backend already sorted by total price; add what the view needs
   const calculateStoreTotals = (): StoreTotal[] => {
-    // Get all unique stores from all items
-    const storeSet = new Set<string>()
-
-    // Collect all stores from all items
-    Object.values(itemDetails).forEach((item) => {
-      item.prices.forEach((price) => {
-        storeSet.add(price.store)
-      })
-    })
-
-    if (storeSet.size === 0) return []
-
-    const storeTotals: Record<string, StoreTotal> = {}
-
-    // Initialize store totals
-    Array.from(storeSet).forEach((store) => {
-      storeTotals[store] = {
-        store,
-        location: `${store.charAt(0).toUpperCase() + store.slice(1)} Store`,
-        total: 0,
+    if (cartStoreTotals.length === 0) return []
+
+    const totalsArray: StoreTotal[] = cartStoreTotals.map((storeTotal) => {
+      const missingIds = new Set(storeTotal.missingIds)
+      return {
+        store: storeTotal.store,
+        location: `${storeTotal.store.charAt(0).toUpperCase() + storeTotal.store.slice(1)} Store`,
+        total: storeTotal.total,
         isCheapest: false,
-        missingItems: [],
-        hasAllItems: true,
+        missingItems: cartItems
+          .filter((item) => missingIds.has(item.id.toString()))
+          .map((item) => ({ id: item.id, name: item.name })),
+        hasAllItems: storeTotal.missingIds.length === 0,
       }
     })
 
-    // Calculate total for each store and track missing items
-    cartItems.forEach((item) => {
-      const detail = itemDetails[item.id]
-      if (!detail) return
-
-      // Check which stores have this item
-      const storesWithItem = new Set(detail.prices.map(price => price.store))
-      
-      // Add to missing items for stores that don't have it
-      Object.keys(storeTotals).forEach(store => {
-        if (!storesWithItem.has(store)) {
-          storeTotals[store].missingItems.push({
-            id: item.id,
-            name: item.name
-          })
-          storeTotals[store].hasAllItems = false
-        }
-      })
-
-      // Add to total for stores that have it
-      detail.prices.forEach((price) => {
-        if (storeTotals[price.store]) {
-          storeTotals[price.store].total += price.price * item.quantity
-        }
-      })
-    })
-
-    // Convert to array and sort by total price
-    const totalsArray = Object.values(storeTotals).sort((a, b) => a.total - b.total)
-
     // Find the cheapest store with all items
     const cheapestStoreWithAllItems = totalsArray.find(store => store.hasAllItems)
 
@@ -102,6 +61,13 @@ export function StoreTotals({ cartItems, itemDetails }: StoreTotalsProps) {
 
   const storeTotals = calculateStoreTotals()
 
+  // Only worth showing when splitting the cart saves money over the best single store
+  const split = optimization?.split
+  const singleStore = optimization?.singleStore
+  const showSplit =
+    split && singleStore && split.stores.length > 1 &&
+    split.missingIds.length <= singleStore.missingIds.length && split.total < singleStore.total
+
   if (storeTotals.length === 0) {
     return null
   }
@@ -118,6 +84,33 @@ export function StoreTotals({ cartItems, itemDetails }: StoreTotalsProps) {
 
       {isExpanded && (
         <div className="p-4">
+          {showSplit && (
+            <div className="mb-4 p-4 rounded-lg bg-amber-50 border border-amber-200">
+              <div className="flex items-center justify-between">
+                <div className="flex items-center">
+                  <div className="bg-amber-600 text-white p-1 rounded-full mr-3">
+                    <Split className="h-4 w-4" />
+                  </div>
+                  <div>
+                    <h4 className="font-medium">Split between {split.stores.join(" and ")}</h4>
+                    <p className="text-sm text-gray-500">
+                      Save {formatPrice(singleStore.total - split.total)} over shopping at {singleStore.stores[0]}
+                    </p>
+                  </div>
+                </div>
+                <span className="text-xl font-bold">{formatPrice(split.total)}</span>
+              </div>
+              <ul className="mt-3 pl-4 border-l-2 border-amber-200 space-y-1">
+                {cartItems
+                  .filter((item) => split.storeByItem[item.id.toString()])
+                  .map((item) => (
+                    <li key={item.id} className="text-sm text-gray-600">
+                      {item.name}: {split.storeByItem[item.id.toString()]}
+                    </li>
+                  ))}
+              </ul>
+            </div>
+          )}
           <div className="space-y-4">
             {storeTotals.map((store) => (
               <div
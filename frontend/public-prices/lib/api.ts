@@ -1,6 +1,26 @@
-import type { Item, ItemWithPrices, ApiItem, ApiItemDetails } from "./types"
+import type {
+  Item,
+  ItemWithPrices,
+  ApiItem,
+  ApiItemDetails,
+  ApiCartResponse,
+  CartDetails,
+  ItemsQuery,
+  ItemsPage,
+  ApiPriceHistory,
+  PriceHistoryPoint,
+  ApiCartPlan,
+  ApiCartOptimizeResponse,
+  CartPlan,
+  CartOptimization,
+  ApiPriceStats,
+  StorePriceIndex,
+} from "./types"
 import { API_CONFIG } from "./config"
 
+// Number of results shown for a search on the items page (the largest /search allows)
+const SEARCH_RESULTS_LIMIT = 100
+
 // Helper function to handle API errors with more details
 const handleApiError = (error: unknown, message: string) => {
   if (error instanceof Error) {
@@ -73,6 +93,8 @@ const transformApiItemDetails = (apiItemDetails: ApiItemDetails): ItemWithPrices
     // Add location and URL (these aren't in the API, so we're adding defaults)
     location: `${capitalizeWords(p.store)} Store`,
     url: "#",
+    unitPrice: p.unit_price ?? undefined,
+    unit: p.unit ?? undefined,
   }))
 
   return {
@@ -86,8 +108,12 @@ const transformApiItemDetails = (apiItemDetails: ApiItemDetails): ItemWithPrices
   }
 }
 
-// Get all items
+// Get all items, or the best matches for a search query
 export async function getItems(searchQuery?: string): Promise<Item[]> {
+  if (searchQuery && searchQuery.trim()) {
+    return searchItems(searchQuery, SEARCH_RESULTS_LIMIT)
+  }
+
   try {
     console.log("Fetching items from API...")
     const response = await fetchWithTimeout(
@@ -105,17 +131,65 @@ export async function getItems(searchQuery?: string): Promise<Item[]> {
     console.log(`Received ${apiItems.length} items from API`)
 
     // Transform API items to our internal format
-    let items = apiItems.map(transformApiItem)
+    return apiItems.map(transformApiItem)
+  } catch (error) {
+    handleApiError(error, "Failed to fetch items")
+    return [] // Return empty array as fallback
+  }
+}
 
-    // Filter by search query if provided
-    if (searchQuery && searchQuery.trim()) {
-      const query = searchQuery.toLowerCase().trim()
-      items = items.filter((item) => item.name.toLowerCase().includes(query))
-    }
+// Get one page of items, filtered and sorted by the backend
+export async function getItemsPage(query: ItemsQuery = {}): Promise<ItemsPage> {
+  try {
+    const params = new URLSearchParams()
+    if (query.limit) params.set("limit", query.limit.toString())
+    if (query.cursor) params.set("cursor", query.cursor)
+    if (query.store) params.set("store", query.store)
+    if (query.category) params.set("category", query.category)
+    if (query.minStores) params.set("min_stores", query.minStores.toString())
+    if (query.sort) params.set("sort", query.sort)
+    if (query.unit) params.set("unit", query.unit)
+
+    const response = await fetchWithTimeout(
+      `${API_CONFIG.baseUrl}/items?${params}`,
+      {
+        headers: {
+          Accept: "application/json",
+        },
+      },
+      15000,
+    ) // 15 second timeout
 
-    return items
+    const apiItems: ApiItem[] = await response.json()
+    return {
+      items: apiItems.map(transformApiItem),
+      nextCursor: response.headers.get("X-Next-Cursor"),
+      total: Number(response.headers.get("X-Total-Count") ?? apiItems.length),
+    }
   } catch (error) {
     handleApiError(error, "Failed to fetch items")
+    throw error
+  }
+}
+
+// Search items by name, brand or category (accents optional), best matches first
+export async function searchItems(query: string, limit = 10): Promise<Item[]> {
+  try {
+    const params = new URLSearchParams({ q: query.trim(), limit: limit.toString() })
+    const response = await fetchWithTimeout(
+      `${API_CONFIG.baseUrl}/search?${params}`,
+      {
+        headers: {
+          Accept: "application/json",
+        },
+      },
+      15000,
+    ) // 15 second timeout
+
+    const apiItems: ApiItem[] = await response.json()
+    return apiItems.map(transformApiItem)
+  } catch (error) {
+    handleApiError(error, `Failed to search items for "${query}"`)
     return [] // Return empty array as fallback
   }
 }
@@ -144,3 +218,167 @@ export async function getItemDetails(id: string): Promise<ItemWithPrices> {
     throw error
   }
 }
+
+// Get the daily price of an item at one store over the last `days` days.
+// The backend only sends the days a price changed; they are expanded here into one point per day.
+export async function getPriceHistory(id: string | number, store: string, days = 30): Promise<PriceHistoryPoint[]> {
+  try {
+    const response = await fetchWithTimeout(
+      `${API_CONFIG.baseUrl}/prices/${id}/history?days=${days}`,
+      {
+        headers: {
+          Accept: "application/json",
+        },
+      },
+      15000,
+    ) // 15 second timeout
+
+    const history: ApiPriceHistory = await response.json()
+    const storeHistory = history.stores.find((entry) => entry.store.toLowerCase() === store.toLowerCase())
+    if (!storeHistory) return []
+
+    const points: PriceHistoryPoint[] = []
+    const changes = storeHistory.points
+    let changeIndex = 0
+    let price: number | null = null
+    const lastDate = new Date(`${history.to}T00:00:00Z`)
+    for (let date = new Date(`${history.from}T00:00:00Z`); date <= lastDate; date.setUTCDate(date.getUTCDate() + 1)) {
+      const day = date.toISOString().split("T")[0]
+      while (changeIndex < changes.length && changes[changeIndex].date <= day) {
+        price = changes[changeIndex].price
+        changeIndex++
+      }
+      if (price !== null) {
+        points.push({ date: day, price })
+      }
+    }
+    return points
+  } catch (error) {
+    handleApiError(error, `Failed to fetch price history for item ${id}`)
+    throw error
+  }
+}
+
+// Get details and per-store totals for all cart items in one request
+export async function getCartDetails(items: { id: string | number; quantity: number }[]): Promise<CartDetails> {
+  try {
+    console.log(`Fetching details for ${items.length} cart items...`)
+    const response = await fetchWithTimeout(
+      `${API_CONFIG.baseUrl}/prices/batch`,
+      {
+        method: "POST",
+        headers: {
+          Accept: "application/json",
+          "Content-Type": "application/json",
+        },
+        body: JSON.stringify({
+          items: items.map((item) => ({ id: Number(item.id), quantity: item.quantity })),
+        }),
+      },
+      15000,
+    ) // 15 second timeout
+
+    const cart: ApiCartResponse = await response.json()
+    if (cart.not_found.length > 0) {
+      console.log(`Cart items not found: ${cart.not_found.join(", ")}`)
+    }
+
+    const itemDetails: Record<string, ItemWithPrices> = {}
+    cart.items.forEach((apiItemDetails) => {
+      itemDetails[apiItemDetails.id.toString()] = transformApiItemDetails(apiItemDetails)
+    })
+
+    return {
+      itemDetails,
+      storeTotals: cart.store_totals.map((storeTotal) => ({
+        store: capitalizeWords(storeTotal.store),
+        total: storeTotal.total,
+        itemCount: storeTotal.item_count,
+        missingIds: storeTotal.missing_ids.map((id) => id.toString()),
+      })),
+    }
+  } catch (error) {
+    handleApiError(error, "Failed to fetch cart details")
+    throw error
+  }
+}
+
+const transformCartPlan = (plan: ApiCartPlan | null): CartPlan | null => {
+  if (!plan) return null
+  const storeByItem: Record<string, string> = {}
+  plan.items.forEach((line) => {
+    storeByItem[line.id.toString()] = capitalizeWords(line.store)
+  })
+  return {
+    stores: plan.stores.map(capitalizeWords),
+    total: plan.total,
+    storeByItem,
+    missingIds: plan.missing_ids.map((id) => id.toString()),
+  }
+}
+
+// Cheapest way to buy the cart from one store and split across at most maxStores stores
+export async function optimizeCart(
+  items: { id: string | number; quantity: number }[],
+  maxStores = 2,
+): Promise<CartOptimization> {
+  try {
+    const response = await fetchWithTimeout(
+      `${API_CONFIG.baseUrl}/cart/optimize`,
+      {
+        method: "POST",
+        headers: {
+          Accept: "application/json",
+          "Content-Type": "application/json",
+        },
+        body: JSON.stringify({
+          items: items.map((item) => ({ id: Number(item.id), quantity: item.quantity })),
+          max_stores: maxStores,
+        }),
+      },
+      15000,
+    ) // 15 second timeout
+
+    const optimization: ApiCartOptimizeResponse = await response.json()
+    return {
+      maxStores: optimization.max_stores,
+      singleStore: transformCartPlan(optimization.single_store),
+      split: transformCartPlan(optimization.split),
+    }
+  } catch (error) {
+    handleApiError(error, "Failed to optimize cart")
+    throw error
+  }
+}
+
+const transformPriceStats = (stats: ApiPriceStats): StorePriceIndex[] =>
+  stats.stores.map((entry) => ({
+    store: capitalizeWords(entry.store),
+    medianRelativePrice: entry.median_relative_price,
+    basketIndex: entry.basket_index,
+    sharedItems: entry.shared_items,
+    coverage: entry.coverage,
+  }))
+
+// Stores ranked by how expensive they are over the items sold in more than one store, cheapest first.
+// Pass a category to rank them within that category only.
+export async function getStorePriceIndex(category?: string): Promise<StorePriceIndex[]> {
+  const path = category ? `/stats/categories/${encodeURIComponent(category)}` : "/stats/stores"
+  try {
+    const response = await fetchWithTimeout(
+      `${API_CONFIG.baseUrl}${path}`,
+      {
+        headers: {
+          Accept: "application/json",
+        },
+      },
+      15000,
+    ) // 15 second timeout
+
+    const stats: ApiPriceStats = await response.json()
+    return transformPriceStats(stats)
+  } catch (error) {
+    handleApiError(error, category ? `Failed to fetch price index for ${category}` : "Failed to fetch store price index")
+    throw error
+  }
+}
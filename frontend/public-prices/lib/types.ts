@@ -11,6 +11,9 @@ export interface StorePrice {
   store: string
   location?: string
   url?: string
+  // Price per kg, l or piece, when the package size is known
+  unitPrice?: number
+  unit?: "kg" | "l" | "kom"
 }
 
 // Detailed item information with prices from different stores
@@ -23,20 +26,138 @@ export interface ItemWithPrices {
 }
 
 // API response types that match your actual API
+export interface ApiPrice {
+  price: number
+  store: string
+  unit_price: number | null
+  unit: "kg" | "l" | "kom" | null
+}
+
 export interface ApiItem {
   id: number
   name: string
-  prices: {
-    price: number
-    store: string
-  }[]
+  prices: ApiPrice[]
 }
 
 export interface ApiItemDetails {
   id: number
   name: string
-  prices: {
-    price: number
+  prices: ApiPrice[]
+}
+
+export interface ApiStoreTotal {
+  store: string
+  total: number
+  item_count: number
+  missing_ids: number[]
+}
+
+export interface ApiCartResponse {
+  items: ApiItemDetails[]
+  not_found: number[]
+  store_totals: ApiStoreTotal[]
+}
+
+// Cart totals for one store, computed by the backend
+export interface CartStoreTotal {
+  store: string
+  total: number
+  itemCount: number
+  missingIds: string[]
+}
+
+// One way to buy the cart from /cart/optimize
+export interface ApiCartPlan {
+  stores: string[]
+  total: number
+  items: { id: number; store: string; price: number; quantity: number; line_total: number }[]
+  missing_ids: number[]
+}
+
+export interface ApiCartOptimizeResponse {
+  max_stores: number
+  single_store: ApiCartPlan | null
+  split: ApiCartPlan | null
+  not_found: number[]
+}
+
+export interface CartPlan {
+  stores: string[]
+  total: number
+  storeByItem: Record<string, string>
+  missingIds: string[]
+}
+
+// Cheapest plan from a single store and across at most maxStores stores
+export interface CartOptimization {
+  maxStores: number
+  singleStore: CartPlan | null
+  split: CartPlan | null
+}
+
+export interface CartDetails {
+  itemDetails: Record<string, ItemWithPrices>
+  storeTotals: CartStoreTotal[]
+}
+
+// Filters and paging for /items
+export interface ItemsQuery {
+  limit?: number
+  cursor?: string | null
+  store?: string
+  category?: string
+  minStores?: number
+  sort?: "id" | "cheapest" | "spread" | "unit_price"
+  // Required with sort "unit_price"
+  unit?: "kg" | "l" | "kom"
+}
+
+// One page of /items; nextCursor is null on the last page
+export interface ItemsPage {
+  items: Item[]
+  nextCursor: string | null
+  total: number
+}
+
+// Price history of one item from /prices/<id>/history. A null price means the store didn't list it.
+export interface ApiPriceHistory {
+  id: number
+  from: string
+  to: string
+  stores: {
     store: string
+    points: { date: string; price: number | null }[]
   }[]
 }
+
+// One store's price for every day of the requested range
+export interface PriceHistoryPoint {
+  date: string
+  price: number
+}
+
+// Price index of one store from /stats/stores or /stats/categories/<name>, over the items sold in more
+// than one store. basket_index is 100 when the store's prices are the median ones; "items" is only in /stats/stores.
+export interface ApiStorePriceIndex {
+  store: string
+  median_relative_price: number
+  basket_index: number
+  shared_items: number
+  coverage: number
+  items?: number
+}
+
+export interface ApiPriceStats {
+  category?: string
+  shared_items: number
+  stores: ApiStorePriceIndex[]
+}
+
+// Stores ranked by basket index, cheapest first
+export interface StorePriceIndex {
+  store: string
+  medianRelativePrice: number
+  basketIndex: number
+  sharedItems: number
+  coverage: number
+}